@@ -0,0 +1,191 @@
+"""
+트로트 카탈로그 중복 가사 제거 (MinHash + LSH)
+
+리믹스, 재발매, 커버곡처럼 가사가 거의 같은 곡을 묶어 대표 곡 하나만 남기고
+나머지는 대표 곡의 aliases(제목/가수 목록)로 기록합니다.
+
+- shingle: 공백/문장부호를 지운 가사의 글자 3-gram (한글은 한 글자가 한 음절이라 3글자면 대략 한 단어)
+- MinHash: shingle 해시에 num_perm개의 multiply-add-shift 해시를 적용한 최솟값 (곡당 numpy 연산 한 번)
+- LSH: 서명을 band로 나누어 한 band라도 같은 곡끼리만 후보로 비교하므로 곡 수에 거의 선형
+- 후보 쌍은 서명 일치율(추정 Jaccard 유사도)이 threshold 이상일 때만 같은 묶음으로 합침 (union-find)
+- 정규화한 가사가 SHINGLE_SIZE 글자보다 짧은 곡(연주곡, 가사 수집 실패 등)은 비교하지 않고 그대로 남김
+
+사용법 (프로젝트 루트에서):
+    python models/catalog_dedup.py data/trot_embeddings_emotion.pkl -o data/trot_embeddings_emotion.dedup.pkl
+    DEEP_DIARY_CATALOG_PATH=data/trot_embeddings_emotion.dedup.pkl uvicorn service.main:app ...
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+SHINGLE_SIZE = 3
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.8
+
+# 대표 곡을 고를 때 뒤로 미루는 제목 표기 (원곡을 대표로 남기기 위함)
+VERSION_MARKERS = re.compile(r"remix|ver\.|version|inst|\bmr\b|live|acoustic|리믹스|버전|라이브|어쿠스틱|편곡|커버", re.IGNORECASE)
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    가사를 글자 k-gram 해시 집합으로 변환 (공백/줄바꿈/문장부호 차이는 무시)
+
+    Returns:
+        np.ndarray: 중복 없는 uint64 shingle 해시 (정규화한 가사가 k글자보다 짧으면 빈 배열)
+    """
+    normalized = "".join(re.findall(r"[0-9a-z가-힣]+", str(text).lower()))
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    # 한글 음절 코드는 16비트 이내이므로 k=3이면 48비트에 충돌 없이 담김
+    hashes = np.zeros(len(codes) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        hashes = (hashes << np.uint64(16)) ^ codes[offset:len(codes) - k + 1 + offset]
+    return np.unique(hashes)
+
+
+class MinHasher:
+    """shingle 해시 집합 -> 길이 num_perm의 MinHash 서명"""
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, seed=42):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # multiply-add-shift: ((a * x + b) mod 2^64) >> 32, a는 홀수
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def signatures(self, hash_sets) -> np.ndarray:
+        """(곡 수, num_perm) 서명 행렬 (shingle이 없는 곡은 넣지 않아야 함)"""
+        return np.stack([self.signature(hashes) for hashes in hash_sets]) if len(hash_sets) else np.zeros((0, self.num_perm), dtype=np.uint32)
+
+
+def choose_bands(num_perm: int, threshold: float, recall: float = 0.99) -> tuple:
+    """
+    Jaccard 유사도가 threshold인 쌍이 recall 이상의 확률로 후보가 되는 (bands, rows) 중
+    후보가 가장 적게 나오는(rows가 가장 큰) 조합 선택
+
+    한 쌍이 후보가 될 확률: 1 - (1 - s^rows)^bands
+    """
+    for rows in range(num_perm, 0, -1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicate_clusters(texts, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, seed=42) -> list:
+    """
+    가사가 거의 같은 곡 묶음 찾기
+
+    Args:
+        texts (list[str]): 가사 목록
+        threshold (float): 같은 곡으로 볼 추정 Jaccard 유사도 하한
+        num_perm (int): MinHash 서명 길이
+        seed (int): 해시 함수 시드
+
+    Returns:
+        list[list[int]]: 2곡 이상인 묶음마다 행 번호 목록 (행 번호 오름차순, 가사가 너무 짧은 곡은 묶지 않음)
+    """
+    hash_sets = [shingle_hashes(text) for text in texts]
+    rows_with_lyrics = [i for i, hashes in enumerate(hash_sets) if len(hashes)]
+    signatures = MinHasher(num_perm, seed).signatures([hash_sets[i] for i in rows_with_lyrics])
+    bands, rows = choose_bands(num_perm, threshold)
+    parent = list(range(len(signatures)))
+    compared = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets[key.tobytes()].append(i)
+        for members in buckets.values():
+            for pos, i in enumerate(members):
+                for j in members[pos + 1:]:
+                    if (i, j) in compared:
+                        continue
+                    compared.add((i, j))
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        root_i, root_j = _find(parent, i), _find(parent, j)
+                        if root_i != root_j:
+                            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = defaultdict(list)
+    for i in range(len(parent)):
+        clusters[_find(parent, i)].append(rows_with_lyrics[i])
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def dedup_catalog(df: pd.DataFrame, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, lyrics_column="cleaned_lyrics"):
+    """
+    카탈로그에서 중복 가사를 제거하고 대표 곡에 aliases 컬럼 추가
+
+    대표 곡은 제목에 리믹스/버전 표기가 없는 곡 중 가장 앞선 행입니다.
+
+    Args:
+        df (pd.DataFrame): title, artist, cleaned_lyrics 컬럼이 있는 카탈로그
+        threshold (float): 같은 곡으로 볼 추정 Jaccard 유사도 하한
+        num_perm (int): MinHash 서명 길이
+        lyrics_column (str): 가사 컬럼 이름
+
+    Returns:
+        tuple[pd.DataFrame, list[dict]]: (중복 제거된 카탈로그, 묶음별 대표/별칭 정보)
+    """
+    df = df.reset_index(drop=True)
+    clusters = find_duplicate_clusters(df[lyrics_column].tolist(), threshold, num_perm)
+    aliases = [[] for _ in range(len(df))]
+    dropped = set()
+    report = []
+    for members in clusters:
+        canonical = min(members, key=lambda i: (bool(VERSION_MARKERS.search(str(df.at[i, "title"]))), i))
+        others = [i for i in members if i != canonical]
+        aliases[canonical] = [{"title": df.at[i, "title"], "artist": df.at[i, "artist"]} for i in others]
+        dropped.update(others)
+        report.append({
+            "canonical": {"title": df.at[canonical, "title"], "artist": df.at[canonical, "artist"]},
+            "aliases": aliases[canonical],
+        })
+    deduped = df.assign(aliases=aliases).drop(index=sorted(dropped)).reset_index(drop=True)
+    return deduped, report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="트로트 카탈로그 중복 가사 제거 (MinHash/LSH)")
+    parser.add_argument("input", nargs="?", default="data/trot_embeddings_emotion.pkl", help="카탈로그 PKL 파일")
+    parser.add_argument("-o", "--output", help="출력 PKL 파일 (기본값: <입력>.dedup.pkl)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--report", help="묶음 정보를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    catalog = pd.read_pickle(args.input)
+    start = time.perf_counter()
+    deduped, clusters = dedup_catalog(catalog, threshold=args.threshold, num_perm=args.num_perm)
+    elapsed = time.perf_counter() - start
+    output = args.output or os.path.splitext(args.input)[0] + ".dedup.pkl"
+    deduped.to_pickle(output)
+    print(f"✅ {len(catalog)}곡 -> {len(deduped)}곡 (중복 묶음 {len(clusters)}개, {elapsed:.2f}s): {output}")
+    for cluster in clusters:
+        names = [f"{s['title']} - {s['artist']}" for s in [cluster["canonical"]] + cluster["aliases"]]
+        print("  - " + " / ".join(names))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(clusters, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,249 @@
+"""
+샤딩된 트로트/가사 카탈로그 검색
+
+카탈로그가 커지면(멜론 가사 전체 등) 임베딩 행렬을 샤드로 나누어 저장하고,
+샤드별 상위 k곡을 병렬로 구한 뒤 합쳐서 전체 상위 k곡을 만듭니다.
+
+- 샤드마다 임베딩(.npy, memmap으로 로드)과 메타데이터(.pkl)를 따로 저장하므로
+  워커는 manifest의 일부 샤드만 올릴 수 있습니다 (DEEP_DIARY_CATALOG_SHARDS=0,1).
+- 차원 축소 파일(models/embedding_reduction.py, 원본 카탈로그 기준)을 지정하면 샤드마다 해당 행 구간을 잘라 축소 공간에서 검색하고,
+  rerank > 0이면 샤드별 상위 rerank곡을 원본 차원으로 다시 정렬합니다.
+- 행렬-벡터 곱은 numpy(BLAS)가 GIL을 놓고 실행하므로 스레드 풀로 샤드를 동시에 검색합니다.
+  샤드 수만큼 스레드를 쓸 때는 OPENBLAS_NUM_THREADS=1로 BLAS 내부 스레드와 겹치지 않게 하는 것이 좋습니다.
+
+디스크 구조:
+    <root>/manifest.json        샤드 목록 (행 수, 시작 행 번호, 파일 이름)
+    <root>/shard-000.npy        L2 정규화된 float32 임베딩
+    <root>/shard-000.pkl        title, artist, cleaned_lyrics, emotion (+ aliases)
+
+사용법 (프로젝트 루트에서):
+    python models/catalog_shards.py data/trot_embeddings_emotion.pkl --shards 4   # -> data/trot_embeddings_emotion.shards/
+    DEEP_DIARY_CATALOG_PATH=data/trot_embeddings_emotion.shards uvicorn service.main:app ...
+"""
+import heapq
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# 프로젝트 루트 디렉토리를 파이썬 경로에 추가 (스크립트로 실행할 때)
+sys.path.append(os.path.abspath("."))
+
+from models.semantic_embedding import EMOTION_LABELS, SongRecommender, emotion_prior_matrix, search_catalog, song_result
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def write_shards(df_path, root=None, num_shards=4) -> str:
+    """
+    카탈로그 PKL을 연속 구간 샤드로 나누어 저장
+
+    Args:
+        df_path (str): 카탈로그 PKL 파일 (embedding 컬럼 포함)
+        root (str): 샤드 디렉터리 (기본값: <카탈로그>.shards)
+        num_shards (int): 샤드 수
+
+    Returns:
+        str: 샤드 디렉터리
+    """
+    root = root or os.path.splitext(df_path)[0] + ".shards"
+    os.makedirs(root, exist_ok=True)
+    recommender = SongRecommender(df_path, mmap=False)
+    embeddings = np.asarray(recommender.embeddings)
+    shards = []
+    for shard_id, rows in enumerate(np.array_split(np.arange(len(recommender.df)), num_shards)):
+        if not len(rows):
+            continue
+        embeddings_file, meta_file = f"shard-{shard_id:03d}.npy", f"shard-{shard_id:03d}.pkl"
+        np.save(os.path.join(root, embeddings_file), np.ascontiguousarray(embeddings[rows]))
+        recommender.df.iloc[rows].reset_index(drop=True).to_pickle(os.path.join(root, meta_file))
+        shards.append({"id": shard_id, "offset": int(rows[0]), "rows": len(rows), "embeddings": embeddings_file, "meta": meta_file})
+
+    manifest = {"source": df_path, "dim": int(embeddings.shape[1]), "rows": len(embeddings), "shards": shards}
+    tmp_path = os.path.join(root, MANIFEST_FILENAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(root, MANIFEST_FILENAME))
+    return root
+
+
+class CatalogShard:
+    """카탈로그 샤드 하나 (임베딩 memmap + 메타데이터)"""
+
+    def __init__(self, root, info: dict, mmap=True):
+        self.id = info["id"]
+        self.offset = info["offset"]
+        self.embeddings = np.load(os.path.join(root, info["embeddings"]), mmap_mode="r" if mmap else None)
+        self.df = pd.read_pickle(os.path.join(root, info["meta"]))
+        self.emotions = self.df["emotion"].to_numpy()
+        self.emotion_prior = emotion_prior_matrix(self.emotions)
+        self.reduced = None  # (EmbeddingReducer, 축소 벡터, 항목별 offset)
+
+    def use_reduced(self, reducer, vectors, offsets):
+        """전체 카탈로그의 축소 벡터 중 이 샤드의 행 구간을 사용 (memmap이면 복사하지 않음)"""
+        rows = slice(self.offset, self.offset + len(self.df))
+        self.reduced = (reducer, vectors[rows], offsets[rows])
+
+    def top_k(self, query, probs, k, emotion_weight=0.05, emotion=None, rerank=0) -> list:
+        """
+        샤드 안의 상위 k곡
+
+        Args:
+            query (np.ndarray): L2 정규화된 질의 벡터
+            probs (np.ndarray): 감정 확률 7개 (None이면 감정 점수 0)
+            k (int): 반환할 곡 수
+            emotion_weight (float): 감정 점수 가중치
+            emotion (str): 지정하면 해당 감정의 곡만 검색 (기존 필터 방식)
+            rerank (int): 축소 공간 상위 rerank곡을 원본 차원으로 다시 정렬 (차원 축소를 사용할 때만)
+
+        Returns:
+            list[tuple]: (score, similarity, emotion_score, 샤드 안의 행 번호)
+        """
+        candidates = None
+        if emotion is not None:
+            candidates = np.flatnonzero(self.emotions == emotion)
+            if candidates.size == 0:
+                return []
+        return [
+            (score, similarity, emotion_score, i)
+            for i, score, similarity, emotion_score in search_catalog(
+                self.embeddings, self.emotion_prior, query, k, probs, emotion_weight, candidates, self.reduced, rerank,
+            )
+        ]
+
+
+class ShardedSongRecommender:
+    """
+    SongRecommender와 같은 인터페이스로 샤드를 병렬 검색하는 추천기
+    """
+
+    def __init__(self, root, shards=None, workers=None, mmap=True, reduced=None, rerank=0):
+        """
+        Args:
+            root (str): write_shards()로 만든 샤드 디렉터리
+            shards (list[int]): 올릴 샤드 번호 (None이면 전체)
+            workers (int): 검색 스레드 수 (기본값: min(샤드 수, CPU 수))
+            mmap (bool): 임베딩을 memmap으로 로드 (여러 워커 프로세스가 같은 페이지를 공유)
+            reduced (str): 원본 카탈로그로 만든 차원 축소 파일(.npz)을 지정하면 축소 공간에서 검색
+            rerank (int): 샤드별 축소 공간 상위 rerank곡을 원본 차원으로 다시 정렬 (0이면 축소 공간 점수 그대로 사용)
+        """
+        with open(os.path.join(root, MANIFEST_FILENAME), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        infos = [info for info in self.manifest["shards"] if shards is None or info["id"] in set(shards)]
+        if not infos:
+            raise ValueError(f"불러올 샤드가 없습니다: {shards}")
+        self.shards = [CatalogShard(root, info, mmap) for info in infos]
+        self.rerank = rerank
+        if reduced:
+            from models.embedding_reduction import EmbeddingReducer
+            reducer, vectors, offsets = EmbeddingReducer.load(reduced, mmap)
+            if len(vectors) != self.manifest["rows"]:
+                raise ValueError(f"차원 축소 파일의 곡 수({len(vectors)})가 카탈로그({self.manifest['rows']})와 다릅니다: {reduced}")
+            for shard in self.shards:
+                shard.use_reduced(reducer, vectors, offsets)
+        self.workers = workers or min(len(self.shards), os.cpu_count() or 1)
+        self._executor = None
+        self._executor_pid = None
+
+    def __len__(self):
+        return sum(len(shard.df) for shard in self.shards)
+
+    def freeze(self):
+        """읽기 전용으로 고정 (prefork 모드에서 부모 프로세스가 호출)"""
+        for shard in self.shards:
+            shard.emotion_prior.setflags(write=False)
+        return self
+
+    def _map(self, fn):
+        if self.workers <= 1 or len(self.shards) <= 1:
+            return [fn(shard) for shard in self.shards]
+        # fork된 워커에는 부모의 스레드가 없으므로 프로세스마다 스레드 풀을 새로 만듦 (prefork 모드)
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="catalog-shard")
+            self._executor_pid = os.getpid()
+        return list(self._executor.map(fn, self.shards))
+
+    def top_k_candidates(self, diary_embedding, emotion_probs=None, k=5, emotion_weight=0.05, emotion=None) -> list:
+        """
+        올린 샤드 전체의 상위 k곡 (샤드별 상위 k곡을 병합)
+
+        Returns:
+            list[tuple]: 점수 내림차순 (score, similarity, emotion_score, 샤드, 샤드 안의 행 번호)
+        """
+        query = np.asarray(diary_embedding, dtype=np.float32).reshape(-1)
+        query = query / np.linalg.norm(query)
+        probs = None
+        if emotion_probs is not None:
+            if isinstance(emotion_probs, dict):
+                emotion_probs = [emotion_probs.get(e, 0.0) for e in EMOTION_LABELS]
+            probs = np.asarray(emotion_probs, dtype=np.float32).reshape(-1)
+
+        per_shard = self._map(lambda shard: [
+            (score, similarity, emotion_score, shard, i)
+            for score, similarity, emotion_score, i in shard.top_k(query, probs, k, emotion_weight, emotion, self.rerank)
+        ])
+        return heapq.nlargest(k, (c for candidates in per_shard for c in candidates), key=lambda c: c[0])
+
+    def search_rows(self, query, probs=None, k=5, emotion_weight=0.05) -> list:
+        """SongRecommender.search_rows와 같음 (점수 순 (행, 점수, 코사인 유사도, 감정 점수))"""
+        return [
+            (shard.df.iloc[i], score, similarity, emotion_score)
+            for score, similarity, emotion_score, shard, i in self.top_k_candidates(query, probs, k, emotion_weight)
+        ]
+
+    def recommend_songs(self, diary_embedding, emotion_probs, k=5, emotion_weight=0.05, include_lyrics=True):
+        """SongRecommender.recommend_songs와 같음 (감정 확률 가중 점수 상위 k곡)"""
+        return [
+            song_result(row, score, similarity, emotion_score, include_lyrics)
+            for row, score, similarity, emotion_score in self.search_rows(diary_embedding, emotion_probs, k, emotion_weight)
+        ]
+
+    def recommend_song(self, diary_embedding, emotion):
+        """SongRecommender.recommend_song과 같음 (감정이 동일한 곡 중 가장 유사한 곡)"""
+        candidates = self.top_k_candidates(diary_embedding, k=1, emotion_weight=0.0, emotion=emotion)
+        if not candidates:
+            return {"message": f"'{emotion}' 감정에 해당하는 트로트 곡을 찾을 수 없습니다."}
+        _, similarity, _, shard, i = candidates[0]
+        best_match = shard.df.iloc[i]
+        recommendation = {
+            "title": best_match["title"],
+            "artist": best_match["artist"],
+            "lyrics": best_match["cleaned_lyrics"],
+            "similarity": round(similarity, 4),
+        }
+        if "aliases" in best_match.index and len(best_match["aliases"]):
+            recommendation["aliases"] = list(best_match["aliases"])
+        return recommendation
+
+
+def load_song_recommender(path, shards=None, reduced=None, rerank=0):
+    """
+    카탈로그 경로에 맞는 추천기 생성 (PKL 파일이면 SongRecommender, 샤드 디렉터리면 ShardedSongRecommender)
+
+    Args:
+        path (str): 카탈로그 PKL 파일 또는 샤드 디렉터리
+        shards (str | list[int]): 올릴 샤드 번호 ("0,1" 형식 허용, None이면 전체)
+        reduced (str): 차원 축소 파일 (샤드 디렉터리면 샤드를 만든 원본 카탈로그로 만든 파일)
+        rerank (int): 축소 공간 후보 중 원본 차원으로 다시 정렬할 곡 수
+    """
+    if os.path.isdir(path):
+        if isinstance(shards, str):
+            shards = [int(s) for s in shards.split(",") if s.strip()] or None
+        return ShardedSongRecommender(path, shards=shards, reduced=reduced or None, rerank=int(rerank or 0))
+    return SongRecommender(path, reduced=reduced or None, rerank=int(rerank or 0))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="카탈로그를 샤드로 나누어 저장")
+    parser.add_argument("input", nargs="?", default="data/trot_embeddings_emotion.pkl", help="카탈로그 PKL 파일")
+    parser.add_argument("-o", "--output", help="샤드 디렉터리 (기본값: <입력>.shards)")
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    output = write_shards(args.input, args.output, args.shards)
+    print(f"✅ 샤드 {args.shards}개 저장: {output}")
@@ -0,0 +1,264 @@
+"""
+사용자별 일기 검색 인덱스
+
+- 의미 검색: 저장된 일기마다 E5 임베딩(L2 정규화)을 추가로 기록하고, 질의 벡터와의 내적으로 유사도 계산
+- 키워드 검색: 한글 글자 bigram 역색인 + BM25 (형태소 분석기 없이도 "바닷가에서"와 "바닷가"처럼 조사가 붙은 단어 일치)
+- 하이브리드: 두 점수를 가중합
+
+디스크 구조 (사용자별 디렉터리, 모두 추가 기록만 함):
+    <root>/<user_id>/entries.jsonl   일기 메타데이터와 본문
+    <root>/<user_id>/embeddings.f32  float32 임베딩 행 (entries.jsonl과 같은 순서)
+임베딩 행을 먼저 쓰고 일기 줄을 마지막에 쓰므로, entries.jsonl에 있는 일기의 임베딩은 항상 기록되어 있음
+(중간에 멈춰 남은 짝 없는 임베딩 행이나 끝나지 않은 줄은 다음 add()가 잠금을 잡은 상태에서 잘라냄)
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+ENTRIES_FILENAME = "entries.jsonl"
+EMBEDDINGS_FILENAME = "embeddings.f32"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list:
+    """
+    한글/영문/숫자만 남기고 단어별 글자 bigram으로 분리 (한 글자 단어는 그대로 사용)
+    예: "바닷가 산책" -> ["바닷", "닷가", "산책"]
+    """
+    terms = []
+    for word in re.findall(r"[0-9a-zA-Z가-힣]+", text.lower()):
+        if len(word) == 1:
+            terms.append(word)
+        else:
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return terms
+
+
+class DiaryIndex:
+    """한 사용자의 일기 인덱스 (임베딩 행렬 + bigram 역색인)"""
+
+    def __init__(self, path, dim=1024):
+        """
+        Args:
+            path (str): 사용자 인덱스 디렉터리
+            dim (int): 임베딩 차원 (E5-large: 1024)
+        """
+        self.path = path
+        self.dim = dim
+        self.entries = []
+        self.keys = set()  # add(key=...)로 저장한 일기의 키 (같은 일기를 다시 저장해도 한 번만 기록)
+        self.postings = {}  # term -> {문서 번호: 빈도}
+        self.doc_lengths = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)  # 용량을 두 배씩 늘리는 버퍼
+        self._rows = 0
+        self._entries_offset = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return min(len(self.entries), self._rows)
+
+    def refresh(self) -> None:
+        """다른 워커 프로세스가 추가한 일기를 포함해 디스크에 새로 기록된 부분만 읽음"""
+        with self._lock:
+            self._read_entries()
+            self._read_embeddings()
+
+    def _read_entries(self):
+        file_path = os.path.join(self.path, ENTRIES_FILENAME)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) <= self._entries_offset:
+            return
+        with open(file_path, "rb") as f:
+            f.seek(self._entries_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        self._entries_offset += end
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            doc = len(self.entries)
+            self.entries.append(entry)
+            if entry.get("key"):
+                self.keys.add(entry["key"])
+            terms = Counter(tokenize(entry["text"]))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[doc] = count
+
+    def _read_embeddings(self):
+        # 일기 줄이 기록된 행까지만 읽음 (그 뒤의 행은 쓰는 중이거나 잘려 나갈 수 있음)
+        file_path = os.path.join(self.path, EMBEDDINGS_FILENAME)
+        row_bytes = 4 * self.dim
+        limit = len(self.entries)
+        if limit <= self._rows or not os.path.exists(file_path) or os.path.getsize(file_path) // row_bytes <= self._rows:
+            return
+        with open(file_path, "rb") as f:
+            f.seek(self._rows * row_bytes)
+            data = f.read((limit - self._rows) * row_bytes)
+        new_rows = np.frombuffer(data[:len(data) // row_bytes * row_bytes], dtype=np.float32).reshape(-1, self.dim)
+        needed = self._rows + len(new_rows)
+        if needed > len(self._matrix):
+            grown = np.zeros((max(needed, 2 * len(self._matrix), 64), self.dim), dtype=np.float32)
+            grown[:self._rows] = self._matrix[:self._rows]
+            self._matrix = grown
+        self._matrix[self._rows:needed] = new_rows
+        self._rows = needed
+
+    def add(self, text, embedding, emotion=None, ts=None, key=None) -> dict:
+        """
+        일기 추가 (디스크에 추가 기록 후 메모리 인덱스 갱신)
+
+        Args:
+            text (str): 일기 본문
+            embedding (torch.Tensor | np.ndarray): E5 임베딩
+            emotion (str): 일기의 감정
+            ts (float): 작성 시각 (기본값: 현재)
+            key (str): 지정하면 같은 키의 일기가 이미 있을 때 새로 기록하지 않음
+
+        Returns:
+            dict: 저장된 일기 메타데이터 (이미 있는 키면 기존 일기)
+        """
+        ts = ts or time.time()
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.refresh()  # 다른 프로세스가 추가한 일기 뒤에 번호를 매기기 위해 먼저 동기화
+            if key and key in self.keys:
+                return next(e for e in self.entries if e.get("key") == key)
+            self._truncate_incomplete()
+            entry = {
+                "id": len(self.entries),
+                "ts": ts,
+                "date": datetime.fromtimestamp(ts).date().isoformat(),
+                "emotion": emotion,
+                "text": text,
+            }
+            if key:
+                entry["key"] = key
+            with open(os.path.join(self.path, EMBEDDINGS_FILENAME), "ab") as f:
+                f.write(vector.tobytes())
+            with open(os.path.join(self.path, ENTRIES_FILENAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.refresh()
+        return entry
+
+    def _truncate_incomplete(self):
+        """이전 add()가 중간에 멈춰 남은 짝 없는 임베딩 행과 끝나지 않은 일기 줄을 잘라냄 (파일 잠금을 잡은 상태에서 호출)"""
+        for filename, size in (
+            (EMBEDDINGS_FILENAME, len(self.entries) * 4 * self.dim),
+            (ENTRIES_FILENAME, self._entries_offset),
+        ):
+            file_path = os.path.join(self.path, filename)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                os.truncate(file_path, size)
+
+    def _keyword_scores(self, query, n) -> dict:
+        """BM25 점수 (질의 bigram이 하나라도 포함된 일기만)"""
+        terms = set(tokenize(query))
+        if not terms or not n:
+            return {}
+        avg_length = sum(self.doc_lengths[:n]) / n or 1.0
+        scores = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings.items():
+                if doc >= n:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def search(self, query, query_embedding=None, k=10, emotion=None, alpha=0.5) -> list:
+        """
+        하이브리드 검색
+
+        Args:
+            query (str): 검색어 (키워드 점수 계산에 사용, 빈 문자열이면 의미 검색만)
+            query_embedding (torch.Tensor | np.ndarray): 검색어 임베딩 (None이면 키워드 검색만)
+            k (int): 반환할 일기 수
+            emotion (str): 지정하면 해당 감정의 일기만 검색
+            alpha (float): 의미 점수 가중치 (키워드 점수 가중치는 1 - alpha)
+
+        Returns:
+            list[dict]: 점수 순으로 정렬된 일기 (score, semantic, keyword 포함)
+        """
+        with self._lock:
+            n = len(self)
+            if n == 0:
+                return []
+            semantic = np.zeros(n, dtype=np.float32)
+            if query_embedding is not None:
+                vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+                semantic = self._matrix[:n] @ (vector / (np.linalg.norm(vector) or 1.0))
+            keyword = np.zeros(n, dtype=np.float32)
+            for doc, score in self._keyword_scores(query, n).items():
+                keyword[doc] = score
+            entries = self.entries[:n]
+
+        # BM25는 범위가 정해져 있지 않으므로 최댓값으로 나누어 0~1로 맞춤
+        if keyword.max() > 0:
+            keyword = keyword / keyword.max()
+        if query_embedding is None:
+            alpha = 0.0
+        elif not keyword.any():
+            alpha = 1.0
+        scores = alpha * semantic + (1 - alpha) * keyword
+        if query_embedding is None:
+            # 검색어 없이 감정만 지정하면 최신순
+            scores = np.arange(n, dtype=np.float32) / n if not query.strip() else np.where(keyword > 0, scores, -np.inf)
+        if emotion:
+            scores = np.where([e.get("emotion") == emotion for e in entries], scores, -np.inf)
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            dict({key: value for key, value in entries[i].items() if key != "key"}, score=round(float(scores[i]), 4), semantic=round(float(semantic[i]), 4), keyword=round(float(keyword[i]), 4))
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+
+class DiaryIndexStore:
+    """사용자별 DiaryIndex를 필요할 때 불러오고 최근 사용한 max_users명만 메모리에 유지"""
+
+    def __init__(self, root="service/logs/diary_index", dim=1024, max_users=256):
+        self.root = root
+        self.dim = dim
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> DiaryIndex:
+        if os.path.basename(user_id) != user_id or not user_id:
+            raise ValueError("잘못된 사용자 ID입니다.")
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+            else:
+                index = self._indexes[user_id] = DiaryIndex(os.path.join(self.root, user_id), self.dim)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        index.refresh()
+        return index
+
+    def add(self, user_id, text, embedding, emotion=None, ts=None, key=None) -> dict:
+        return self.get(user_id).add(text, embedding, emotion=emotion, ts=ts, key=key)
+
+    def search(self, user_id, query, query_embedding=None, k=10, emotion=None, alpha=0.5) -> list:
+        return self.get(user_id).search(query, query_embedding, k=k, emotion=emotion, alpha=alpha)
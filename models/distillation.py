@@ -0,0 +1,333 @@
+"""
+KoBERT 감정 분류기 지식 증류 (teacher: kobert_emotion.pth → 작은 student)
+
+대화 턴마다 실행되는 감정 분류를 가볍게 하기 위해, 학습된 KoBERT(12층, 768차원)의 출력 분포를
+층 수(와 은닉 차원)가 작은 BERT student가 따라 하도록 new_hub_data.csv로 학습합니다.
+
+- 데이터: 03_Final_Kobert.ipynb의 teacher 학습 분할을 재현해 학습에 쓰고, 평가는 teacher가 보지 않은 문장만 사용합니다.
+- 초기화: 은닉 차원이 같으면 teacher의 임베딩 / 고르게 고른 층 / pooler / 분류기를 그대로 복사하고 (DistilBERT 방식),
+          은닉 차원을 줄이면 단어/위치 임베딩만 teacher 임베딩의 주성분(PCA)으로 투영해 초기화합니다.
+- 손실: alpha * T² * KL(teacher || student, 온도 T) + (1 - alpha) * 정답 라벨 교차 엔트로피
+- 결과는 save_pretrained() 디렉터리로 저장하며, DEEP_DIARY_EMOTION_STUDENT=<디렉터리>로 지정하면
+  서비스의 EmotionClassifier가 student를 로드합니다 (토크나이저는 KoBERT 그대로, 양자화 / ONNX 백엔드와 함께 사용 가능).
+
+사용법 (프로젝트 루트에서):
+    python models/distillation.py train --layers 4 --epochs 3 -o models/kobert_emotion_student
+    python models/distillation.py train --layers 2 --hidden 256 --samples 2000 --epochs 1   # CPU에서 작게 확인
+    python models/distillation.py report --students models/kobert_emotion_student --samples 2000
+"""
+import copy
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+# 프로젝트 루트 디렉토리를 파이썬 경로에 추가 (스크립트로 실행할 때)
+sys.path.append(os.path.abspath("."))
+
+DEFAULT_DATA = "inyoungoh/new_hub_data.csv"
+DEFAULT_STUDENT_PATH = "models/kobert_emotion_student"
+EMOTION_MAPPING = {"중립": 0, "놀람": 1, "분노": 2, "슬픔": 3, "행복": 4, "혐오": 5, "공포": 6}
+
+
+def emotion_student_path():
+    return os.environ.get("DEEP_DIARY_EMOTION_STUDENT") or None
+
+
+def teacher_split(data, seed=42, test_size=0.2) -> tuple:
+    """
+    03_Final_Kobert.ipynb의 teacher 학습 데이터 분할을 그대로 재현
+    (중립 10000문장 + 나머지 감정을 감정별 10000문장으로 복원 추출한 balanced_data를 섞은 뒤 train_test_split)
+
+    Args:
+        data (pd.DataFrame): 전처리한 new_hub_data.csv (Sentence, Emotion)
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (teacher 학습+검증 데이터, 노트북의 평가 데이터)
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.utils import resample
+
+    majority_data = data[data["Emotion"] == "중립"]
+    minority_data = data[data["Emotion"] != "중립"]
+    upsampled_data = [
+        resample(minority_data[minority_data["Emotion"] == emotion], replace=True, n_samples=10000, random_state=seed)
+        for emotion in minority_data["Emotion"].unique()
+    ]
+    balanced_data = pd.concat([majority_data.sample(n=10000, random_state=seed)] + upsampled_data)
+    balanced_data = balanced_data.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return train_test_split(balanced_data, test_size=test_size, random_state=seed)
+
+
+def load_dataset(path=DEFAULT_DATA, samples=0, seed=42) -> tuple:
+    """
+    new_hub_data.csv를 학습/평가용으로 분할
+
+    teacher_split()으로 teacher가 학습(검증 포함)에 쓴 데이터를 재현해 student 학습 데이터로 쓰고,
+    평가는 teacher가 한 번도 보지 않은 문장만 사용합니다.
+    (노트북의 testX는 복원 추출한 balanced_data에서 나누었기 때문에 학습 데이터와 같은 문장이 섞여 있어 그대로 쓰지 않음)
+
+    Args:
+        samples (int): 학습/평가 문장 수를 4:1로 줄여 사용 (0이면 전체)
+        seed (int): samples로 줄일 때의 random_state (teacher 분할은 노트북과 같은 42로 고정)
+
+    Returns:
+        tuple: (학습 문장, 평가 문장, 학습 라벨, 평가 라벨) — train_test_split 반환 순서
+    """
+    data = pd.read_csv(path).dropna()
+    data = data[data["Emotion"].isin(EMOTION_MAPPING)].copy()
+    data["Sentence"] = data["Sentence"].astype(str).map(lambda text: re.sub(r"[^0-9a-zA-Z가-힣\s+]", "", text))
+    train_data, _ = teacher_split(data)
+    test_data = data[~data["Sentence"].isin(set(train_data["Sentence"]))].drop_duplicates()
+    if samples:
+        train_data = train_data.sample(n=min(samples - samples // 5, len(train_data)), random_state=seed)
+        test_data = test_data.sample(n=min(samples // 5, len(test_data)), random_state=seed)
+    return (
+        train_data["Sentence"].tolist(),
+        test_data["Sentence"].tolist(),
+        train_data["Emotion"].map(EMOTION_MAPPING).tolist(),
+        test_data["Emotion"].map(EMOTION_MAPPING).tolist(),
+    )
+
+
+def load_teacher(teacher=None, tokenizer=None) -> tuple:
+    """
+    Args:
+        teacher (str): HF 모델 디렉터리 (생략하면 EmotionClassifier의 KoBERT + kobert_emotion.pth)
+        tokenizer (str): 토크나이저 경로 (생략하면 teacher와 같은 경로)
+
+    Returns:
+        tuple: (teacher 모델, 토크나이저)
+    """
+    from transformers import AutoTokenizer, BertForSequenceClassification
+
+    if teacher is None:
+        from models.emotion_classification import EmotionClassifier
+        classifier = EmotionClassifier(device="cpu")
+        return classifier.model.eval(), classifier.tokenizer
+    model = BertForSequenceClassification.from_pretrained(teacher).eval()
+    return model, AutoTokenizer.from_pretrained(tokenizer or teacher, trust_remote_code=True)
+
+
+def select_layers(teacher_layers, student_layers) -> list:
+    """teacher 층 중 student가 물려받을 층 번호 (마지막 층 포함, 고른 간격). 예: 12 → 4층이면 [2, 5, 8, 11]"""
+    if not 0 < student_layers <= teacher_layers:
+        raise ValueError(f"student 층 수({student_layers})는 1 이상 teacher 층 수({teacher_layers}) 이하여야 합니다.")
+    return [round((i + 1) * teacher_layers / student_layers) - 1 for i in range(student_layers)]
+
+
+def build_student(teacher, num_layers=4, hidden_size=None) -> torch.nn.Module:
+    """
+    teacher 설정을 줄인 BertForSequenceClassification student 생성 및 초기화
+
+    Args:
+        teacher (BertForSequenceClassification): 학습된 teacher
+        num_layers (int): student 층 수
+        hidden_size (int): student 은닉 차원 (생략하면 teacher와 같음, 64의 배수)
+    """
+    from transformers import BertForSequenceClassification
+
+    config = copy.deepcopy(teacher.config)
+    config.num_hidden_layers = num_layers
+    layers = select_layers(teacher.config.num_hidden_layers, num_layers)
+    hidden_size = hidden_size or teacher.config.hidden_size
+    if hidden_size != teacher.config.hidden_size:
+        config.hidden_size = hidden_size
+        config.num_attention_heads = max(1, hidden_size // 64)
+        config.intermediate_size = hidden_size * 4
+    student = BertForSequenceClassification(config)
+
+    if hidden_size == teacher.config.hidden_size:
+        student.bert.embeddings.load_state_dict(teacher.bert.embeddings.state_dict())
+        for index, layer in enumerate(layers):
+            student.bert.encoder.layer[index].load_state_dict(teacher.bert.encoder.layer[layer].state_dict())
+        student.bert.pooler.load_state_dict(teacher.bert.pooler.state_dict())
+        student.classifier.load_state_dict(teacher.classifier.state_dict())
+    else:
+        # 단어 임베딩의 주성분으로 단어/위치/문장 구분 임베딩을 같은 축에 투영
+        with torch.no_grad():
+            words = teacher.bert.embeddings.word_embeddings.weight
+            mean = words.mean(dim=0)
+            _, _, v = torch.linalg.svd(words - mean, full_matrices=False)
+            projection = v[:hidden_size].T
+            for name in ("word_embeddings", "position_embeddings", "token_type_embeddings"):
+                source = getattr(teacher.bert.embeddings, name).weight
+                getattr(student.bert.embeddings, name).weight.copy_((source - mean) @ projection)
+    student.distilled_from_layers = layers
+    return student
+
+
+def predict_logits(model, tokenizer, texts, batch_size=64, max_length=128) -> torch.Tensor:
+    model.eval()
+    logits = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[start:start + batch_size], return_tensors="pt", truncation=True, padding=True, max_length=max_length)
+            logits.append(model(**encoded).logits)
+    return torch.cat(logits, dim=0)
+
+
+def distill(teacher, student, tokenizer, texts, labels, epochs=3, batch_size=32, lr=5e-5,
+            temperature=2.0, alpha=0.7, max_length=128, seed=42) -> torch.nn.Module:
+    """
+    teacher 출력 분포를 따라 하도록 student 학습
+
+    teacher logits는 학습 전에 한 번만 계산해 두고 epoch마다 재사용합니다.
+
+    Args:
+        teacher (torch.nn.Module): 학습된 teacher
+        student (torch.nn.Module): build_student()로 만든 student
+        tokenizer: teacher 토크나이저
+        texts (list[str]): 전처리된 학습 문장
+        labels (list[int]): EMOTION_MAPPING 라벨
+        temperature (float): 증류 온도 T
+        alpha (float): 증류 손실 비중 (나머지는 정답 라벨 교차 엔트로피)
+
+    Returns:
+        torch.nn.Module: 학습된 student (eval 모드)
+    """
+    from transformers import get_linear_schedule_with_warmup
+
+    start = time.perf_counter()
+    teacher_logits = predict_logits(teacher, tokenizer, texts, max_length=max_length)
+    labels = torch.tensor(labels, dtype=torch.long)
+    print(f"✅ teacher logits 계산 ({len(texts)}문장, {time.perf_counter() - start:.1f}s)")
+
+    generator = torch.Generator().manual_seed(seed)
+    steps = epochs * -(-len(texts) // batch_size)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    scheduler = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=steps // 10, num_training_steps=steps)
+    for epoch in range(epochs):
+        student.train()
+        order = torch.randperm(len(texts), generator=generator).tolist()
+        total, start = 0.0, time.perf_counter()
+        for batch_start in range(0, len(order), batch_size):
+            index = order[batch_start:batch_start + batch_size]
+            encoded = tokenizer([texts[i] for i in index], return_tensors="pt", truncation=True, padding=True, max_length=max_length)
+            logits = student(**encoded).logits
+            soft = F.kl_div(
+                F.log_softmax(logits / temperature, dim=1), F.softmax(teacher_logits[index] / temperature, dim=1),
+                reduction="batchmean",
+            ) * temperature ** 2
+            loss = alpha * soft + (1 - alpha) * F.cross_entropy(logits, labels[index])
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), max_norm=1.0)
+            optimizer.step()
+            scheduler.step()
+            total += loss.item() * len(index)
+        print(f"epoch {epoch + 1}/{epochs} loss {total / len(texts):.4f} ({time.perf_counter() - start:.1f}s)")
+    return student.eval()
+
+
+def latency_ms(model, tokenizer, texts, repeat=50, max_length=128) -> float:
+    """EmotionClassifier.predict_emotion과 같은 조건(문장 1개, max_length 패딩)의 p50 지연 시간"""
+    model.eval()
+    timings = []
+    with torch.no_grad():
+        for text in ([texts[0]] + texts[:repeat]):
+            encoded = tokenizer(text, return_tensors="pt", truncation=True, padding="max_length", max_length=max_length)
+            start = time.perf_counter()
+            model(**encoded)
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings[1:]))
+
+
+def evaluate(model, tokenizer, texts, labels, teacher_predictions=None, repeat=50) -> dict:
+    """
+    Returns:
+        dict: 층 수, 은닉 차원, 파라미터 수(M), state_dict 크기(MB), 정확도, teacher 예측 일치율, p50 지연 시간(ms)
+    """
+    from models.quantization import model_size_bytes
+
+    predictions = predict_logits(model, tokenizer, texts).argmax(dim=1).numpy()
+    result = {
+        "layers": model.config.num_hidden_layers,
+        "hidden": model.config.hidden_size,
+        "params_m": round(sum(p.numel() for p in model.parameters()) / 1e6, 1),
+        "size_mb": round(model_size_bytes(model) / 2 ** 20, 1),
+        "accuracy": round(float(np.mean(predictions == np.asarray(labels))), 4),
+        "latency_ms": round(latency_ms(model, tokenizer, texts, repeat), 2),
+    }
+    if teacher_predictions is not None:
+        result["teacher_agreement"] = round(float(np.mean(predictions == teacher_predictions)), 4)
+    result["predictions"] = predictions
+    return result
+
+
+def print_report(rows) -> None:
+    """rows: [(이름, evaluate() 결과)], 첫 행이 teacher"""
+    base = rows[0][1]["latency_ms"]
+    print("| 모델 | 층 | 은닉 | 파라미터(M) | 크기(MB) | 정확도 | teacher 일치율 | p50 (ms) | 속도 |")
+    print("|---|---|---|---|---|---|---|---|---|")
+    for name, r in rows:
+        print(
+            f"| {name} | {r['layers']} | {r['hidden']} | {r['params_m']} | {r['size_mb']} | {r['accuracy']} "
+            f"| {r.get('teacher_agreement', 1.0)} | {r['latency_ms']} | x{base / r['latency_ms']:.2f} |"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from transformers import BertForSequenceClassification
+
+    parser = argparse.ArgumentParser(description="KoBERT 감정 분류기 지식 증류")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for sub in ("train", "report"):
+        sub_parser = subparsers.add_parser(sub, help="student 학습 후 저장" if sub == "train" else "teacher / student 정확도·지연 시간 비교")
+        sub_parser.add_argument("--data", default=DEFAULT_DATA)
+        sub_parser.add_argument("--samples", type=int, default=0, help="사용할 문장 수 (0이면 전체, CPU에서 작게 확인할 때 지정)")
+        sub_parser.add_argument("--teacher", help="teacher HF 모델 디렉터리 (생략하면 KoBERT + kobert_emotion.pth)")
+        sub_parser.add_argument("--tokenizer", help="토크나이저 경로 (생략하면 teacher와 같음)")
+        sub_parser.add_argument("--repeat", type=int, default=50, help="지연 시간 측정 호출 수")
+        sub_parser.add_argument("--seed", type=int, default=42)
+    train_parser = subparsers.choices["train"]
+    train_parser.add_argument("--layers", type=int, default=4)
+    train_parser.add_argument("--hidden", type=int, help="student 은닉 차원 (생략하면 teacher와 같음)")
+    train_parser.add_argument("--epochs", type=int, default=3)
+    train_parser.add_argument("--batch-size", type=int, default=32)
+    train_parser.add_argument("--lr", type=float, default=5e-5)
+    train_parser.add_argument("--temperature", type=float, default=2.0)
+    train_parser.add_argument("--alpha", type=float, default=0.7)
+    train_parser.add_argument("--max-length", type=int, default=128)
+    train_parser.add_argument("-o", "--output", default=DEFAULT_STUDENT_PATH)
+    subparsers.choices["report"].add_argument("--students", default=DEFAULT_STUDENT_PATH, help="student 디렉터리 (쉼표로 구분)")
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    train_texts, test_texts, train_labels, test_labels = load_dataset(args.data, args.samples, seed=args.seed)
+    teacher, tokenizer = load_teacher(args.teacher, args.tokenizer)
+    print(f"학습 {len(train_texts)}문장, 평가 {len(test_texts)}문장, 스레드 {torch.get_num_threads()}개")
+
+    if args.command == "train":
+        student = build_student(teacher, args.layers, args.hidden)
+        print(f"✅ student 생성: {args.layers}층 (teacher 층 {student.distilled_from_layers}), 은닉 {student.config.hidden_size}")
+        student = distill(
+            teacher, student, tokenizer, train_texts, train_labels, args.epochs, args.batch_size, args.lr,
+            args.temperature, args.alpha, args.max_length, args.seed,
+        )
+        student.save_pretrained(args.output)
+        students = [(args.output, student)]
+    else:
+        students = [(path, BertForSequenceClassification.from_pretrained(path)) for path in args.students.split(",")]
+
+    teacher_result = evaluate(teacher, tokenizer, test_texts, test_labels, repeat=args.repeat)
+    rows = [("teacher", teacher_result)]
+    for path, student in students:
+        rows.append((path, evaluate(student, tokenizer, test_texts, test_labels, teacher_result["predictions"], args.repeat)))
+    print_report(rows)
+
+    if args.command == "train":
+        report = {key: value for key, value in rows[-1][1].items() if key != "predictions"}
+        report["teacher"] = {key: value for key, value in teacher_result.items() if key != "predictions"}
+        report["settings"] = {key: value for key, value in vars(args).items() if key != "command"}
+        with open(os.path.join(args.output, "distillation.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ student 저장: {args.output} (DEEP_DIARY_EMOTION_STUDENT={args.output})")
@@ -0,0 +1,235 @@
+"""
+카탈로그 임베딩 차원 축소 (PCA / 랜덤 투영) + 재현율 평가
+
+E5-large 임베딩(1024차원)을 256차원 등으로 줄여 메모리와 내적 비용을 줄입니다.
+축소 결과는 카탈로그 옆에 <카탈로그>.<방식><차원>.npz로 저장하고(원본 임베딩은 그대로 유지),
+SongRecommender(reduced=...)가 축소 공간에서 후보를 찾은 뒤 원본 차원으로 다시 정렬(rerank)할 수 있습니다.
+
+축소 공간의 유사도는 원본 코사인 유사도의 근사값입니다. (P: 투영 행렬, μ: 카탈로그 평균)
+    x·q = (x - μ)·(q - μ) + (x - μ)·μ + μ·q
+        ≈ P(x - μ)·P(q - μ) + offset(x) + μ·q
+E5 임베딩은 모든 벡터가 비슷한 방향(코사인 0.85 이상)을 공유하므로, 평균 방향 성분은 근사하지 않고
+항목별 offset(x) = (x - μ)·μ로 미리 계산해 두고 평균을 뺀 작은 성분만 투영합니다.
+μ·q는 질의마다 상수이므로 순위에 영향이 없지만, 감정 점수와 더할 때 원본과 같은 척도를 유지하기 위해 더합니다.
+
+사용법 (프로젝트 루트에서):
+    python models/embedding_reduction.py fit data/trot_embeddings_emotion.pkl --method pca --dim 256
+    python models/embedding_reduction.py report data/trot_embeddings_emotion.pkl --dims 32,64,128,256
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# 프로젝트 루트 디렉토리를 파이썬 경로에 추가 (스크립트로 실행할 때)
+sys.path.append(os.path.abspath("."))
+
+METHODS = ("pca", "random")
+
+
+class EmbeddingReducer:
+    """선형 차원 축소: reduce(x) = (x - mean) @ components.T"""
+
+    def __init__(self, method, components, mean):
+        """
+        Args:
+            method (str): pca | random
+            components (np.ndarray): (축소 차원, 원본 차원) 투영 행렬
+            mean (np.ndarray): (원본 차원,) 카탈로그 평균
+        """
+        self.method = method
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.mean = np.asarray(mean, dtype=np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, matrix, method="pca", dim=256, seed=0) -> "EmbeddingReducer":
+        """
+        Args:
+            matrix (np.ndarray): (항목 수, 원본 차원) L2 정규화된 임베딩
+            method (str): pca(주성분) | random(평균을 뺀 가우시안 랜덤 투영)
+            dim (int): 축소 차원 (PCA는 항목 수 이하)
+            seed (int): 랜덤 투영 시드
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        mean = matrix.mean(axis=0)
+        if method == "pca":
+            if dim > min(matrix.shape):
+                raise ValueError(f"PCA 차원({dim})은 항목 수/원본 차원({min(matrix.shape)}) 이하여야 합니다.")
+            _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+            return cls(method, vt[:dim], mean)
+        if method == "random":
+            # 내적의 기댓값이 보존되도록 1/sqrt(dim)으로 스케일
+            rng = np.random.default_rng(seed)
+            components = rng.standard_normal((dim, matrix.shape[1])).astype(np.float32) / np.sqrt(dim)
+            return cls(method, components, mean)
+        raise ValueError(f"지원하지 않는 차원 축소 방식입니다: {method}")
+
+    def transform(self, matrix) -> tuple:
+        """
+        카탈로그 임베딩 축소
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: ((항목 수, 축소 차원) 벡터, (항목 수,) offset = (x - μ)·μ)
+        """
+        centered = np.asarray(matrix, dtype=np.float32) - self.mean
+        return np.ascontiguousarray(centered @ self.components.T), centered @ self.mean
+
+    def project_query(self, query) -> tuple:
+        """
+        질의 벡터 투영
+
+        Returns:
+            tuple[np.ndarray, float]: (P(q - μ), μ·q)
+        """
+        return self.components @ (query - self.mean), float(self.mean @ query)
+
+    def similarities(self, vectors, offsets, query) -> np.ndarray:
+        """축소 벡터로 계산한 원본 코사인 유사도 근사값"""
+        projected, shift = self.project_query(query)
+        return vectors @ projected + offsets + shift
+
+    def save(self, path, vectors, offsets) -> None:
+        np.savez(
+            path, method=self.method, components=self.components, mean=self.mean,
+            vectors=np.asarray(vectors, dtype=np.float32), offsets=np.asarray(offsets, dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True) -> tuple:
+        """
+        Returns:
+            tuple[EmbeddingReducer, np.ndarray, np.ndarray]: (축소기, 축소된 카탈로그 벡터, 항목별 offset)
+        """
+        data = np.load(path)
+        reducer = cls(str(data["method"]), data["components"], data["mean"])
+        vectors = np.ascontiguousarray(data["vectors"])
+        offsets = np.ascontiguousarray(data["offsets"])
+        if mmap:
+            # npz는 memmap을 지원하지 않으므로 .npy로 풀어서 워커 프로세스 간 페이지 공유
+            from models.semantic_embedding import save_npy
+
+            cache_path = os.path.splitext(path)[0] + ".vectors.npy"
+            try:
+                if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(path):
+                    save_npy(cache_path, vectors)
+                vectors = np.load(cache_path, mmap_mode="r")
+            except (OSError, ValueError, EOFError) as e:
+                print("❌ 축소 벡터 캐시 저장 실패:", str(e))
+        return reducer, vectors, offsets
+
+
+def reduced_path(df_path, method, dim) -> str:
+    """<카탈로그>.<방식><차원>.npz"""
+    return f"{os.path.splitext(df_path)[0]}.{method}{dim}.npz"
+
+
+def fit_catalog(df_path, method="pca", dim=256, output=None, seed=0) -> str:
+    """카탈로그 임베딩에 축소기를 학습하고 축소 벡터와 함께 저장"""
+    from models.semantic_embedding import SongRecommender
+
+    matrix = np.asarray(SongRecommender(df_path).embeddings)
+    reducer = EmbeddingReducer.fit(matrix, method, dim, seed)
+    output = output or reduced_path(df_path, method, dim)
+    reducer.save(output, *reducer.transform(matrix))
+    return output
+
+
+def _top_k(scores, k):
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def evaluate_recall(matrix, queries, reducer, ks=(1, 10), rerank=0, exclude_self=False) -> dict:
+    """
+    원본 차원 검색 결과 대비 축소 공간 검색의 recall@k
+
+    Args:
+        matrix (np.ndarray): (항목 수, 원본 차원) 카탈로그 임베딩
+        queries (np.ndarray): (질의 수, 원본 차원) L2 정규화된 질의
+        reducer (EmbeddingReducer): 카탈로그에 학습한 축소기
+        ks (tuple): 평가할 k 목록
+        rerank (int): 축소 공간 상위 rerank개를 원본 차원으로 다시 정렬 (0이면 사용 안 함)
+        exclude_self (bool): 질의가 카탈로그 항목 자신일 때 자기 자신 제외 (질의 i = 항목 i)
+
+    Returns:
+        dict: recall@k, 질의당 검색 시간(ms)
+    """
+    exact = queries @ matrix.T
+    vectors, offsets = reducer.transform(matrix)
+    start = time.perf_counter()
+    projected = (queries - reducer.mean) @ reducer.components.T
+    approx = projected @ vectors.T + offsets + (queries @ reducer.mean)[:, None]
+    if exclude_self:
+        np.fill_diagonal(exact, -np.inf)
+        np.fill_diagonal(approx, -np.inf)
+    max_k = max(ks)
+    if rerank:
+        shortlist = _top_k(approx, max(rerank, max_k))
+        rescored = np.einsum("qd,qkd->qk", queries, matrix[shortlist])
+        found = np.take_along_axis(shortlist, _top_k(rescored, max_k), axis=1)
+    else:
+        found = _top_k(approx, max_k)
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+
+    truth = _top_k(exact, max_k)
+    result = {}
+    for k in ks:
+        hits = [len(set(truth[q, :k]) & set(found[q, :k])) / k for q in range(len(queries))]
+        result[f"recall@{k}"] = round(float(np.mean(hits)), 4)
+    result["ms_per_query"] = round(elapsed, 4)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models.semantic_embedding import SongRecommender
+
+    parser = argparse.ArgumentParser(description="카탈로그 임베딩 차원 축소 / 재현율 평가")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fit_parser = subparsers.add_parser("fit", help="축소기를 학습하고 <카탈로그>.<방식><차원>.npz로 저장")
+    fit_parser.add_argument("catalog", nargs="?", default="data/trot_embeddings_emotion.pkl")
+    fit_parser.add_argument("--method", choices=METHODS, default="pca")
+    fit_parser.add_argument("--dim", type=int, default=256)
+    fit_parser.add_argument("-o", "--output")
+    report_parser = subparsers.add_parser("report", help="차원별 recall@1/@10 비교")
+    report_parser.add_argument("catalog", nargs="?", default="data/trot_embeddings_emotion.pkl")
+    report_parser.add_argument("--dims", default="32,64,128,256")
+    report_parser.add_argument("--methods", default="pca,random")
+    report_parser.add_argument("--rerank", default="0,50", help="원본 차원 재정렬 후보 수 (쉼표로 구분)")
+    report_parser.add_argument("--queries", help="질의 임베딩 .npy (생략하면 카탈로그 곡을 질의로 사용하고 자기 자신은 제외)")
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        start = time.perf_counter()
+        output = fit_catalog(args.catalog, args.method, args.dim, args.output)
+        print(f"✅ {args.method} {args.dim}차원 저장 ({time.perf_counter() - start:.2f}s): {output}")
+    else:
+        matrix = np.asarray(SongRecommender(args.catalog).embeddings)
+        if args.queries:
+            queries = np.load(args.queries).astype(np.float32).reshape(-1, matrix.shape[1])
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        else:
+            queries = matrix
+        print(f"카탈로그 {matrix.shape[0]}곡 x {matrix.shape[1]}차원, 질의 {len(queries)}개")
+        print(f"| 방식 | 차원 | rerank | recall@1 | recall@10 | 벡터 메모리(MB) | ms/질의 |")
+        print(f"|---|---|---|---|---|---|---|")
+        full = evaluate_recall(matrix, queries, EmbeddingReducer("identity", np.eye(matrix.shape[1]), np.zeros(matrix.shape[1])), exclude_self=not args.queries)
+        print(f"| 원본 | {matrix.shape[1]} | - | 1.0 | 1.0 | {matrix.nbytes / 2 ** 20:.2f} | {full['ms_per_query']} |")
+        for method in args.methods.split(","):
+            for dim in [int(d) for d in args.dims.split(",")]:
+                try:
+                    reducer = EmbeddingReducer.fit(matrix, method, dim)
+                except ValueError as e:
+                    print(f"| {method} | {dim} | - | {e} | | | |")
+                    continue
+                for rerank in [int(r) for r in args.rerank.split(",")]:
+                    result = evaluate_recall(matrix, queries, reducer, rerank=rerank, exclude_self=not args.queries)
+                    memory = len(matrix) * dim * 4 / 2 ** 20
+                    print(f"| {method} | {dim} | {rerank or '-'} | {result['recall@1']} | {result['recall@10']} | {memory:.2f} | {result['ms_per_query']} |")
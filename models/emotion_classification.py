@@ -1,18 +1,53 @@
+import os
+
 import torch
-from transformers import BertForSequenceClassification, AutoTokenizer
+from transformers import BertForSequenceClassification, AutoTokenizer, AutoConfig
 import re
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
+EMOTION_WEIGHTS = "./models/kobert_emotion.pth"
+STUDENT_WEIGHTS = "model.safetensors"  # save_pretrained()로 저장한 증류 모델 디렉터리 안의 가중치 파일
+
+
 class EmotionClassifier:
-    def __init__(self, model_path="monologg/kobert", num_labels=7, device=None):
+    def __init__(self, model_path="monologg/kobert", num_labels=7, device=None, quantize=False, backend="torch", student_path=None):
         """
         감정 분류 모델 초기화 및 로드
+
+        Args:
+            quantize (bool): CPU int8 동적 양자화 모드 (양자화 결과는 models/quantization.py의 캐시에 저장)
+            backend (str): torch | onnx (ONNX Runtime, 내보낸 그래프는 models/onnx_backend.py의 캐시에 저장)
+            student_path (str): models/distillation.py로 만든 증류(student) 모델 디렉터리 (토크나이저는 model_path의 것을 그대로 사용)
         """
         self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = BertForSequenceClassification.from_pretrained(model_path, num_labels=num_labels)
+        self.quantized = quantize
+        self.student_path = student_path
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)  # trust_remote_code = 모델 다운로드에 대한 검증 절차 생략
-        self.load_params("./models/kobert_emotion.pth")
+        if student_path:
+            name, sources = "kobert_emotion_student", [student_path, os.path.join(student_path, STUDENT_WEIGHTS)]
+        else:
+            name, sources = "kobert_emotion", [model_path, EMOTION_WEIGHTS]
+        if backend == "onnx":
+            from models.onnx_backend import load_or_export
+            self.device = "cpu"
+            self.model = load_or_export(
+                name, sources,
+                load_fp32_model=lambda: self._load_fp32_model(model_path, num_labels),
+                sample_inputs=self.tokenizer(["샘플 문장"], return_tensors="pt", padding="max_length", max_length=128),
+                output_name="logits", quantize=quantize,
+            )
+        elif quantize:
+            from models.quantization import load_or_quantize
+            self.device = "cpu"  # 동적 양자화 커널은 CPU 전용
+            config = AutoConfig.from_pretrained(student_path or model_path, num_labels=num_labels)
+            self.model = load_or_quantize(
+                name, sources,
+                build_model=lambda: BertForSequenceClassification(config),
+                load_fp32_model=lambda: self._load_fp32_model(model_path, num_labels),
+            )
+        else:
+            self.model = self._load_fp32_model(model_path, num_labels)
         self.model.to(self.device)
 
         # 감정 매핑 (라벨 -> 감정명)
@@ -26,6 +61,14 @@ class EmotionClassifier:
             6: "공포"
         }
 
+    def _load_fp32_model(self, model_path, num_labels):
+        if self.student_path:
+            self.model = BertForSequenceClassification.from_pretrained(self.student_path, num_labels=num_labels)
+            return self.model
+        self.model = BertForSequenceClassification.from_pretrained(model_path, num_labels=num_labels)
+        self.load_params(EMOTION_WEIGHTS)
+        return self.model
+
     def load_params(self, model_file):
         """학습된 감정 분류 모델 불러오기"""
         self.model.load_state_dict(torch.load(model_file, map_location=self.device))
@@ -49,6 +92,58 @@ class EmotionClassifier:
         # 감정 매핑 반환
         predicted_emotion = self.label_to_emotion[predicted_label]
         return predicted_emotion
+
+    def predict_emotions(self, texts, batch_size=32):
+        """
+        여러 문장을 배치로 감정 분류
+
+        Args:
+            texts (list[str]): 입력 문장 목록
+            batch_size (int): 한 번에 추론할 문장 수
+
+        Returns:
+            list[str]: 문장별 감정
+        """
+        self.model.eval()
+        emotions = []
+        for start in range(0, len(texts), batch_size):
+            cleaned = [self.preprocess_text(t) for t in texts[start:start + batch_size]]
+            encoded_input = self.tokenizer(cleaned, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
+            encoded_input = {key: val.to(self.device) for key, val in encoded_input.items()}
+            with torch.no_grad():
+                labels = self.model(**encoded_input).logits.argmax(dim=1).tolist()
+            emotions.extend(self.label_to_emotion[label] for label in labels)
+        return emotions
+
+    def predict_proba(self, text):
+        """
+        감정별 확률 (softmax)
+
+        Returns:
+            list[float]: label_to_emotion 순서(0~6)의 확률 7개
+        """
+        return self.predict_probas([text])[0]
+
+    def predict_probas(self, texts, batch_size=32):
+        """
+        여러 문장의 감정별 확률을 배치로 계산
+
+        Args:
+            texts (list[str]): 입력 문장 목록
+            batch_size (int): 한 번에 추론할 문장 수
+
+        Returns:
+            list[list[float]]: 문장별 감정 확률 (label_to_emotion 순서)
+        """
+        self.model.eval()
+        probas = []
+        for start in range(0, len(texts), batch_size):
+            cleaned = [self.preprocess_text(t) for t in texts[start:start + batch_size]]
+            encoded_input = self.tokenizer(cleaned, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
+            encoded_input = {key: val.to(self.device) for key, val in encoded_input.items()}
+            with torch.no_grad():
+                probas.extend(self.model(**encoded_input).logits.softmax(dim=1).tolist())
+        return probas
     
     
 
@@ -0,0 +1,144 @@
+"""
+부하 테스트/벤치마크용 결정적(deterministic) 가짜 모델.
+
+실제 모델과 같은 인터페이스를 가지며, 같은 입력에는 항상 같은 출력을 돌려줍니다.
+GPU나 Gemini API 키 없이 서비스 전체 흐름을 실행할 수 있도록 하고,
+DEEP_DIARY_FAKE_LATENCY(기본값 1.0) 배율로 실제 모델과 비슷한 지연 시간을 흉내 냅니다.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+from PIL import Image
+
+LABEL_TO_EMOTION = {0: "중립", 1: "놀람", 2: "분노", 3: "슬픔", 4: "행복", 5: "혐오", 6: "공포"}
+
+# 단계별 기본 지연 시간 (초)
+BASE_LATENCY = {
+    "llava_prefill": 0.3,
+    "llava_decode": 1.2,
+    "kobert": 0.01,
+    "e5": 0.03,
+    "gemini": 0.4,
+}
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def _sleep(stage: str, text: str = "") -> float:
+    """입력에 따라 결정되는 지연 시간만큼 대기 (기본 지연의 0.5~1.5배)"""
+    scale = float(os.environ.get("DEEP_DIARY_FAKE_LATENCY", "1.0"))
+    seconds = BASE_LATENCY[stage] * scale * (0.5 + (_seed(stage + text) % 1000) / 1000)
+    if seconds > 0:
+        time.sleep(seconds)
+    return seconds
+
+
+class FakeImageCaptioning:
+    """LlavaImageCaptioning 대체: 이미지 크기/평균 색으로 캡션 생성"""
+
+    def __init__(self):
+        self._timings = threading.local()
+
+    @property
+    def last_timings(self) -> dict:
+        """이 스레드에서 마지막으로 실행한 generate_caption()의 단계별 시간 (초, 동시 요청끼리 덮어쓰지 않음)"""
+        return getattr(self._timings, "value", {})
+
+    @last_timings.setter
+    def last_timings(self, timings):
+        self._timings.value = timings
+
+    def load_image_from_url(self, img_url):
+        # 네트워크 없이 동작하도록 URL로부터 단색 이미지 생성
+        color = tuple(_seed(img_url).to_bytes(8, "little")[:3])
+        return Image.new("RGB", (640, 480), color=color)
+
+    def load_image_from_file(self, file_path):
+        try:
+            return Image.open(file_path).convert("RGB")
+        except Exception as e:
+            print("❌ 이미지 로드 실패:", str(e))
+            return None
+
+    def generate_caption(self, image, prompt_text="Describe the image in detail.", stop_event=None):
+        if image is None:
+            return None, None
+        start_time = datetime.now()
+        small = np.asarray(image.resize((8, 8)), dtype=np.uint8)
+        key = hashlib.sha256(small.tobytes()).hexdigest()
+        prefill = _sleep("llava_prefill", key)
+        # LLaVA처럼 취소되면 디코딩 단계를 건너뜀
+        decode = 0.0 if stop_event is not None and stop_event.is_set() else _sleep("llava_decode", key)
+        self.last_timings = {"llava_prefill": prefill, "llava_decode": decode}
+        r, g, b = small.reshape(-1, 3).mean(axis=0).astype(int)
+        caption = (
+            f"USER: {prompt_text} ASSISTANT: The image is {image.width}x{image.height} pixels "
+            f"with an average color of rgb({r}, {g}, {b}). It shows a calm outdoor scene ({key[:8]})."
+        )
+        return caption, datetime.now() - start_time
+
+
+class FakeEmotionClassifier:
+    """EmotionClassifier 대체: 텍스트 해시로 감정 결정"""
+
+    label_to_emotion = LABEL_TO_EMOTION
+
+    def predict_emotion(self, text):
+        _sleep("kobert", text)
+        return LABEL_TO_EMOTION[_seed(text) % len(LABEL_TO_EMOTION)]
+
+    def predict_emotions(self, texts, batch_size=32):
+        return [self.predict_emotion(text) for text in texts]
+
+    def predict_proba(self, text):
+        """predict_emotion과 같은 감정에 0.6, 나머지에 0.4를 텍스트 해시로 나눈 분포"""
+        _sleep("kobert", text)
+        rest = np.random.default_rng(_seed(text)).random(len(LABEL_TO_EMOTION))
+        probas = 0.4 * rest / rest.sum()
+        probas[_seed(text) % len(LABEL_TO_EMOTION)] += 0.6
+        return probas.tolist()
+
+    def predict_probas(self, texts, batch_size=32):
+        return [self.predict_proba(text) for text in texts]
+
+
+class FakeEmbedder:
+    """E5Embedder 대체: 텍스트 해시를 시드로 한 1024차원 벡터"""
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def get_embedding(self, text):
+        _sleep("e5", text)
+        rng = np.random.default_rng(_seed(text))
+        return torch.from_numpy(rng.standard_normal((1, self.dim)).astype(np.float32))
+
+    def get_embeddings(self, texts, batch_size=16):
+        return torch.cat([self.get_embedding(text) for text in texts], dim=0)
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """genai.GenerativeModel 대체: 프롬프트 종류에 맞는 고정 형식의 응답 생성"""
+
+    def generate_content(self, prompt):
+        _sleep("gemini", prompt)
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:6]
+        if "일기 초안입니다" in prompt:
+            return _FakeResponse(f"수정 사항을 반영한 오늘의 일기입니다. 내일도 기록해볼게요. ({key})")
+        if "일기 초안을 작성해" in prompt:
+            return _FakeResponse(f"오늘은 사진 속 풍경처럼 평온한 하루였다. 내일도 작은 행복을 찾아보고 싶다. ({key})")
+        if "후속 질문" in prompt:
+            return _FakeResponse(f"그때 어떤 기분이 드셨나요? 가장 기억에 남는 순간을 알려주세요. ({key})")
+        return _FakeResponse(f"사진 속 장면에서 오늘 가장 즐거웠던 순간은 무엇이었나요? ({key})")
@@ -0,0 +1,172 @@
+"""
+Gemini 호출 전송 계층 (live / fake / record / replay)
+
+- live: 실제 Gemini API 호출
+- fake: models/fakes.py의 결정적 가짜 응답
+- record: 다른 전송 계층(기본 live)을 호출하면서 프롬프트→응답 쌍과 지연 시간을 fixture 파일(JSONL)에 기록
+- replay: fixture 파일의 응답을 네트워크 없이 반환 (지연 시간 분포는 설정 가능)
+
+환경 변수:
+    DEEP_DIARY_GEMINI_MODE: live(기본값) | fake | record | replay
+    DEEP_DIARY_GEMINI_FIXTURE: fixture 파일 경로 (record/replay)
+    DEEP_DIARY_GEMINI_RECORD_BASE: record 모드에서 실제로 호출할 전송 계층 (live | fake)
+    DEEP_DIARY_GEMINI_LATENCY: replay 지연 시간 (recorded | none | fixed:0.3 | normal:0.4,0.1 | lognormal:-1.0,0.5)
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+
+class ReplayMissError(KeyError):
+    """replay 모드에서 fixture에 없는 프롬프트가 들어온 경우"""
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class LiveTransport:
+    """실제 Gemini API"""
+
+    def __init__(self, model_name="gemini-2.0-flash"):
+        from config.api_keys import gemini_key
+        import google.generativeai as genai
+
+        genai.configure(api_key=gemini_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+
+class FakeTransport:
+    """결정적 가짜 Gemini (부하 테스트용)"""
+
+    def __init__(self):
+        from models.fakes import FakeGeminiModel
+        self.model = FakeGeminiModel()
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+
+class RecordingTransport:
+    """다른 전송 계층을 감싸서 프롬프트→응답 쌍과 실제 지연 시간을 fixture 파일에 추가 기록"""
+
+    def __init__(self, inner, fixture_path):
+        self.inner = inner
+        self.fixture_path = fixture_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(fixture_path) or ".", exist_ok=True)
+
+    def generate(self, prompt: str) -> str:
+        start = time.perf_counter()
+        text = self.inner.generate(prompt)
+        latency = time.perf_counter() - start
+        record = {"key": prompt_key(prompt), "prompt": prompt, "response": text, "latency": round(latency, 4)}
+        with self._lock, open(self.fixture_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return text
+
+
+class LatencyModel:
+    """
+    replay 시 흉내 낼 지연 시간 분포
+
+    spec:
+        recorded           기록된 실제 지연 시간
+        none               지연 없음
+        fixed:S            항상 S초
+        normal:MU,SIGMA    정규 분포 (0 미만은 0)
+        lognormal:MU,SIGMA 로그 정규 분포 (exp(N(MU, SIGMA)))
+    """
+
+    def __init__(self, spec="recorded", seed=0):
+        self.kind, _, params = spec.partition(":")
+        self.params = [float(p) for p in params.split(",")] if params else []
+        if self.kind not in ("recorded", "none", "fixed", "normal", "lognormal"):
+            raise ValueError(f"지원하지 않는 지연 시간 분포입니다: {spec}")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, recorded: float) -> float:
+        if self.kind == "recorded":
+            return recorded
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "fixed":
+            return self.params[0]
+        with self._lock:
+            if self.kind == "normal":
+                return max(0.0, self._rng.gauss(self.params[0], self.params[1]))
+            return math.exp(self._rng.gauss(self.params[0], self.params[1]))
+
+
+class ReplayTransport:
+    """
+    fixture 파일에 기록된 응답을 오프라인으로 반환.
+    같은 프롬프트가 여러 번 기록되어 있으면 기록된 순서대로 돌아가며 반환합니다.
+    """
+
+    def __init__(self, fixture_path, latency="recorded", strict=True, seed=0):
+        """
+        Args:
+            fixture_path (str): RecordingTransport가 기록한 JSONL 파일
+            latency (str): LatencyModel spec
+            strict (bool): True면 없는 프롬프트에 ReplayMissError, False면 가장 가까운 종류의 응답 반환
+            seed (int): 지연 시간 샘플링 시드
+        """
+        self.records = {}
+        with open(fixture_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.records.setdefault(record["key"], []).append(record)
+        self.latency = LatencyModel(latency, seed)
+        self.strict = strict
+        self._cursor = {}
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str) -> str:
+        key = prompt_key(prompt)
+        candidates = self.records.get(key)
+        if candidates is None:
+            if self.strict:
+                raise ReplayMissError(f"fixture에 없는 프롬프트입니다: {prompt.strip()[:80]}...")
+            candidates = [min(
+                (r[0] for r in self.records.values()),
+                key=lambda r: abs(len(r["prompt"]) - len(prompt)),
+            )]
+        with self._lock:
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+        record = candidates[index % len(candidates)]
+        delay = self.latency.sample(record.get("latency", 0.0))
+        if delay > 0:
+            time.sleep(delay)
+        return record["response"]
+
+
+def create_transport(mode=None):
+    """환경 변수 설정에 맞는 전송 계층 생성"""
+    mode = mode or os.environ.get("DEEP_DIARY_GEMINI_MODE", "live")
+    if os.environ.get("DEEP_DIARY_FAKE_GEMINI") == "1" and mode == "live":
+        mode = "fake"
+    fixture = os.environ.get("DEEP_DIARY_GEMINI_FIXTURE", "data/fixtures/gemini.jsonl")
+    if mode == "live":
+        return LiveTransport()
+    if mode == "fake":
+        return FakeTransport()
+    if mode == "record":
+        return RecordingTransport(create_transport(os.environ.get("DEEP_DIARY_GEMINI_RECORD_BASE", "live")), fixture)
+    if mode == "replay":
+        return ReplayTransport(
+            fixture,
+            latency=os.environ.get("DEEP_DIARY_GEMINI_LATENCY", "recorded"),
+            strict=os.environ.get("DEEP_DIARY_GEMINI_REPLAY_STRICT", "1") == "1",
+        )
+    raise ValueError(f"지원하지 않는 Gemini 모드입니다: {mode}")
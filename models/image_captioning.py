@@ -1,8 +1,40 @@
 from datetime import datetime
+import threading
+import time
 import requests
 from PIL import Image
 import torch
-from transformers import LlavaForConditionalGeneration, BitsAndBytesConfig, LlavaProcessor
+from transformers import LlavaForConditionalGeneration, BitsAndBytesConfig, LlavaProcessor, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+
+class FirstTokenTimer(BaseStreamer):
+    """
+    generate()의 스트리머 인터페이스로 첫 토큰이 나온 시점을 기록.
+    첫 번째 put()은 프롬프트, 두 번째 put()이 첫 생성 토큰이므로 prefill/decode 시간을 나눌 수 있습니다.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.first_token_time = None
+
+    def put(self, value):
+        self.calls += 1
+        if self.calls == 2:
+            self.first_token_time = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+class CancelCriteria(StoppingCriteria):
+    """stop_event가 설정되면(예: 마감 시간 초과) 다음 토큰에서 생성을 멈추는 조건"""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.stop_event.is_set(), dtype=torch.bool, device=input_ids.device)
 
 
 class LlavaImageCaptioning:
@@ -24,6 +56,16 @@ class LlavaImageCaptioning:
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.model_path = model_path
         self.processor, self.model = self.load_model()
+        self._timings = threading.local()  # 스레드별 마지막 generate_caption()의 단계별 시간
+
+    @property
+    def last_timings(self) -> dict:
+        """이 스레드에서 마지막으로 실행한 generate_caption()의 단계별 시간 (초, 동시 요청끼리 덮어쓰지 않음)"""
+        return getattr(self._timings, "value", {})
+
+    @last_timings.setter
+    def last_timings(self, timings):
+        self._timings.value = timings
 
     def load_model(self):
         """
@@ -94,13 +136,14 @@ class LlavaImageCaptioning:
             print("❌ 이미지 로드 실패:", str(e))
             return None
 
-    def generate_caption(self, image, prompt_text="Describe the image in detail."):
+    def generate_caption(self, image, prompt_text="Describe the image in detail.", stop_event=None):
         """
         LLaVA 모델을 사용하여 이미지 캡션을 생성합니다.
 
         Args:
             image (PIL.Image): 캡션을 생성할 이미지 객체
             prompt_text (str): 이미지 설명을 요청하는 프롬프트
+            stop_event (threading.Event): 설정되면 생성을 중단 (마감 시간 초과 등, 선택)
 
         Returns:
             str: 생성된 이미지 캡션
@@ -130,9 +173,20 @@ class LlavaImageCaptioning:
         # 모델 입력 처리
         inputs = self.processor(images=image, text=prompt, return_tensors="pt").to(self.device, torch.float16)
 
-        # 모델 추론
+        # 모델 추론 (첫 토큰 시점으로 prefill/decode 구분)
+        timer = FirstTokenTimer()
+        generate_start = time.perf_counter()
+        stopping_criteria = StoppingCriteriaList([CancelCriteria(stop_event)]) if stop_event is not None else None
         with torch.no_grad():
-            output_ids = self.model.generate(**inputs, max_new_tokens=200, do_sample=False)
+            output_ids = self.model.generate(
+                **inputs, max_new_tokens=200, do_sample=False, streamer=timer, stopping_criteria=stopping_criteria
+            )
+        generate_end = time.perf_counter()
+        first_token_time = timer.first_token_time or generate_end
+        self.last_timings = {
+            "llava_prefill": first_token_time - generate_start,
+            "llava_decode": generate_end - first_token_time,
+        }
 
         # 결과 디코딩
         caption = self.processor.decode(output_ids[0], skip_special_tokens=True)
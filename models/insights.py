@@ -0,0 +1,301 @@
+"""
+감정 인사이트 엔진
+
+세션 이벤트 로그(service/logs/<session_id>/events.jsonl)를 증분으로 읽어
+사용자(세션 ID)/날짜별 감정 집계를 Parquet으로 저장합니다.
+
+- 수집할 때마다 새 이벤트의 일별 집계만 작은 파일(daily/part-*.parquet)로 추가하고 (전체 집계를 다시 쓰지 않음)
+- 추가 파일이 COMPACT_PARTS개를 넘으면 기준 집계(daily/base-*.parquet)와 합쳐 하나로 압축합니다.
+
+파일마다 마지막으로 읽은 위치(byte offset)와 현재 기준 집계/추가 파일 목록을 checkpoint.json에 함께 저장하므로,
+새로 추가된 줄만 읽고, 체크포인트에 기록되지 않은 파일(수집 도중 중단된 결과)은 읽지 않습니다.
+인사이트 조회는 메모리에 있는 일별 집계만 사용하므로 로그 양과 무관하게 빠릅니다.
+
+사용법 (프로젝트 루트에서):
+    python models/insights.py                 # 새 로그 수집
+    python models/insights.py <session_id>    # 수집 후 인사이트 출력
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EMOTIONS = ["중립", "놀람", "분노", "슬픔", "행복", "혐오", "공포"]
+POSITIVE_EMOTIONS = {"행복"}
+
+# 추가 파일이 이 개수를 넘으면 기준 집계와 합쳐 압축
+COMPACT_PARTS = int(os.environ.get("DEEP_DIARY_INSIGHTS_COMPACT_PARTS", "32"))
+
+DAILY_SCHEMA = pa.schema([("user_id", pa.string()), ("date", pa.string())] + [(e, pa.int32()) for e in EMOTIONS])
+
+
+class InsightsStore:
+    """
+    사용자/날짜별 감정 집계 Parquet 저장소 (기준 집계 + 증분 추가 파일)
+
+    여러 워커 프로세스가 같은 디렉터리를 사용해도 되도록 수집은 파일 잠금 안에서 수행하고,
+    다른 프로세스가 먼저 수집했다면 디스크의 집계를 다시 읽습니다.
+    """
+
+    def __init__(self, root="service/logs/insights", log_root="service/logs"):
+        """
+        Args:
+            root (str): Parquet 파일과 체크포인트를 저장할 디렉터리
+            log_root (str): 세션 이벤트 로그 루트 디렉터리
+        """
+        self.root = root
+        self.log_root = log_root
+        self.daily_dir = os.path.join(root, "daily")
+        self.checkpoint_path = os.path.join(root, "checkpoint.json")
+        os.makedirs(self.daily_dir, exist_ok=True)
+
+        self.offsets = {}  # session_id -> 읽은 byte 수
+        self.base = None  # 기준 집계 파일 이름
+        self.parts = []  # 기준 집계 이후 추가된 집계 파일 이름
+        self.daily = {}  # user_id -> {date: Counter}
+        self.last_ingest = 0.0
+        self._loaded_mtime = None
+        self._lock = threading.Lock()  # 수집(디스크 작업) 직렬화
+        self._daily_lock = threading.Lock()  # self.daily 갱신/조회
+        self._load()
+
+    def _load(self):
+        """디스크의 체크포인트와 일별 집계(기준 + 추가 파일)를 메모리로 읽음"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if "offsets" not in checkpoint:
+            return  # 이전 형식(offset만 저장)의 체크포인트는 무시하고 로그를 처음부터 다시 집계
+        self.offsets = checkpoint["offsets"]
+        self.base = checkpoint.get("base")
+        self.parts = checkpoint.get("parts", [])
+        daily = {}
+        for name in ([self.base] if self.base else []) + self.parts:
+            _add_rows(daily, pq.read_table(os.path.join(self.daily_dir, name)).to_pylist())
+        with self._daily_lock:
+            self.daily = daily
+        self._loaded_mtime = os.path.getmtime(self.checkpoint_path)
+
+    def _read_new_events(self, session_id):
+        """세션 로그에서 지난번 이후 추가된 완전한 줄만 읽음"""
+        path = os.path.join(self.log_root, session_id, "events.jsonl")
+        offset = self.offsets.get(session_id, 0)
+        try:
+            if os.path.getsize(path) <= offset:
+                return []
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return []
+        end = data.rfind(b"\n") + 1  # 기록 중인 마지막 줄은 다음 수집에서 처리
+        self.offsets[session_id] = offset + end
+        rows = []
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("type") == "emotion" and event.get("emotion") in EMOTIONS and "ts" in event:
+                day = datetime.fromtimestamp(event["ts"]).date().isoformat()
+                rows.append({"user_id": session_id, "ts": event["ts"], "date": day, "emotion": event["emotion"]})
+        return rows
+
+    def ingest(self) -> int:
+        """
+        새 감정 이벤트를 수집하여 일별 집계 갱신 (새 이벤트의 집계만 추가 파일로 저장)
+
+        Returns:
+            int: 새로 수집한 감정 이벤트 수
+        """
+        with self._lock, open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(self.checkpoint_path) and os.path.getmtime(self.checkpoint_path) != self._loaded_mtime:
+                self._load()  # 다른 프로세스가 먼저 수집한 결과 반영
+
+            rows = []
+            with os.scandir(self.log_root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and entry.path != self.root:
+                        rows.extend(self._read_new_events(entry.name))
+
+            compacted = False
+            if rows:
+                delta = {}
+                for row in rows:
+                    delta.setdefault(row["user_id"], {}).setdefault(row["date"], Counter())[row["emotion"]] += 1
+                self.parts.append(self._write_daily(delta, "part"))
+                with self._daily_lock:
+                    for user_id, days in delta.items():
+                        for day, counts in days.items():
+                            self.daily.setdefault(user_id, {}).setdefault(day, Counter()).update(counts)
+                if len(self.parts) > COMPACT_PARTS:
+                    with self._daily_lock:
+                        self.base = self._write_daily(self.daily, "base")
+                    self.parts = []
+                    compacted = True
+            self._save_checkpoint()
+            if compacted:
+                # 체크포인트가 새 기준 집계를 가리킨 뒤에 이전 파일(중단된 수집이 남긴 파일 포함) 삭제
+                for name in os.listdir(self.daily_dir):
+                    if name != self.base:
+                        os.remove(os.path.join(self.daily_dir, name))
+            self.last_ingest = time.time()
+            return len(rows)
+
+    def _write_daily(self, daily, prefix) -> str:
+        """{user_id: {date: Counter}}를 새 Parquet 파일로 저장하고 파일 이름 반환"""
+        records = [
+            dict({"user_id": user_id, "date": day}, **{e: counts.get(e, 0) for e in EMOTIONS})
+            for user_id, days in daily.items()
+            for day, counts in days.items()
+        ]
+        name = f"{prefix}-{time.time_ns()}.parquet"
+        tmp_path = os.path.join(self.daily_dir, name + ".tmp")
+        pq.write_table(pa.Table.from_pylist(records, schema=DAILY_SCHEMA), tmp_path)
+        os.replace(tmp_path, os.path.join(self.daily_dir, name))
+        return name
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"offsets": self.offsets, "base": self.base, "parts": self.parts}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._loaded_mtime = os.path.getmtime(self.checkpoint_path)
+
+    def ingest_if_stale(self, max_age=30.0) -> int:
+        """마지막 수집 후 max_age초가 지났을 때만 수집"""
+        if time.time() - self.last_ingest < max_age:
+            return 0
+        return self.ingest()
+
+    def user_daily(self, user_id) -> dict:
+        """사용자의 {날짜: 감정 Counter} 복사본 (수집 중에도 안전하게 읽을 수 있음)"""
+        with self._daily_lock:
+            return {day: Counter(counts) for day, counts in self.daily.get(user_id, {}).items()}
+
+
+def _add_rows(daily: dict, rows: list) -> None:
+    """일별 집계 Parquet 행을 {user_id: {date: Counter}}에 더함"""
+    for row in rows:
+        counts = daily.setdefault(row["user_id"], {}).setdefault(row["date"], Counter())
+        counts.update({e: row[e] for e in EMOTIONS if row[e]})
+
+
+def _ratios(counts: Counter) -> dict:
+    total = sum(counts.values())
+    return {e: round(counts[e] / total, 3) for e in EMOTIONS if counts[e]} if total else {}
+
+
+def _positive_ratio(counts: Counter):
+    total = sum(counts.values())
+    return round(sum(counts[e] for e in POSITIVE_EMOTIONS) / total, 3) if total else None
+
+
+def _sum_days(daily: dict, start: date, end: date) -> Counter:
+    """[start, end] 기간의 감정 합계"""
+    total = Counter()
+    for day, counts in daily.items():
+        if start.isoformat() <= day <= end.isoformat():
+            total.update(counts)
+    return total
+
+
+def generate_insights(store: InsightsStore, user_id: str, days: int = 28, today: date = None) -> dict:
+    """
+    사용자의 감정 인사이트 생성 (일별 집계만 사용)
+
+    Args:
+        store (InsightsStore): 수집된 감정 저장소
+        user_id (str): 사용자(세션) ID
+        days (int): 감정 분포를 계산할 기간(일)
+        today (date): 기준 날짜 (기본값: 오늘)
+
+    Returns:
+        dict: 감정 분포, 연속 기록 일수, 주간 변화 등
+    """
+    today = today or date.today()
+    daily = store.user_daily(user_id)
+    window = _sum_days(daily, today - timedelta(days=days - 1), today)
+    this_week = _sum_days(daily, today - timedelta(days=6), today)
+    last_week = _sum_days(daily, today - timedelta(days=13), today - timedelta(days=7))
+
+    # 연속 기록 일수 (오늘 기록이 아직 없으면 어제부터 계산)
+    recorded = set(daily)
+    cursor = today if today.isoformat() in recorded else today - timedelta(days=1)
+    current_streak = 0
+    while cursor.isoformat() in recorded:
+        current_streak += 1
+        cursor -= timedelta(days=1)
+    longest_streak, run, previous = 0, 0, None
+    for day in sorted(recorded):
+        current = date.fromisoformat(day)
+        run = run + 1 if previous is not None and current - previous == timedelta(days=1) else 1
+        longest_streak = max(longest_streak, run)
+        previous = current
+
+    # 같은 감정이 가장 많았던 날이 며칠 연속인지 (가장 최근 기록일부터)
+    dominant_streak = {"emotion": None, "days": 0}
+    expected = None
+    for day in sorted(recorded, reverse=True):
+        current = date.fromisoformat(day)
+        dominant = daily[day].most_common(1)[0][0]
+        if expected is not None and (current != expected or dominant != dominant_streak["emotion"]):
+            break
+        dominant_streak = {"emotion": dominant, "days": dominant_streak["days"] + 1}
+        expected = current - timedelta(days=1)
+
+    this_ratios, last_ratios = _ratios(this_week), _ratios(last_week)
+    change = {e: round(this_ratios.get(e, 0) - last_ratios.get(e, 0), 3) for e in EMOTIONS if e in this_ratios or e in last_ratios}
+    this_positive, last_positive = _positive_ratio(this_week), _positive_ratio(last_week)
+
+    dominant_emotion = window.most_common(1)[0][0] if window else None
+    if not window:
+        message = "아직 분석할 감정 기록이 없습니다. 오늘의 일기를 작성해보세요."
+    else:
+        message = f"최근 {days}일 동안 가장 많이 느낀 감정은 '{dominant_emotion}'입니다."
+        if this_positive is not None and last_positive is not None and this_positive != last_positive:
+            direction = "늘었어요" if this_positive > last_positive else "줄었어요"
+            message += f" 지난주보다 행복한 순간이 {abs(this_positive - last_positive) * 100:.0f}%p {direction}."
+        if current_streak >= 2:
+            message += f" {current_streak}일 연속으로 기록 중입니다!"
+
+    return {
+        "user_id": user_id,
+        "days": days,
+        "total": sum(window.values()),
+        "distribution": _ratios(window),
+        "dominant_emotion": dominant_emotion,
+        "streak": {"current": current_streak, "longest": longest_streak},
+        "dominant_streak": dominant_streak,
+        "week_over_week": {
+            "this_week": this_ratios,
+            "last_week": last_ratios,
+            "change": change,
+            "positive_ratio": {"this_week": this_positive, "last_week": last_positive},
+        },
+        "daily": [
+            {"date": day, "counts": dict(daily[day])}
+            for day in sorted(daily)
+            if day >= (today - timedelta(days=days - 1)).isoformat()
+        ],
+        "message": message,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    store = InsightsStore()
+    start = time.perf_counter()
+    count = store.ingest()
+    print(f"✅ 감정 이벤트 {count}개 수집 ({time.perf_counter() - start:.3f}s)")
+    for session_id in sys.argv[1:]:
+        print(json.dumps(generate_insights(store, session_id), ensure_ascii=False, indent=2))
@@ -4,15 +4,10 @@ import os
 # 프로젝트 루트 디렉토리를 파이썬 경로에 추가
 sys.path.append(os.path.abspath("."))
 
-# Gemini API 관련 라이브러리 임포트
-from config.api_keys import gemini_key
-import google.generativeai as genai
+# Gemini 전송 계층 선택 (DEEP_DIARY_GEMINI_MODE: live | fake | record | replay, models/gemini_transport.py 참고)
+from models.gemini_transport import create_transport
 
-# Gemini API 설정
-genai.configure(api_key=gemini_key)
-
-# 사용할 모델 선택
-model = genai.GenerativeModel('gemini-2.0-flash')
+transport = create_transport()
 
 ROLE_DESCRIPTION = """
     당신은 사용자가 일기를 편리하게 쓸 수 있도록 도와주는 서비스입니다.
@@ -32,8 +27,7 @@ def generate_question_from_caption(caption: str) -> str:
     이미지에서 일기에 쓸 만한 주제를 언급하고,
     흥미롭고 답변하기 쉬운 한 가지 질문을 자연스럽게 한 줄의 문장으로 만들어주세요.
     """
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return transport.generate(prompt).strip()
 
 def generate_followup_question(conversation_history: list, caption: str, emotion: str = "중립") -> str:
     """
@@ -54,8 +48,7 @@ def generate_followup_question(conversation_history: list, caption: str, emotion
     답변은 2~3문장으로 간결하게 유지하고, 예시는 1개 정도만 들어주세요.
     이전 대화 내용도 반영해주세요.
     """
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return transport.generate(prompt).strip()
 
 def generate_diary_draft(conversation_history: list) -> str:
     """
@@ -75,8 +68,7 @@ def generate_diary_draft(conversation_history: list) -> str:
     {full_conversation}
     """
     
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return transport.generate(prompt).strip()
 
 
 def incorporate_user_changes(original_draft, user_changes) -> str:
@@ -102,8 +94,7 @@ def incorporate_user_changes(original_draft, user_changes) -> str:
     내일 혹은 다음 일기를 위한 작은 다짐이나 기대감이 느껴지도록 간결하게 작성해 주세요.
     위 수정 사항을 충실히 반영하면서도, 전체 글이 자연스럽게 이어지도록 최종 일기를 작성해 주세요.
     """
-    response = model.generate_content(prompt)
-    return response.text
+    return transport.generate(prompt)
 
 # =================== 🎯 기능 테스트용 Main 블록 ===================
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+ONNX Runtime 추론 백엔드 (KoBERT, E5)
+
+HF 모델을 처음 한 번 ONNX 그래프로 내보내 캐시 디렉터리에 저장하고, 이후에는 ONNX Runtime(CPU)으로 실행합니다.
+OnnxModel은 HF 모델처럼 model(**inputs).logits / .last_hidden_state를 돌려주므로
+EmotionClassifier / E5Embedder의 추론 코드는 백엔드와 관계없이 그대로 사용합니다.
+
+- DEEP_DIARY_BACKEND=onnx: 서비스의 EmotionClassifier / E5Embedder를 ONNX Runtime으로 로드 (기본값: torch)
+- DEEP_DIARY_ORT_THREADS: 연산 하나에 쓰는 스레드 수 (intra-op, 기본값: CPU 코어 수)
+- DEEP_DIARY_QUANTIZE=int8와 함께 쓰면 ONNX 그래프를 onnxruntime.quantization으로 int8 동적 양자화
+- 캐시 경로는 models/quantization.py의 cache_path()와 같은 규칙 (DEEP_DIARY_QUANTIZED_CACHE)
+"""
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from models.quantization import cache_path, temp_path
+
+BACKENDS = ("torch", "onnx")
+OPSET_VERSION = 17
+
+
+def inference_backend() -> str:
+    backend = os.environ.get("DEEP_DIARY_BACKEND", "torch").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"지원하지 않는 추론 백엔드입니다: {backend} (torch | onnx)")
+    return backend
+
+
+def ort_threads() -> int:
+    return int(os.environ.get("DEEP_DIARY_ORT_THREADS", os.cpu_count() or 1))
+
+
+class _ExportWrapper(torch.nn.Module):
+    """키워드 인자를 받는 HF 모델을 위치 인자 / 텐서 1개 출력으로 감싸는 내보내기용 모듈"""
+
+    def __init__(self, model, input_names, output_name):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+        self.output_name = output_name
+
+    def forward(self, *inputs):
+        return getattr(self.model(**dict(zip(self.input_names, inputs))), self.output_name)
+
+
+def export_onnx(model, path, sample_inputs, output_name) -> None:
+    """
+    HF 모델을 ONNX로 내보내기 (배치 크기와 문장 길이는 동적 축)
+
+    Args:
+        model (torch.nn.Module): fp32 HF 모델
+        path (str): 저장할 .onnx 경로
+        sample_inputs (dict): 토크나이저 출력 (input_ids, attention_mask, token_type_ids 등)
+        output_name (str): logits | last_hidden_state
+    """
+    input_names = list(sample_inputs)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch", 1: "sequence"} if output_name == "last_hidden_state" else {0: "batch"}
+    tmp_path = temp_path(path, suffix=".onnx")
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                # 래퍼도 eval 상태로 만들어야 내보낸 뒤 원래 모드로 되돌릴 때 모델이 학습 모드(dropout)로 바뀌지 않음
+                _ExportWrapper(model.to("cpu"), input_names, output_name).eval(),
+                tuple(sample_inputs[name].to("cpu") for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes=dynamic_axes,
+                opset_version=OPSET_VERSION,
+                do_constant_folding=True,
+                dynamo=False,
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def quantize_onnx(path, output_path) -> None:
+    """ONNX 그래프의 MatMul 가중치를 int8로 동적 양자화"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = temp_path(output_path, suffix=".onnx")
+    try:
+        quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class OnnxModel:
+    """ONNX Runtime 세션을 HF 모델과 같은 호출 방식으로 감싼 클래스"""
+
+    def __init__(self, path, output_name, threads=None):
+        """
+        Args:
+            path (str): .onnx 경로
+            output_name (str): logits | last_hidden_state
+            threads (int): intra-op 스레드 수 (기본값: DEEP_DIARY_ORT_THREADS)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or ort_threads()
+        options.inter_op_num_threads = 1
+        self.path = path
+        self.output_name = output_name
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        feed = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self.input_names}
+        output = self.session.run([self.output_name], feed)[0]
+        return SimpleNamespace(**{self.output_name: torch.from_numpy(output)})
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def load_or_export(name, sources, load_fp32_model, sample_inputs, output_name, quantize=False) -> OnnxModel:
+    """
+    ONNX 캐시가 있으면 바로 세션을 만들고, 없으면 fp32 모델을 불러와 내보낸 뒤 캐시에 저장
+
+    Args:
+        name (str): 모델 이름
+        sources (list): 캐시 키에 포함할 원본 가중치 경로/모델 이름
+        load_fp32_model (callable): 학습된 fp32 모델을 불러오는 함수
+        sample_inputs (dict): 내보내기에 쓸 토크나이저 출력
+        output_name (str): logits | last_hidden_state
+        quantize (bool): int8 동적 양자화 그래프 사용
+
+    Returns:
+        OnnxModel: ONNX Runtime 모델 (CPU)
+    """
+    path = cache_path(name, *sources, suffix="onnx")
+    if not os.path.exists(path):
+        export_onnx(load_fp32_model(), path, sample_inputs, output_name)
+        print(f"✅ ONNX 내보내기: {path}")
+    if quantize:
+        fp32_path = path
+        path = cache_path(name, *sources, suffix="int8.onnx")
+        if not os.path.exists(path):
+            quantize_onnx(fp32_path, path)
+            print(f"✅ ONNX int8 양자화: {path}")
+    model = OnnxModel(path, output_name)
+    print(f"✅ ONNX Runtime 세션 로드: {path} (intra-op 스레드 {model.session.get_session_options().intra_op_num_threads}개)")
+    return model
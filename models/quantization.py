@@ -0,0 +1,128 @@
+"""
+CPU int8 동적 양자화 (KoBERT, E5)
+
+nn.Linear 가중치를 int8로 양자화하고 활성값은 실행 시점에 양자화합니다 (torch.ao.quantization.quantize_dynamic).
+양자화된 state_dict를 디스크에 캐시하므로 다음 시작부터는 fp32 가중치를 읽어 다시 양자화하지 않고,
+설정(config)으로 만든 빈 모델을 양자화 구조로 바꾼 뒤 캐시를 바로 불러옵니다.
+
+- DEEP_DIARY_QUANTIZE=int8: 서비스의 EmotionClassifier / E5Embedder를 양자화 모드로 로드 (CPU 전용)
+- DEEP_DIARY_QUANTIZED_CACHE: 캐시 디렉터리 (기본값: models/cache)
+"""
+import hashlib
+import os
+import tempfile
+
+import torch
+
+DEFAULT_CACHE_DIR = "models/cache"
+
+
+def quantization_enabled() -> bool:
+    return os.environ.get("DEEP_DIARY_QUANTIZE", "").lower() in ("1", "int8")
+
+
+def quantize_dynamic(model: torch.nn.Module) -> torch.nn.Module:
+    """nn.Linear 층을 int8 동적 양자화 층으로 교체 (추론 전용)"""
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def cache_path(name: str, *sources, cache_dir=None, suffix="int8.pt") -> str:
+    """
+    양자화 캐시 파일 경로
+
+    원본 가중치 파일(경로, 크기, 수정 시각)과 torch 버전이 바뀌면 다른 파일 이름이 되어 자동으로 다시 양자화합니다.
+
+    Args:
+        name (str): 모델 이름 (파일 이름 앞부분)
+        *sources (str): 원본 가중치 파일 경로 또는 모델 이름
+        cache_dir (str): 캐시 디렉터리
+        suffix (str): 파일 확장자 (예: int8.pt, onnx)
+    """
+    key = hashlib.sha256(torch.__version__.encode())
+    for source in sources:
+        key.update(str(source).encode())
+        if os.path.isfile(str(source)):
+            stat = os.stat(source)
+            key.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    cache_dir = cache_dir or os.environ.get("DEEP_DIARY_QUANTIZED_CACHE", DEFAULT_CACHE_DIR)
+    return os.path.join(cache_dir, f"{name}.{key.hexdigest()[:12]}.{suffix}")
+
+
+def load_quantized(path, build_model) -> torch.nn.Module:
+    """
+    캐시된 양자화 state_dict 불러오기
+
+    Args:
+        path (str): cache_path()로 만든 캐시 파일
+        build_model (callable): 가중치 없이 같은 구조의 fp32 모델을 만드는 함수 (예: AutoModel.from_config)
+
+    Returns:
+        torch.nn.Module | None: 양자화된 모델 (캐시가 없으면 None)
+    """
+    if not os.path.exists(path):
+        return None
+    model = quantize_dynamic(build_model())
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    return model.eval()
+
+
+def temp_path(path, suffix=".tmp") -> str:
+    """
+    path와 같은 디렉터리에 프로세스별 임시 파일을 만들어 경로를 반환
+    여러 워커가 같은 캐시를 동시에 만들 때 서로의 임시 파일을 덮어쓰지 않도록, 다 쓴 뒤 os.replace로 교체합니다.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=suffix)
+    os.close(fd)
+    os.chmod(tmp_path, 0o644)
+    return tmp_path
+
+
+def save_quantized(model: torch.nn.Module, path) -> None:
+    tmp_path = temp_path(path, suffix=".pt")
+    try:
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_or_quantize(name, sources, build_model, load_fp32_model) -> torch.nn.Module:
+    """
+    양자화 캐시가 있으면 불러오고, 없으면 fp32 모델을 불러와 양자화한 뒤 캐시에 저장
+
+    Args:
+        name (str): 모델 이름
+        sources (list): 캐시 키에 포함할 원본 가중치 경로/모델 이름
+        build_model (callable): 가중치 없이 fp32 모델 구조를 만드는 함수
+        load_fp32_model (callable): 학습된 fp32 모델을 불러오는 함수
+
+    Returns:
+        torch.nn.Module: int8 동적 양자화 모델 (CPU)
+    """
+    path = cache_path(name, *sources)
+    try:
+        model = load_quantized(path, build_model)
+        if model is not None:
+            print(f"✅ 양자화 캐시 로드: {path}")
+            return model
+    except (RuntimeError, OSError) as e:
+        print("❌ 양자화 캐시 로드 실패, 다시 양자화합니다:", str(e))
+
+    model = quantize_dynamic(load_fp32_model().to("cpu"))
+    try:
+        save_quantized(model, path)
+        print(f"✅ 양자화 캐시 저장: {path}")
+    except OSError as e:
+        print("❌ 양자화 캐시 저장 실패:", str(e))
+    return model
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """state_dict 직렬화 크기 (양자화 전후 메모리 비교용)"""
+    import io
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
@@ -0,0 +1,307 @@
+"""
+카탈로그 공통 검색 엔진 (트로트, 도서, 활동 추천 등)
+
+카탈로그마다 스키마(제목/본문/감정 컬럼, 응답에 포함할 컬럼)를 정의하고,
+일기 임베딩과 감정 확률을 한 번만 계산하여 여러 카탈로그에 동시에 질의합니다.
+트로트(songs) 카탈로그는 이미 불러온 추천기(SongRecommender / ShardedSongRecommender)를 그대로 사용하므로
+카탈로그를 다시 읽지 않고, 차원 축소/재정렬 설정도 추천과 같게 적용됩니다.
+
+점수 = 코사인 유사도 + emotion_weight * (항목의 감정 사전 분포 · 감정 확률)
+(감정 컬럼이 없는 카탈로그는 코사인 유사도만 사용)
+
+카탈로그 파일은 트로트 카탈로그와 같은 형식(embedding 컬럼이 있는 PKL)이며 아래 명령으로 만들 수 있습니다.
+    python models/retrieval.py build books data/books.jsonl -o data/books_embeddings.pkl
+    python models/retrieval.py build activities data/activities.csv -o data/activities_embeddings.pkl --classify-emotion
+
+카탈로그 목록은 기본 스키마(BUILTIN_SCHEMAS)에 DEEP_DIARY_CATALOGS(JSON 파일)의 설정을 덮어써서 만듭니다.
+    {"books": {"path": "data/books_embeddings.pkl", "title": "title", "text": "summary", "fields": ["title", "author"]}}
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 프로젝트 루트 디렉토리를 파이썬 경로에 추가 (스크립트로 실행할 때)
+sys.path.append(os.path.abspath("."))
+
+from models.semantic_embedding import EMOTION_LABELS, emotion_prior_matrix, load_embedding_matrix, search_catalog
+
+
+class CatalogSchema:
+    """카탈로그 컬럼 구성"""
+
+    def __init__(self, name, title, text, emotion=None, fields=None, embedding="embedding"):
+        """
+        Args:
+            name (str): 카탈로그 이름 (/recommend?catalogs=의 값)
+            title (str): 항목 이름 컬럼
+            text (str): 임베딩을 만들 본문 컬럼 (include_text=True이면 "text"로 반환)
+            emotion (str): 항목 감정 컬럼 (없으면 None)
+            fields (list[str]): 응답에 포함할 컬럼 (기본값: [title])
+            embedding (str): 임베딩 컬럼
+        """
+        self.name = name
+        self.title = title
+        self.text = text
+        self.emotion = emotion
+        self.fields = list(fields or [title])
+        self.embedding = embedding
+
+    @classmethod
+    def from_dict(cls, name, config: dict, base=None) -> "CatalogSchema":
+        """설정 딕셔너리로 스키마 생성 (base가 있으면 지정하지 않은 값은 base를 따름)"""
+        defaults = vars(base) if base is not None else {}
+        values = {key: config.get(key, defaults.get(key)) for key in ("title", "text", "emotion", "fields", "embedding")}
+        if not values["title"] or not values["text"]:
+            raise ValueError(f"'{name}' 카탈로그 설정에 title/text 컬럼이 필요합니다.")
+        return cls(name, values["title"], values["text"], values["emotion"], values["fields"], values["embedding"] or "embedding")
+
+    def required_columns(self) -> list:
+        return list(dict.fromkeys([self.title, self.text, self.embedding] + ([self.emotion] if self.emotion else []) + self.fields))
+
+
+BUILTIN_SCHEMAS = {
+    "songs": CatalogSchema("songs", title="title", text="cleaned_lyrics", emotion="emotion", fields=["title", "artist"]),
+    "books": CatalogSchema("books", title="title", text="summary", emotion="emotion", fields=["title", "author", "publisher"]),
+    "activities": CatalogSchema("activities", title="name", text="description", emotion="emotion", fields=["name", "description"]),
+}
+DEFAULT_CATALOG_PATHS = {
+    "songs": "data/trot_embeddings_emotion.pkl",
+    "books": "data/books_embeddings.pkl",
+    "activities": "data/activities_embeddings.pkl",
+}
+
+
+def _plain(value):
+    """numpy 스칼라(np.int64 등)를 JSON으로 직렬화할 수 있는 파이썬 값으로 변환"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _result(schema, row, score, similarity, emotion_score, include_text) -> dict:
+    result = {field: _plain(row[field]) for field in schema.fields}
+    if schema.emotion:
+        result["emotion"] = _plain(row[schema.emotion])
+    result.update(score=round(float(score), 4), similarity=round(float(similarity), 4), emotion_score=round(float(emotion_score), 4))
+    if include_text:
+        result["text"] = _plain(row[schema.text])
+    if "aliases" in row.index and len(row["aliases"]):
+        result["aliases"] = list(row["aliases"])
+    return result
+
+
+class CatalogIndex:
+    """카탈로그 하나의 정규화된 임베딩 행렬 + 감정 사전 분포"""
+
+    def __init__(self, schema: CatalogSchema, path, mmap=True):
+        """
+        Args:
+            schema (CatalogSchema): 카탈로그 스키마
+            path (str): 카탈로그 PKL 파일
+            mmap (bool): 정규화된 임베딩 행렬을 .npy 캐시에서 memmap으로 로드
+        """
+        self.schema = schema
+        self.path = path
+        df = pd.read_pickle(path)
+        missing = [c for c in schema.required_columns() if c not in df.columns]
+        if missing:
+            raise ValueError(f"'{schema.name}' 카탈로그에 {missing} 컬럼이 없습니다: {path}")
+        self.embeddings = load_embedding_matrix(df, path, mmap, schema.embedding)
+        self.emotion_prior = emotion_prior_matrix(df[schema.emotion].to_numpy()) if schema.emotion else None
+        self.df = df.drop(columns=[schema.embedding]).reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.df)
+
+    def search(self, query, probs=None, k=3, emotion_weight=0.05, include_text=False) -> list:
+        """
+        Args:
+            query (np.ndarray): L2 정규화된 질의 벡터
+            probs (np.ndarray): EMOTION_LABELS 순서의 감정 확률 (None이면 감정 점수 0)
+            k (int): 반환할 항목 수
+            emotion_weight (float): 감정 점수 가중치
+            include_text (bool): 본문 포함 여부
+
+        Returns:
+            list[dict]: 점수 순 항목 (스키마의 fields + score, similarity, emotion_score)
+        """
+        return [
+            _result(self.schema, self.df.iloc[i], score, similarity, emotion_score, include_text)
+            for i, score, similarity, emotion_score in search_catalog(self.embeddings, self.emotion_prior, query, k, probs, emotion_weight)
+        ]
+
+
+class RecommenderCatalogIndex:
+    """
+    추천기(SongRecommender / ShardedSongRecommender)를 감싼 카탈로그
+    샤드 디렉터리로 저장된 카탈로그도 이 클래스로 불러옴
+    """
+
+    def __init__(self, schema: CatalogSchema, recommender, path=None):
+        self.schema = schema
+        self.path = path
+        self.recommender = recommender
+
+    def __len__(self):
+        return len(self.recommender)
+
+    def search(self, query, probs=None, k=3, emotion_weight=0.05, include_text=False) -> list:
+        return [
+            _result(self.schema, row, score, similarity, emotion_score, include_text)
+            for row, score, similarity, emotion_score in self.recommender.search_rows(query, probs, k, emotion_weight)
+        ]
+
+
+class RetrievalEngine:
+    """여러 카탈로그를 하나의 질의 임베딩으로 검색"""
+
+    def __init__(self, indexes: dict, errors: dict = None):
+        """
+        Args:
+            indexes (dict): 카탈로그 이름 -> CatalogIndex
+            errors (dict): 불러오지 못한 카탈로그 이름 -> 오류 메시지
+        """
+        self.indexes = indexes
+        self.errors = errors or {}
+
+    def catalogs(self) -> dict:
+        """카탈로그별 항목 수 (불러오지 못한 카탈로그는 오류 메시지)"""
+        status = {name: {"items": len(index)} for name, index in self.indexes.items()}
+        status.update({name: {"error": error} for name, error in self.errors.items()})
+        return status
+
+    def search(self, query_embedding, emotion_probs=None, catalogs=None, k=3, emotion_weight=0.05, include_text=False) -> dict:
+        """
+        질의 임베딩을 한 번 정규화하여 여러 카탈로그에 검색
+
+        Args:
+            query_embedding (torch.Tensor | np.ndarray): 일기 임베딩
+            emotion_probs (list[float] | dict): 감정 확률 (EMOTION_LABELS 순서 또는 {감정: 확률})
+            catalogs (list[str]): 검색할 카탈로그 (None이면 전체)
+            k (int): 카탈로그별 반환할 항목 수
+            emotion_weight (float): 감정 점수 가중치
+            include_text (bool): 본문 포함 여부
+
+        Returns:
+            dict: 카탈로그 이름 -> 점수 순 항목 목록
+        """
+        catalogs = list(catalogs or self.indexes)
+        unavailable = [name for name in catalogs if name not in self.indexes]
+        if unavailable:
+            raise ValueError(f"사용할 수 없는 카탈로그입니다: {', '.join(unavailable)} (사용 가능: {', '.join(self.indexes)})")
+
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query = query / np.linalg.norm(query)
+        probs = None
+        if emotion_probs is not None:
+            if isinstance(emotion_probs, dict):
+                emotion_probs = [emotion_probs.get(e, 0.0) for e in EMOTION_LABELS]
+            probs = np.asarray(emotion_probs, dtype=np.float32).reshape(-1)
+        return {name: self.indexes[name].search(query, probs, k, emotion_weight, include_text) for name in catalogs}
+
+
+def load_catalog_config(config_path=None, song_catalog_path=None) -> dict:
+    """
+    카탈로그 이름 -> (스키마, 경로)
+
+    Args:
+        config_path (str): 카탈로그 설정 JSON 파일 (기본 스키마를 덮어쓰거나 새 카탈로그 추가)
+        song_catalog_path (str): 트로트 카탈로그 경로 (DEEP_DIARY_CATALOG_PATH)
+    """
+    config = {name: (schema, DEFAULT_CATALOG_PATHS[name]) for name, schema in BUILTIN_SCHEMAS.items()}
+    if song_catalog_path:
+        config["songs"] = (BUILTIN_SCHEMAS["songs"], song_catalog_path)
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            for name, values in json.load(f).items():
+                base, path = config.get(name, (None, None))
+                config[name] = (CatalogSchema.from_dict(name, values, base), values.get("path", path))
+    return config
+
+
+def create_retrieval_engine(config_path=None, song_catalog_path=None, shards=None, song_recommender=None) -> RetrievalEngine:
+    """
+    설정된 카탈로그 중 파일이 있는 카탈로그만 불러와 검색 엔진 생성
+
+    Args:
+        config_path (str): 카탈로그 설정 JSON 파일 (DEEP_DIARY_CATALOGS)
+        song_catalog_path (str): 트로트 카탈로그 경로 (PKL 파일 또는 샤드 디렉터리)
+        shards (str): 샤드 디렉터리에서 올릴 샤드 번호 ("0,1" 형식)
+        song_recommender: 이미 불러온 트로트 추천기 (search_rows가 있으면 songs 카탈로그로 그대로 사용)
+    """
+    indexes, errors = {}, {}
+    for name, (schema, path) in load_catalog_config(config_path, song_catalog_path).items():
+        if name == "songs" and path == song_catalog_path and hasattr(song_recommender, "search_rows"):
+            indexes[name] = RecommenderCatalogIndex(schema, song_recommender, path)
+            continue
+        if not path or not os.path.exists(path):
+            errors[name] = f"카탈로그 파일이 없습니다: {path}"
+            continue
+        try:
+            if os.path.isdir(path):
+                from models.catalog_shards import load_song_recommender
+                indexes[name] = RecommenderCatalogIndex(schema, load_song_recommender(path, shards), path)
+            else:
+                indexes[name] = CatalogIndex(schema, path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ '{name}' 카탈로그 로드 실패:", str(e))
+            errors[name] = str(e)
+    print(f"✅ 검색 카탈로그: {', '.join(f'{n}({len(i)})' for n, i in indexes.items()) or '없음'}")
+    return RetrievalEngine(indexes, errors)
+
+
+def build_catalog(name, input_path, output_path, config_path=None, classify_emotion=False, batch_size=16) -> pd.DataFrame:
+    """
+    JSONL/CSV 항목 목록에 E5 임베딩(과 감정)을 추가하여 카탈로그 PKL로 저장
+
+    Args:
+        name (str): 카탈로그 이름 (스키마 선택)
+        input_path (str): .jsonl / .json / .csv 파일
+        output_path (str): 저장할 PKL 파일
+        config_path (str): 카탈로그 설정 JSON 파일
+        classify_emotion (bool): 스키마의 감정 컬럼이 비어 있으면 KoBERT로 분류
+        batch_size (int): E5 배치 크기
+    """
+    config = load_catalog_config(config_path)
+    if name not in config:
+        raise ValueError(f"알 수 없는 카탈로그입니다: {name}")
+    schema = config[name][0]
+    if input_path.endswith(".csv"):
+        df = pd.read_csv(input_path)
+    else:
+        df = pd.read_json(input_path, lines=input_path.endswith(".jsonl"))
+    df = df.dropna(subset=[schema.text]).reset_index(drop=True)
+
+    from models.semantic_embedding import E5Embedder
+    embeddings = E5Embedder().get_embeddings(df[schema.text].astype(str).tolist(), batch_size=batch_size).numpy()
+    df[schema.embedding] = list(embeddings)
+    if schema.emotion and (schema.emotion not in df.columns or df[schema.emotion].isna().any()):
+        if not classify_emotion:
+            raise ValueError(f"'{schema.emotion}' 컬럼이 비어 있습니다. --classify-emotion으로 감정을 분류하세요.")
+        from models.emotion_classification import EmotionClassifier
+        df[schema.emotion] = EmotionClassifier().predict_emotions(df[schema.text].astype(str).tolist())
+    df.to_pickle(output_path)
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="카탈로그 공통 검색 엔진")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="JSONL/CSV로 카탈로그 PKL 생성")
+    build_parser.add_argument("name", help="카탈로그 이름 (songs, books, activities 또는 설정 파일의 이름)")
+    build_parser.add_argument("input")
+    build_parser.add_argument("-o", "--output", required=True)
+    build_parser.add_argument("--config", default=os.environ.get("DEEP_DIARY_CATALOGS"))
+    build_parser.add_argument("--classify-emotion", action="store_true")
+    list_parser = subparsers.add_parser("list", help="설정된 카탈로그와 항목 수 출력")
+    list_parser.add_argument("--config", default=os.environ.get("DEEP_DIARY_CATALOGS"))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        catalog = build_catalog(args.name, args.input, args.output, args.config, args.classify_emotion)
+        print(f"✅ '{args.name}' 카탈로그 {len(catalog)}개 저장: {args.output}")
+    else:
+        print(json.dumps(create_retrieval_engine(args.config).catalogs(), ensure_ascii=False, indent=2))
@@ -1,8 +1,125 @@
+import os
 import torch
 import re
+import tempfile
+import numpy as np
 import pandas as pd
-from transformers import AutoTokenizer, AutoModel, BertForSequenceClassification
-from sklearn.metrics.pairwise import cosine_similarity
+from transformers import AutoTokenizer, AutoModel, AutoConfig, BertForSequenceClassification
+
+
+# 감정 분류 라벨 순서 (EmotionClassifier.label_to_emotion과 동일)
+EMOTION_LABELS = ["중립", "놀람", "분노", "슬픔", "행복", "혐오", "공포"]
+
+
+def emotion_prior_matrix(emotions) -> np.ndarray:
+    """곡별 감정 사전 분포 (곡의 감정에 0.9, 나머지 감정에 0.1을 나눔): (곡 수, 7)"""
+    one_hot = (np.asarray(emotions)[:, None] == np.array(EMOTION_LABELS)[None, :]).astype(np.float32)
+    return np.ascontiguousarray(0.9 * one_hot + 0.1 / len(EMOTION_LABELS))
+
+
+def load_embedding_matrix(df, df_path, mmap=True, column="embedding") -> np.ndarray:
+    """
+    데이터프레임의 임베딩 컬럼을 L2 정규화된 연속 float32 행렬로 변환
+    mmap=True이면 <df_path>.embeddings.npy로 캐시하고 memmap으로 로드 (여러 워커 프로세스가 같은 페이지를 공유)
+
+    Returns:
+        np.ndarray: (행 수, 임베딩 차원) 행렬
+    """
+    cache_path = os.path.splitext(df_path)[0] + ".embeddings.npy"
+    if mmap and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(df_path):
+        try:
+            return np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError, EOFError) as e:
+            print("❌ 임베딩 캐시 로드 실패, 다시 만듭니다:", str(e))
+
+    matrix = np.stack([np.asarray(e, dtype=np.float32).reshape(-1) for e in df[column]])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.ascontiguousarray(matrix)
+    if mmap:
+        try:
+            save_npy(cache_path, matrix)
+            return np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError, EOFError) as e:
+            print("❌ 임베딩 캐시 저장 실패:", str(e))
+    return matrix
+
+
+def save_npy(path, array) -> None:
+    """
+    .npy 캐시를 원자적으로 저장 (프로세스별 임시 파일에 쓴 뒤 os.replace)
+    여러 워커가 동시에 캐시를 만들어도 다른 워커가 쓰는 중인 파일을 memmap으로 열지 않습니다.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def search_catalog(embeddings, emotion_prior, query, k, probs=None, emotion_weight=0.0, candidates=None, reduced=None, rerank=0) -> list:
+    """
+    카탈로그 점수 계산 공통 함수 (SongRecommender, 카탈로그 샤드, 검색 엔진 카탈로그에서 함께 사용)
+    전체 카탈로그(또는 candidates)를 한 번의 행렬-벡터 곱으로 점수 계산 (감정 점수는 (항목 수, 7) 행렬과의 곱)
+    차원 축소를 사용하면 축소 공간 점수로 후보를 고르고, rerank > 0이면 후보만 원본 차원으로 다시 계산
+
+    Args:
+        embeddings (np.ndarray): L2 정규화된 (항목 수, 차원) 행렬
+        emotion_prior (np.ndarray): (항목 수, 7) 감정 사전 분포 (None이면 감정 점수 0)
+        query (np.ndarray): L2 정규화된 질의 벡터
+        k (int): 반환할 항목 수
+        probs (np.ndarray): 감정 확률 7개 (None이면 감정 점수 0)
+        emotion_weight (float): 감정 점수 가중치
+        candidates (np.ndarray): 검색할 행 번호 (None이면 전체)
+        reduced (tuple): (EmbeddingReducer, 축소 벡터, 항목별 offset), None이면 원본 차원에서 검색
+        rerank (int): 축소 공간 상위 rerank개를 원본 차원으로 다시 정렬
+
+    Returns:
+        list[tuple]: 점수 순 (행 번호, 점수, 코사인 유사도, 감정 점수)
+    """
+    rows = np.arange(len(embeddings)) if candidates is None else candidates
+    selector = slice(None) if candidates is None else candidates
+    if reduced is None:
+        similarities = embeddings[selector] @ query
+    else:
+        reducer, vectors, offsets = reduced
+        similarities = reducer.similarities(vectors[selector], offsets[selector], query)
+    if emotion_prior is not None and probs is not None:
+        emotion_scores = emotion_prior[selector] @ probs
+    else:
+        emotion_scores = np.zeros(len(rows), dtype=np.float32)
+    scores = similarities + emotion_weight * emotion_scores
+
+    shortlist = min(max(k, rerank) if reduced is not None else k, len(scores))
+    if shortlist == 0:
+        return []
+    top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+    if reduced is not None and rerank:
+        similarities[top] = embeddings[rows[top]] @ query
+        scores[top] = similarities[top] + emotion_weight * emotion_scores[top]
+    top = top[np.argsort(-scores[top])][:k]
+    return [(int(rows[i]), scores[i].item(), similarities[i].item(), emotion_scores[i].item()) for i in top]
+
+
+def song_result(row, score, similarity, emotion_score, include_lyrics=True) -> dict:
+    """카탈로그 행 -> 점수 내역이 포함된 추천 결과"""
+    recommendation = {
+        "title": row["title"],
+        "artist": row["artist"],
+        "emotion": row["emotion"],
+        "score": round(float(score), 4),
+        "similarity": round(float(similarity), 4),
+        "emotion_score": round(float(emotion_score), 4),
+    }
+    if include_lyrics:
+        recommendation["lyrics"] = row["cleaned_lyrics"]
+    if "aliases" in row.index and len(row["aliases"]):
+        recommendation["aliases"] = list(row["aliases"])
+    return recommendation
 
 
 # E5 임베딩 생성 클래스
@@ -10,10 +127,36 @@ class E5Embedder:
     """
     E5 모델을 활용하여 텍스트를 임베딩 벡터로 변환하는 클래스.
     """
-    def __init__(self, model_path="intfloat/e5-large"):
+    def __init__(self, model_path="intfloat/e5-large", quantize=False, backend="torch"):
+        """
+        Args:
+            model_path (str): E5 모델 이름 또는 경로
+            quantize (bool): CPU int8 동적 양자화 모드 (양자화 결과는 models/quantization.py의 캐시에 저장)
+            backend (str): torch | onnx (ONNX Runtime, 내보낸 그래프는 models/onnx_backend.py의 캐시에 저장)
+        """
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.quantized = quantize
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModel.from_pretrained(model_path).to(self.device)
+        if backend == "onnx":
+            from models.onnx_backend import load_or_export
+            self.device = "cpu"
+            self.model = load_or_export(
+                "e5", [model_path],
+                load_fp32_model=lambda: AutoModel.from_pretrained(model_path),
+                sample_inputs=self.tokenizer(["query: 샘플 문장", "passage: 조금 더 긴 샘플 문장"], return_tensors="pt", padding=True),
+                output_name="last_hidden_state", quantize=quantize,
+            )
+        elif quantize:
+            from models.quantization import load_or_quantize
+            self.device = "cpu"  # 동적 양자화 커널은 CPU 전용
+            self.model = load_or_quantize(
+                "e5", [model_path],
+                build_model=lambda: AutoModel.from_config(AutoConfig.from_pretrained(model_path)),
+                load_fp32_model=lambda: AutoModel.from_pretrained(model_path),
+            )
+        else:
+            self.model = AutoModel.from_pretrained(model_path).to(self.device)
+        self.model.eval()
 
     def get_embedding(self, text):
         """
@@ -26,22 +169,73 @@ class E5Embedder:
         inputs = self.tokenizer(text, return_tensors="pt", truncation=True).to(self.device)
         outputs = self.model(**inputs)
         return outputs.last_hidden_state.mean(dim=1).detach().cpu()
+
+    def get_embeddings(self, texts, batch_size=16):
+        """
+        여러 텍스트를 배치로 임베딩 (패딩 토큰을 제외한 평균 풀링)
+        Args:
+            texts (list[str]): 입력 텍스트 목록
+            batch_size (int): 한 번에 추론할 텍스트 수
+        Returns:
+            torch.Tensor: (len(texts), hidden_size) 임베딩 행렬
+        """
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(texts[start:start + batch_size], return_tensors="pt", truncation=True, padding=True).to(self.device)
+            with torch.no_grad():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            embeddings.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1)).cpu())
+        return torch.cat(embeddings, dim=0)
     
     
 class SongRecommender:
     """
     감정이 동일한 트로트 가사 중 가장 유사한 가사를 추천하는 클래스.
     """
-    def __init__(self, df_path="data/trot_embeddings_emotion.pkl"):
+    def __init__(self, df_path="data/trot_embeddings_emotion.pkl", mmap=True, reduced=None, rerank=0):
         """
         트로트 데이터셋을 로드하고, 감정 분석이 추가된 경우 사용.
         Args:
             df_path (str): 저장된 트로트 데이터프레임 경로 (PKL 파일)
+            mmap (bool): 정규화된 임베딩 행렬을 .npy 파일로 캐시하고 memmap으로 로드
+                         (여러 워커 프로세스가 같은 페이지를 공유)
+            reduced (str): 차원 축소 파일(models/embedding_reduction.py의 .npz)을 지정하면 축소 공간에서 검색
+            rerank (int): 축소 공간 상위 rerank곡을 원본 차원으로 다시 정렬 (0이면 축소 공간 점수 그대로 사용)
         """
         self.df = pd.read_pickle(df_path)
         if "embedding" not in self.df.columns or "emotion" not in self.df.columns:
             raise ValueError("데이터프레임에 'embedding' 또는 'emotion' 컬럼이 없습니다. 확인해주세요.")
-        self.embedder = E5Embedder()
+        self.embeddings = self._load_embedding_matrix(df_path, mmap)
+        self.emotions = self.df["emotion"].to_numpy()
+        self.emotion_prior = emotion_prior_matrix(self.emotions)
+        # 행마다 들어 있는 텐서 객체는 행렬로 옮겼으므로 제거 (fork 후 참조 카운트로 인한 페이지 복사 방지)
+        self.df = self.df.drop(columns=["embedding"]).reset_index(drop=True)
+        self.reducer = None
+        self.rerank = rerank
+        if reduced:
+            from models.embedding_reduction import EmbeddingReducer
+            self.reducer, self.reduced_vectors, self.reduced_offsets = EmbeddingReducer.load(reduced, mmap)
+            if len(self.reduced_vectors) != len(self.df):
+                raise ValueError(f"차원 축소 파일의 곡 수({len(self.reduced_vectors)})가 카탈로그({len(self.df)})와 다릅니다: {reduced}")
+
+    def __len__(self):
+        return len(self.df)
+
+    def _load_embedding_matrix(self, df_path, mmap):
+        """
+        'embedding' 컬럼을 L2 정규화된 연속 float32 행렬로 변환
+        Returns:
+            np.ndarray: (곡 수, 임베딩 차원) 행렬
+        """
+        return load_embedding_matrix(self.df, df_path, mmap)
+
+    def freeze(self):
+        """읽기 전용으로 고정 (prefork 모드에서 부모 프로세스가 호출)"""
+        if isinstance(self.embeddings, np.ndarray) and not isinstance(self.embeddings, np.memmap):
+            self.embeddings.setflags(write=False)
+        self.emotion_prior.setflags(write=False)
+        return self
 
     def recommend_song(self, diary_embedding, emotion):
         """
@@ -52,29 +246,78 @@ class SongRecommender:
         Returns:
             dict: 가장 유사한 트로트 가사 정보
         """
-
-        filtered_df = self.df[self.df["emotion"] == emotion]
+        candidates = np.flatnonzero(self.emotions == emotion)
 
         # 감정이 일치하는 곡이 없는 경우
-        if filtered_df.empty:
+        if candidates.size == 0:
             return {"message": f"'{emotion}' 감정에 해당하는 트로트 곡을 찾을 수 없습니다."}
 
-        similarities = []
-        for _, row in filtered_df.iterrows():
-            similarity = cosine_similarity(diary_embedding.numpy(), row["embedding"].numpy())[0][0]
-            similarities.append((row["title"], row["artist"], row["cleaned_lyrics"], similarity))
+        # 정규화된 벡터의 내적 = 코사인 유사도
+        query = np.asarray(diary_embedding, dtype=np.float32).reshape(-1)
+        query = query / np.linalg.norm(query)
 
         # 가장 유사한 곡 찾기
-        best_match = sorted(similarities, key=lambda x: x[3], reverse=True)[0]
+        best, _, similarity, _ = self._search(query, 1, candidates=candidates)[0]
+        best_match = self.df.iloc[best]
 
-        return {
-            "title": best_match[0],
-            "artist": best_match[1],
-            "lyrics": best_match[2],
-            "similarity": round(float(best_match[3]), 4)
+        recommendation = {
+            "title": best_match["title"],
+            "artist": best_match["artist"],
+            "lyrics": best_match["cleaned_lyrics"],
+            "similarity": round(float(similarity), 4)
         }
-        
-        
+        # 중복 제거된 카탈로그(models/catalog_dedup.py)면 같은 가사의 다른 제목/가수도 함께 반환
+        if "aliases" in self.df.columns and len(best_match["aliases"]):
+            recommendation["aliases"] = list(best_match["aliases"])
+        return recommendation
+
+    def recommend_songs(self, diary_embedding, emotion_probs, k=5, emotion_weight=0.05, include_lyrics=True):
+        """
+        감정 확률로 가중한 전체 카탈로그 점수 상위 k곡 추천 (감정으로 후보를 거르지 않음)
+
+        점수 = 코사인 유사도 + emotion_weight * (곡의 감정 사전 분포 · 감정 확률)
+        E5 코사인 유사도는 대부분 0.85~0.97 범위에 몰려 있으므로 emotion_weight는 작은 값으로도 순위가 바뀝니다.
+
+        Args:
+            diary_embedding (torch.Tensor | np.ndarray): 다이어리 텍스트 임베딩 벡터
+            emotion_probs (list[float] | dict): EMOTION_LABELS 순서의 감정 확률 7개 또는 {감정: 확률}
+            k (int): 추천할 곡 수
+            emotion_weight (float): 감정 점수 가중치
+            include_lyrics (bool): 가사 포함 여부
+
+        Returns:
+            list[dict]: 점수 순 추천 곡 (score, similarity, emotion_score 포함)
+        """
+        if isinstance(emotion_probs, dict):
+            emotion_probs = [emotion_probs.get(e, 0.0) for e in EMOTION_LABELS]
+        probs = np.asarray(emotion_probs, dtype=np.float32).reshape(-1)
+        query = np.asarray(diary_embedding, dtype=np.float32).reshape(-1)
+        query = query / np.linalg.norm(query)
+
+        return [
+            song_result(row, score, similarity, emotion_score, include_lyrics)
+            for row, score, similarity, emotion_score in self.search_rows(query, probs, k, emotion_weight)
+        ]
+
+    def search_rows(self, query, probs=None, k=5, emotion_weight=0.05) -> list:
+        """
+        감정 확률 가중 점수 상위 k곡의 카탈로그 행 (검색 엔진의 songs 카탈로그도 이 결과를 사용)
+
+        Args:
+            query (np.ndarray): L2 정규화된 질의 벡터
+            probs (np.ndarray): 감정 확률 7개 (None이면 감정 점수 0)
+
+        Returns:
+            list[tuple]: 점수 순 (행(pd.Series), 점수, 코사인 유사도, 감정 점수)
+        """
+        return [(self.df.iloc[i], score, similarity, emotion_score) for i, score, similarity, emotion_score in self._search(query, k, probs, emotion_weight)]
+
+    def _search(self, query, k, probs=None, emotion_weight=0.0, candidates=None) -> list:
+        """search_catalog()에 이 카탈로그의 행렬과 차원 축소 설정을 넘겨 검색"""
+        reduced = (self.reducer, self.reduced_vectors, self.reduced_offsets) if self.reducer is not None else None
+        return search_catalog(self.embeddings, self.emotion_prior, query, k, probs, emotion_weight, candidates, reduced, self.rerank)
+
+
 if __name__ == "__main__":
     # 모델 및 데이터 로드
     embedder = E5Embedder()
@@ -0,0 +1,279 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+
+from service import metrics
+from service.deadlines import track_abandoned
+
+ADMISSION_REJECTED = metrics.registry.register(metrics.Counter(
+    "deep_diary_admission_rejected_total", "입장 제어로 거절된 요청 수", ["queue", "reason"]
+))
+
+
+class AdmissionRejected(Exception):
+    """대기열이 가득 차서 요청을 받을 수 없는 경우 (429: 클라이언트별 한도 초과, 503: 서버 전체 한도 초과)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Ticket:
+    def __init__(self, client_id, future):
+        self.client_id = client_id
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    무거운 단계(LLaVA 캡션, 모델/Gemini 호출) 앞의 입장 제어 (이벤트 루프 안에서만 사용, 워커 프로세스별로 동작)
+
+    - concurrency개까지만 동시에 실행하고 나머지는 대기열에서 기다림
+    - 대기열은 클라이언트별 라운드로빈이라 한 클라이언트가 요청을 몰아 보내도 다른 클라이언트가 밀리지 않음
+    - 최근 처리 시간의 지수 이동 평균으로 예상 대기 시간을 계산하고, 한도를 넘으면 기다리게 하지 않고 바로 거절
+    """
+
+    def __init__(self, name, concurrency=1, max_queue=16, max_per_client=2, max_wait=60.0, initial_service_time=1.0):
+        """
+        Args:
+            name (str): 대기열 이름 (지표 라벨)
+            concurrency (int): 동시에 실행할 작업 수
+            max_queue (int): 대기열 최대 길이 (초과 시 503)
+            max_per_client (int): 클라이언트별 실행+대기 중인 요청 최대 개수 (초과 시 429)
+            max_wait (float): 예상 대기 시간 한도(초, 초과 시 503)
+            initial_service_time (float): 처리 시간 측정값이 없을 때 사용할 추정치(초)
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.max_wait = max_wait
+        self.service_time = initial_service_time
+        self.active = 0
+        self._queues = OrderedDict()  # client_id -> deque[_Ticket] (라운드로빈 순서)
+        self._client_counts = {}  # client_id -> 실행+대기 중인 요청 수
+        self._holders = set()  # 버려진 작업이 끝나기를 기다리는 슬롯 반환 태스크
+        metrics.QUEUE_DEPTH.set_function(lambda: self.waiting, queue=f"admission_{name}")
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _fair_order(self) -> list:
+        """대기 중인 요청을 실제로 실행될 순서(클라이언트별 라운드로빈)로 나열"""
+        queues = [list(q) for q in self._queues.values()]
+        order = []
+        for depth in range(max((len(q) for q in queues), default=0)):
+            order.extend(q[depth] for q in queues if depth < len(q))
+        return order
+
+    def estimate_wait(self, ahead: int) -> float:
+        """앞에 ahead개의 요청이 기다리고 있을 때 예상 대기 시간(초)"""
+        if self.active < self.concurrency and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self.service_time / self.concurrency
+
+    def position(self, client_id) -> dict:
+        """클라이언트의 가장 앞선 대기 요청의 순번(1부터)과 예상 대기 시간"""
+        order = self._fair_order()
+        for index, ticket in enumerate(order):
+            if ticket.client_id == client_id:
+                return {"position": index + 1, "estimated_wait": round(self.estimate_wait(index), 1)}
+        return {"position": 0, "estimated_wait": 0.0}
+
+    def status(self, client_id=None) -> dict:
+        status = {
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 2),
+        }
+        if client_id is not None:
+            status.update(self.position(client_id))
+        return status
+
+    def _reject(self, status_code, reason, detail, retry_after):
+        ADMISSION_REJECTED.inc(queue=self.name, reason=reason)
+        raise AdmissionRejected(status_code, detail, retry_after)
+
+    def check(self, client_id) -> None:
+        """
+        지금 요청하면 받아들여질지 확인 (대기열에 넣지는 않음)
+        업로드처럼 본문을 읽기 전에 빠르게 거절하고 싶을 때 사용
+        """
+        if self._client_counts.get(client_id, 0) >= self.max_per_client:
+            self._reject(429, "client", "이전 요청이 아직 처리 중입니다. 잠시 후 다시 시도해주세요.", self.service_time)
+        if self.active < self.concurrency and not self._queues:
+            return
+        waiting = self.waiting
+        if waiting >= self.max_queue:
+            self._reject(503, "queue_full", "요청이 많아 잠시 후 다시 시도해주세요.", self.service_time / self.concurrency)
+        estimated = self.estimate_wait(waiting)
+        if estimated > self.max_wait:
+            self._reject(503, "wait", f"예상 대기 시간({estimated:.0f}초)이 너무 깁니다. 잠시 후 다시 시도해주세요.", estimated - self.max_wait)
+
+    def _enter(self, client_id):
+        self.check(client_id)
+        if self.active < self.concurrency and not self._queues:
+            self.active += 1
+            self._client_counts[client_id] = self._client_counts.get(client_id, 0) + 1
+            return None
+        ticket = _Ticket(client_id, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(client_id, deque()).append(ticket)
+        self._client_counts[client_id] = self._client_counts.get(client_id, 0) + 1
+        return ticket
+
+    def _remove(self, ticket):
+        queue = self._queues.get(ticket.client_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.client_id]
+
+    def _release(self, client_id, elapsed):
+        self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+        self._client_counts[client_id] -= 1
+        if not self._client_counts[client_id]:
+            del self._client_counts[client_id]
+        self.active -= 1
+        self._grant_next()
+
+    def _release_after(self, client_id, start, futures):
+        """마감 시간을 넘겨 버려진 작업이 실제로 끝난 뒤 슬롯 반환 (응답은 먼저 보냄)"""
+        async def wait():
+            await asyncio.wait([asyncio.wrap_future(f) for f in futures])
+            self._release(client_id, time.perf_counter() - start)
+
+        task = asyncio.get_running_loop().create_task(wait())
+        self._holders.add(task)
+        task.add_done_callback(self._holders.discard)
+
+    def _grant_next(self):
+        while self.active < self.concurrency and self._queues:
+            client_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # 실행 기회를 받은 클라이언트는 라운드로빈 순서의 맨 뒤로 이동
+            del self._queues[client_id]
+            if queue:
+                self._queues[client_id] = queue
+            if ticket.future.done():  # 대기 중에 연결이 끊긴 요청
+                continue
+            self.active += 1
+            metrics.observe_stage(f"queue_{self.name}", time.perf_counter() - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, client_id):
+        """
+        실행 슬롯을 얻을 때까지 대기 (한도를 넘으면 AdmissionRejected)
+
+        사용 예:
+            async with caption_admission.slot(client_id):
+                caption = await asyncio.to_thread(chatbot.generate_image_caption, path, True)
+        """
+        ticket = self._enter(client_id)
+        if ticket is not None:
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket.future.done() and not ticket.future.cancelled():
+                    # 슬롯을 받은 직후 취소된 경우 슬롯 반환
+                    self._release(client_id, self.service_time)
+                else:
+                    self._remove(ticket)
+                    self._client_counts[client_id] -= 1
+                    if not self._client_counts[client_id]:
+                        del self._client_counts[client_id]
+                raise
+        start = time.perf_counter()
+        abandoned = track_abandoned()
+        try:
+            yield
+        finally:
+            # 마감 시간을 넘겨 대체 응답을 돌려준 모델 호출이 아직 스레드풀에서 실행 중이면
+            # 그 작업이 끝날 때까지 슬롯을 반환하지 않음 (동시 실행 수 제한이 실제 부하와 맞도록)
+            pending = [f for f in abandoned if not f.done()]
+            if pending:
+                self._release_after(client_id, start, pending)
+            else:
+                self._release(client_id, time.perf_counter() - start)
+
+
+class AdmissionPrecheckMiddleware:
+    """
+    업로드 본문을 받기 전에 대기열 상태를 확인하는 ASGI 미들웨어
+    대기열이 가득 찼다면 multipart 본문을 읽고 임시 파일에 쓰기 전에 429/503(Retry-After)으로 바로 거절합니다.
+    """
+
+    def __init__(self, app, controllers, paths):
+        """
+        Args:
+            app: ASGI 앱
+            controllers (dict): 대기열 이름 -> AdmissionController
+            paths (dict): POST 경로 -> 대기열 이름 (multipart 업로드 요청만 확인)
+        """
+        self.app = app
+        self.controllers = controllers
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        queue = self.paths.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if queue is not None:
+            connection = HTTPConnection(scope)
+            if connection.headers.get("content-type", "").startswith("multipart/form-data"):
+                try:
+                    self.controllers[queue].check(connection.cookies.get("client_id"))
+                except AdmissionRejected as e:
+                    response = JSONResponse(
+                        {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+                    )
+                    return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+def create_admission_controllers() -> dict:
+    """
+    환경 변수 설정으로 대기열 생성
+    DEEP_DIARY_CAPTION_CONCURRENCY / _QUEUE / _PER_CLIENT / _MAX_WAIT: LLaVA 캡션 (기본값 1 / 16 / 1 / 120)
+    DEEP_DIARY_TEXT_CONCURRENCY / _QUEUE / _PER_CLIENT / _MAX_WAIT: 질문/초안 생성, 추천 (기본값 8 / 64 / 2 / 30)
+    DEEP_DIARY_BATCH_CONCURRENCY / _QUEUE / _PER_CLIENT / _MAX_WAIT: NDJSON 일괄 처리 (기본값 1 / 4 / 1 / 3600)
+    """
+    def env(prefix, key, default):
+        return type(default)(os.environ.get(f"DEEP_DIARY_{prefix}_{key}", default))
+
+    return {
+        "caption": AdmissionController(
+            "caption",
+            concurrency=env("CAPTION", "CONCURRENCY", 1),
+            max_queue=env("CAPTION", "QUEUE", 16),
+            max_per_client=env("CAPTION", "PER_CLIENT", 1),
+            max_wait=env("CAPTION", "MAX_WAIT", 120.0),
+            initial_service_time=5.0,
+        ),
+        "text": AdmissionController(
+            "text",
+            concurrency=env("TEXT", "CONCURRENCY", 8),
+            max_queue=env("TEXT", "QUEUE", 64),
+            max_per_client=env("TEXT", "PER_CLIENT", 2),
+            max_wait=env("TEXT", "MAX_WAIT", 30.0),
+            initial_service_time=1.0,
+        ),
+        "batch": AdmissionController(
+            "batch",
+            concurrency=env("BATCH", "CONCURRENCY", 1),
+            max_queue=env("BATCH", "QUEUE", 4),
+            max_per_client=env("BATCH", "PER_CLIENT", 1),
+            max_wait=env("BATCH", "MAX_WAIT", 3600.0),
+            initial_service_time=60.0,
+        ),
+    }
@@ -1,17 +1,97 @@
 import streamlit as st
 import requests
-from PIL import Image
+from PIL import Image, ImageOps
+import hashlib
 import io
-import time
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from websockets.sync.client import connect as ws_connect
+    from websockets.exceptions import WebSocketException
+except ImportError:  # websockets가 없으면 HTTP 엔드포인트만 사용
+    ws_connect = None
+    WebSocketException = Exception
 
 # FastAPI 서버 주소
 API_URL = "http://localhost:8031"
+WS_URL = API_URL.replace("http", "ws", 1)
 
 st.set_page_config(page_title="Deep Diary", layout="centered")
 
+class ChatConnection:
+    """
+    대화용 WebSocket 연결 (Streamlit 세션 동안 연결 하나를 유지)
+    websockets 패키지가 없거나 서버에 연결할 수 없으면 기존 HTTP 엔드포인트로 대체
+    """
+
+    def __init__(self, http_session):
+        self.http = http_session
+        self.ws = None
+
+    def _connect(self):
+        if ws_connect is None:
+            return None
+        if self.ws is None:
+            cookie = "; ".join(f"{name}={value}" for name, value in self.http.cookies.items())
+            try:
+                self.ws = ws_connect(f"{WS_URL}/ws/chat", additional_headers={"Cookie": cookie} if cookie else None, open_timeout=5)
+                hello = json.loads(self.ws.recv())
+                # 캡션 업로드 등 HTTP 요청도 같은 세션을 사용하도록 쿠키 동기화
+                if "client_id" not in self.http.cookies:
+                    self.http.cookies.set("client_id", hello["client_id"])
+            except (OSError, WebSocketException):
+                self.ws = None
+        return self.ws
+
+    def request(self, message, on_emotion=None) -> dict:
+        """
+        메시지를 보내고 최종 응답(question | summary | error)을 반환
+        후속 질문보다 먼저 도착하는 감정 분석 결과는 on_emotion 콜백으로 전달
+        """
+        ws = self._connect()
+        if ws is None:
+            return self._request_http(message, on_emotion)
+        try:
+            ws.send(json.dumps(message, ensure_ascii=False))
+            while True:
+                reply = json.loads(ws.recv())
+                if reply["type"] != "emotion":
+                    return reply
+                if on_emotion:
+                    on_emotion(reply["emotion"])
+        except (OSError, WebSocketException):
+            # 요청이 처리됐는지 알 수 없으므로 재전송하지 않고, 다음 요청에서 다시 연결
+            self.ws = None
+            return {"type": "error", "detail": "서버 연결이 끊어졌습니다. 다시 시도해주세요."}
+
+    def _request_http(self, message, on_emotion=None) -> dict:
+        kind = message["type"]
+        if kind == "initial_question":
+            resp = self.http.get(f"{API_URL}/initial_question")
+        elif kind == "answer":
+            resp = self.http.post(f"{API_URL}/followup_question", json={"user_answer": message["text"]})
+        elif kind == "summarize":
+            resp = self.http.get(f"{API_URL}/summarize_conversation")
+        else:
+            resp = self.http.post(f"{API_URL}/regenerate_summarize", json={"user_changes": message["text"]})
+        if resp.status_code != 200:
+            return {"type": "error", "detail": resp.text}
+        data = resp.json()
+        if kind == "initial_question":
+            return {"type": "question", "text": data["question"]}
+        if kind == "answer":
+            if on_emotion:
+                on_emotion(data["emotion"])
+            return {"type": "question", "text": data["followup_question"], "emotion": data["emotion"]}
+        return {"type": "summary", "diary_summary": data["diary_summary"], "final_emotion": data["final_emotion"]}
+
+
 # 세션 객체 생성 (쿠키 유지)
 if "session" not in st.session_state:
     st.session_state.session = requests.Session()
+if "chat" not in st.session_state:
+    st.session_state.chat = ChatConnection(st.session_state.session)
 
 # 상태 변수 초기화
 if "chat_history" not in st.session_state:
@@ -25,6 +105,79 @@ if "final_diary" not in st.session_state:
 if "diary_completed" not in st.session_state:
     st.session_state.diary_completed = False
 
+def post_with_queue_status(url, queue_name="caption", **kwargs):
+    """
+    무거운 요청을 백그라운드에서 보내고, 끝날 때까지 서버 대기열의 순번/예상 대기 시간을 표시
+    (응답이 0.5초 안에 오면 대기열을 조회하지 않고 바로 반환)
+    """
+    status = st.empty()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(st.session_state.session.post, url, **kwargs)
+        while not wait([future], timeout=0.5).done:
+            try:
+                queue = requests.get(f"{API_URL}/queue_status", cookies=st.session_state.session.cookies, timeout=2).json()[queue_name]
+                if queue.get("position"):
+                    status.info(f"대기 순번 {queue['position']}번 (예상 대기 {queue['estimated_wait']:.0f}초)")
+                elif queue["waiting"]:
+                    status.info(f"대기 중인 요청 {queue['waiting']}개, 잠시만 기다려주세요...")
+                else:
+                    status.info("이미지를 분석하고 있어요...")
+            except (requests.RequestException, KeyError, ValueError):
+                pass
+    status.empty()
+    return future.result()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def resize_jpeg(digest, _data, max_side, quality=85) -> bytes:
+    """
+    긴 변이 max_side 이하인 JPEG으로 변환 (이미지 해시 기준으로 캐시, 원본 바이트는 해시 계산에서 제외)
+    JPEG은 draft()로 축소된 크기로 바로 디코딩하여 전체 해상도 디코딩을 피함
+    """
+    image = Image.open(io.BytesIO(_data))
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((max_side, max_side))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+@st.cache_resource
+def known_captions() -> dict:
+    """
+    이미지 해시 -> 캡션 (Streamlit 프로세스 전체에서 공유하므로 세션 상태가 사라져도 유지)
+    """
+    return {}
+
+def uploaded_digests() -> set:
+    """이 세션에서 서버에 이미 업로드한 이미지 해시 (서버도 같은 세션이 올린 이미지만 해시로 재사용)"""
+    if "uploaded_digests" not in st.session_state:
+        st.session_state.uploaded_digests = set()
+    return st.session_state.uploaded_digests
+
+def request_caption(name, data, mime):
+    """
+    캡션 요청: 이미 업로드한 이미지면 해시만 보내고, 서버에 없으면(404) 파일을 업로드
+    캡션을 이미 받은 이미지면 서버도 같은 해시의 캡션을 캐시에서 바로 돌려주므로 대기열 상태를 조회하지 않음
+    (서버 세션에 캡션을 설정해야 하므로 요청 자체는 보냄)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    if digest in known_captions():
+        post = st.session_state.session.post
+    else:
+        post = post_with_queue_status
+    if digest in uploaded_digests():
+        response = post(f"{API_URL}/generate_caption", data={"image_sha256": digest})
+        if response.status_code != 404:
+            return response
+    response = post(f"{API_URL}/generate_caption", files={"file": (name, data, mime)})
+    if response.status_code == 200:
+        uploaded_digests().add(digest)
+        captions = known_captions()
+        captions[digest] = response.json().get("caption", "")
+        while len(captions) > 256:
+            captions.pop(next(iter(captions)))
+    return response
+
 def add_message(role, content):
     """채팅 메시지를 session_state에 저장"""
     st.session_state.chat_history.append({"role": role, "content": content})
@@ -37,28 +190,34 @@ st.title("Deep Diary")
 
 uploaded_file = st.file_uploader("오늘의 사진을 업로드해주세요", type=["jpg", "jpeg", "png"])
 
+with st.sidebar:
+    downscale = st.checkbox("사진을 줄여서 업로드 (JPEG, 긴 변 1024px)", value=False)
+
 if uploaded_file:
-    if "last_uploaded_file" not in st.session_state or st.session_state.last_uploaded_file != uploaded_file.name:
+    raw_bytes = uploaded_file.getvalue()
+    image_digest = hashlib.sha256(raw_bytes).hexdigest()
+    if st.session_state.get("image_digest") != image_digest:
         st.session_state.caption_generated = False
-        st.session_state.last_uploaded_file = uploaded_file.name
+        st.session_state.image_digest = image_digest
 
-    image = Image.open(uploaded_file)
-    st.image(image, use_container_width=True)
+    # 화면에는 썸네일만 표시
+    st.image(resize_jpeg(image_digest, raw_bytes, 512), use_container_width=True)
 
     if not st.session_state.caption_generated:
-        # 백엔드 호출하여 캡션 생성
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format=image.format)
-        img_bytes = img_bytes.getvalue()
-
-        files = {'file': (uploaded_file.name, img_bytes, f'image/{image.format.lower()}')}
-        
-        response = st.session_state.session.post(f"{API_URL}/generate_caption", files=files)
+        # 백엔드 호출하여 캡션 생성 (원본 바이트를 그대로 보내거나, 선택 시 축소한 JPEG 전송)
+        if downscale:
+            response = request_caption("photo.jpg", resize_jpeg(image_digest, raw_bytes, 1024), "image/jpeg")
+        else:
+            response = request_caption(uploaded_file.name, raw_bytes, uploaded_file.type or "application/octet-stream")
         if response.status_code == 200:
             st.session_state.caption_generated = True
             caption = response.json().get("caption", "")
             # add_message("assistant", caption)
             st.success("이미지 분석 완료! 이제 질문을 받아볼 수 있어요.")
+        elif response.status_code in (429, 503):
+            # 대기열이 가득 찬 경우 서버가 알려준 시간 후에 다시 시도하도록 안내
+            detail = response.json().get("detail", "")
+            st.warning(f"{detail} ({response.headers.get('Retry-After', '?')}초 후 다시 시도해주세요)")
         else:
             st.error("이미지 캡션 생성 실패: " + response.text)
 
@@ -67,20 +226,29 @@ if uploaded_file:
 # **일기 쓰기 시작**
 # ==============================
 if st.button("일기 쓰기 시작"):
-    resp = st.session_state.session.get(f"{API_URL}/initial_question")
-    if resp.status_code == 200:
-        question = resp.json().get("question", "")
-        add_message("assistant", question)
+    reply = st.session_state.chat.request({"type": "initial_question"})
+    if reply["type"] == "question":
+        add_message("assistant", reply["text"])
     else:
-        st.error("첫 번째 질문 가져오기 실패: " + resp.text)
+        st.error("첫 번째 질문 가져오기 실패: " + reply["detail"])
 
 
 # ==============================
 # **대화 내역 표시**
 # ==============================
-for msg in st.session_state.chat_history:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+# 새 메시지는 페이지를 다시 그리지 않고 이 컨테이너에 바로 추가
+chat_box = st.container()
+with chat_box:
+    for msg in st.session_state.chat_history:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+def show_message(role, content):
+    """메시지를 저장하고 대화 내역 컨테이너에 바로 표시"""
+    add_message(role, content)
+    with chat_box:
+        with st.chat_message(role):
+            st.markdown(content)
 
 
 # ==============================
@@ -89,20 +257,23 @@ for msg in st.session_state.chat_history:
 user_input = st.chat_input("답변을 입력해보세요")
 
 if user_input:
-    add_message("user", user_input)
-    
-    # 백엔드에 사용자 입력 전송
-    resp = st.session_state.session.post(f"{API_URL}/followup_question", json={"user_answer": user_input})
-    if resp.status_code == 200:
-        data = resp.json()
-        emotion = data["emotion"]
-        next_q = data["followup_question"]
-        add_message("assistant", f"감정: {emotion}\n\n{next_q}")
-    else:
-        add_message("assistant", f"오류가 발생했습니다: {resp.text}")
-    
-    time.sleep(0.2)
-    st.rerun()
+    show_message("user", user_input)
+
+    # 백엔드에 사용자 입력 전송 (감정 분석 결과를 먼저 표시하고 후속 질문이 오면 갱신)
+    with chat_box:
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("답변을 읽고 있어요...")
+            reply = st.session_state.chat.request(
+                {"type": "answer", "text": user_input},
+                on_emotion=lambda emotion: placeholder.markdown(f"감정: {emotion}\n\n다음 질문을 생각하고 있어요..."),
+            )
+            if reply["type"] == "question":
+                content = f"감정: {reply['emotion']}\n\n{reply['text']}"
+            else:
+                content = f"오류가 발생했습니다: {reply['detail']}"
+            placeholder.markdown(content)
+    add_message("assistant", content)
 
 
 # ==============================
@@ -111,14 +282,14 @@ if user_input:
 def summarize_conversation():
     """백엔드에서 대화 요약 및 감정 분석 요청"""
     try:
-        resp = st.session_state.session.get(f"{API_URL}/summarize_conversation")
-        if resp.status_code == 200:
-            data = resp.json()
-            st.session_state.diary_summary = data["diary_summary"]
+        reply = st.session_state.chat.request({"type": "summarize"})
+        if reply["type"] == "summary":
+            st.session_state.diary_summary = reply["diary_summary"]
+            st.session_state.final_emotion = reply["final_emotion"]
             st.session_state.diary_completed = True
             add_message("assistant", st.session_state.diary_summary)
         else:
-            st.error(f"요약 실패: {resp.text}")
+            st.error(f"요약 실패: {reply['detail']}")
     except Exception as e:
         st.error(f"서버 요청 실패: {e}")
 
@@ -134,17 +305,13 @@ def regenerate_diary(user_changes):
     user_changes = user_changes.strip()  # 공백 제거
 
     if user_changes:  # 빈 입력이 아닐 때만 실행
-        resp = st.session_state.session.post(f"{API_URL}/regenerate_summarize", json={"user_changes": user_changes})
-        if resp.status_code == 200:
-            data = resp.json()
-            st.session_state.diary_summary = data["diary_summary"]
-            add_message("assistant", f"수정된 일기 초안:\n\n{st.session_state.diary_summary}")
-
-            # `session_state.user_changes`를 직접 변경하지 않음
-            time.sleep(0.5)
-            st.rerun()
+        reply = st.session_state.chat.request({"type": "regenerate", "text": user_changes})
+        if reply["type"] == "summary":
+            st.session_state.diary_summary = reply["diary_summary"]
+            st.session_state.final_emotion = reply["final_emotion"]
+            show_message("assistant", f"수정된 일기 초안:\n\n{st.session_state.diary_summary}")
         else:
-            st.error(f"초안 재생성 실패: {resp.text}")
+            st.error(f"초안 재생성 실패: {reply['detail']}")
 
 if st.session_state.diary_completed:
     st.subheader("일기 초안 새로 생성")
@@ -157,7 +324,7 @@ if st.session_state.diary_completed:
         # 버튼 클릭 시 `user_changes` 값을 매개변수로 전달
         if st.button("일기 초안 새로 생성"):
             if user_changes.strip():  # 입력값이 있을 때만 실행
-                add_message("user", user_changes)
+                show_message("user", user_changes)
                 regenerate_diary(user_changes)
 
     with col2:
@@ -183,25 +350,54 @@ if st.session_state.get("show_final_diary", False):  # "최종 일기 작성" 
     )
 
     if st.button("일기 저장"):
-        add_message("assistant", f"저장된 일기:\n\n{final_diary}")
-        st.success("일기가 저장되었습니다.")
+        resp = st.session_state.session.post(f"{API_URL}/save_diary", json={"diary": final_diary})
+        if resp.status_code == 200:
+            show_message("assistant", f"저장된 일기:\n\n{final_diary}")
+            st.success("일기가 저장되었습니다.")
+        else:
+            st.error(f"일기 저장 실패: {resp.text}")
 
 
 # ==============================
 # **트로트 추천 기능**
 # ==============================
+def fetch_recommendation(session) -> dict:
+    """트로트 추천 요청 (실패하면 requests.HTTPError)"""
+    resp = session.get(f"{API_URL}/recommend_song")
+    resp.raise_for_status()
+    return resp.json().get("recommended_song", {})
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_recommendation(draft_digest, _session) -> dict:
+    """
+    일기 초안 해시 기준으로 추천 결과 캐시 (Streamlit 프로세스 전체에서 공유하므로 세션 상태가 사라져도 유지)
+    실패한 요청은 예외가 발생하므로 캐시되지 않음
+    """
+    return fetch_recommendation(_session)
+
 def recommend_song():
     """백엔드에서 트로트 추천 요청"""
     if "recommended_song" not in st.session_state:
         st.session_state.recommended_song = None  # 초기화
 
+    # 추천은 사용자 답변과 일기 초안(의 감정)으로 결정되므로 같은 내용이면 캐시된 결과 사용
     try:
-        resp = st.session_state.session.get(f"{API_URL}/recommend_song")
-        if resp.status_code == 200:
-            st.session_state.recommended_song = resp.json().get("recommended_song", {})
-            st.session_state.show_trot = True  # 트로트 추천 UI 활성화
+        if st.session_state.diary_completed:
+            content = json.dumps(
+                [
+                    [msg["content"] for msg in st.session_state.chat_history if msg["role"] == "user"],
+                    st.session_state.diary_summary,
+                    st.session_state.get("final_emotion"),
+                ],
+                ensure_ascii=False,
+            )
+            draft_digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            st.session_state.recommended_song = cached_recommendation(draft_digest, st.session_state.session)
         else:
-            st.error(f"추천 실패: {resp.text}")
+            st.session_state.recommended_song = fetch_recommendation(st.session_state.session)
+        st.session_state.show_trot = True  # 트로트 추천 UI 활성화
+    except requests.HTTPError as e:
+        st.error(f"추천 실패: {e.response.text}")
     except Exception as e:
         st.error(f"서버 요청 실패: {e}")
 
@@ -0,0 +1,180 @@
+"""
+대량 감정 분석 / 트로트 추천 (NDJSON 스트리밍)
+
+입력: 한 줄에 JSON 객체 하나
+    {"id": "2024-03-01", "text": "오늘은 ..."}
+    recommend는 "emotion"을 함께 주면 감정 분석을 생략
+출력: 입력 순서대로 한 줄에 결과 하나
+    emotion:   {"id": ..., "emotion": "행복"}
+    recommend: {"id": ..., "emotion": "행복", "title": ..., "artist": ..., "score": 0.87, "similarity": 0.83}
+    잘못된 줄: {"line": 3, "error": "..."} (나머지 줄은 계속 처리)
+
+입력을 chunk_size개씩 묶어 EmotionClassifier.predict_emotions / predict_probas, E5Embedder.get_embeddings로 배치 추론하고,
+묶음마다 결과를 바로 내보내므로 입력 크기와 관계없이 메모리 사용량이 일정합니다.
+추천은 대화형 추천과 같은 감정 확률 가중 방식(SongRecommender.recommend_songs)을 사용합니다.
+
+서버 요청 한도: 본문 DEEP_DIARY_BATCH_MAX_BYTES(기본 64MB), 줄 수 DEEP_DIARY_BATCH_MAX_ROWS(기본 100000), 넘으면 413
+
+사용법 (프로젝트 루트에서):
+    python -m service.batch emotion diaries.jsonl -o emotions.jsonl
+    python -m service.batch recommend diaries.jsonl -o songs.jsonl --url http://localhost:8031
+"""
+import json
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from models.semantic_embedding import EMOTION_LABELS
+from service.metrics import stage_timer
+
+DEFAULT_CHUNK_SIZE = 64
+MAX_CHUNK_SIZE = 512
+MAX_BATCH_BYTES = int(os.environ.get("DEEP_DIARY_BATCH_MAX_BYTES", 64 * 1024 * 1024))
+MAX_BATCH_ROWS = int(os.environ.get("DEEP_DIARY_BATCH_MAX_ROWS", 100000))
+
+
+def parse_lines(lines):
+    """
+    NDJSON 줄을 (줄 번호, 레코드) 또는 (줄 번호, 오류 결과)로 변환 (빈 줄은 건너뜀)
+    """
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, {"line": line_no, "error": f"JSON 형식 오류: {e.msg}"}
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get("text"), str) or not record["text"].strip():
+            yield line_no, {"line": line_no, "error": "'text' 필드가 필요합니다."}
+            continue
+        yield line_no, record
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def process_chunk(kind, chunk, get_model, include_lyrics=False) -> list:
+    """
+    묶음 하나를 배치 추론
+
+    Args:
+        kind (str): emotion | recommend
+        chunk (list): parse_lines()가 만든 (줄 번호, 레코드) 목록
+        get_model (callable): 모델 이름으로 모델 객체를 반환하는 함수 (model_registry.get)
+        include_lyrics (bool): 추천 결과에 가사 포함 여부
+
+    Returns:
+        list[dict]: 입력 순서대로 정렬된 결과
+    """
+    # 형식 오류 결과는 그대로 두고 정상 레코드만 추론
+    results = [record if "text" not in record else None for _, record in chunk]
+    valid = [(i, record) for i, (_, record) in enumerate(chunk) if "text" in record]
+
+    if kind == "emotion":
+        if valid:
+            with stage_timer("kobert_batch"):
+                predicted = get_model("emotion").predict_emotions([record["text"] for _, record in valid])
+            for (i, record), emotion in zip(valid, predicted):
+                results[i] = {"id": record.get("id"), "emotion": emotion}
+        return results
+
+    # 감정 확률: 입력에 감정이 있으면 그 감정에 1.0, 없으면 배치로 분류
+    probs = {
+        i: [1.0 if e == record["emotion"] else 0.0 for e in EMOTION_LABELS]
+        for i, record in valid if record.get("emotion") in EMOTION_LABELS
+    }
+    to_classify = [(i, record) for i, record in valid if i not in probs]
+    if to_classify:
+        with stage_timer("kobert_batch"):
+            predicted = get_model("emotion").predict_probas([record["text"] for _, record in to_classify])
+        probs.update((i, list(p)) for (i, _), p in zip(to_classify, predicted))
+
+    with stage_timer("e5_batch"):
+        embeddings = get_model("embedding").get_embeddings([record["text"] for _, record in valid])
+    recommender = get_model("recommender")
+    with stage_timer("catalog_search_batch"):
+        for (i, record), embedding in zip(valid, embeddings):
+            result = {"id": record.get("id"), "emotion": EMOTION_LABELS[int(np.argmax(probs[i]))]}
+            songs = recommender.recommend_songs(embedding, probs[i], k=1, include_lyrics=include_lyrics)
+            if songs:
+                song = songs[0]
+                result.update(title=song["title"], artist=song["artist"], score=song["score"], similarity=song["similarity"])
+                if song.get("aliases"):
+                    result["aliases"] = song["aliases"]
+                if include_lyrics:
+                    result["lyrics"] = song["lyrics"]
+            else:
+                result["error"] = "추천 실패"
+            results[i] = result
+    return results
+
+
+def process_stream(kind, lines, get_model, chunk_size=DEFAULT_CHUNK_SIZE, include_lyrics=False):
+    """NDJSON 줄을 읽으면서 묶음 단위로 처리한 결과를 차례로 반환하는 제너레이터"""
+    if kind not in ("emotion", "recommend"):
+        raise ValueError(f"지원하지 않는 작업입니다: {kind}")
+    for chunk in iter_chunks(parse_lines(lines), chunk_size):
+        yield from process_chunk(kind, chunk, get_model, include_lyrics)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="NDJSON 일기 대량 감정 분석 / 트로트 추천")
+    parser.add_argument("kind", choices=["emotion", "recommend"])
+    parser.add_argument("input", help="입력 NDJSON 파일 (- 이면 표준 입력)")
+    parser.add_argument("-o", "--output", help="출력 NDJSON 파일 (생략하면 표준 출력)")
+    parser.add_argument("--url", help="서버 주소 (생략하면 현재 프로세스에서 모델을 로드하여 처리)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--include-lyrics", action="store_true")
+    args = parser.parse_args()
+
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    sink = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    count = 0
+    try:
+        if args.url:
+            import requests
+
+            resp = requests.post(
+                f"{args.url.rstrip('/')}/batch/{args.kind}",
+                data=source,
+                params={"chunk_size": args.chunk_size, "include_lyrics": args.include_lyrics},
+                headers={"Content-Type": "application/x-ndjson"},
+                stream=True,
+            )
+            if resp.status_code != 200:
+                sys.exit(f"❌ 요청 실패 ({resp.status_code}): {resp.text}")
+            lines = (line.decode("utf-8") for line in resp.iter_lines() if line)
+        else:
+            from service.deep_diary import model_registry
+
+            results = process_stream(args.kind, source, model_registry.get, args.chunk_size, args.include_lyrics)
+            lines = (json.dumps(result, ensure_ascii=False) for result in results)
+        for line in lines:
+            sink.write(line + "\n")
+            count += 1
+            if count % 1000 == 0:
+                print(f"{count}건 처리 ({count / (time.perf_counter() - start):.1f}건/s)", file=sys.stderr)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+    print(f"✅ {count}건 처리 완료 ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
@@ -0,0 +1,206 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+# 대화 기록 최대 보관 개수 (ChatbotService.record_interaction과 동일)
+MAX_HISTORY = 20
+
+EVENTS_FILENAME = "events.jsonl"
+SNAPSHOT_FILENAME = "conversation.json"
+# flush()/close()가 기록 스레드를 기다리는 최대 시간(초)
+FLUSH_TIMEOUT = 10.0
+
+
+class ConversationLogWriter:
+    """
+    세션별 대화 이벤트를 append-only JSONL 파일에 기록하는 write-behind 로거.
+
+    - 요청 처리 경로에서는 큐에 이벤트만 넣고 바로 반환
+    - 백그라운드 스레드가 이벤트를 모아 세션별로 한 번에 쓰고 fsync
+    - 세션 디렉터리는 처음 기록할 때 한 번만 생성
+    """
+
+    def __init__(self, root="service/logs", flush_interval=0.5, max_batch=512):
+        """
+        Args:
+            root (str): 세션 로그 루트 디렉터리
+            flush_interval (float): 이벤트를 모으는 최대 대기 시간(초)
+            max_batch (int): 한 번에 기록할 최대 이벤트 수
+        """
+        self.root = root
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._known_dirs = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def session_path(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id)
+
+    def append(self, session_id: str, event: dict) -> None:
+        """
+        이벤트를 큐에 추가 (디스크 기록은 백그라운드에서 수행)
+
+        Args:
+            session_id (str): 세션 ID
+            event (dict): {"type": ..., ...} 형식의 이벤트 (ts가 없으면 지금 시각)
+        """
+        self._ensure_started()
+        self._queue.put((session_id, {"ts": time.time(), **event}))
+
+    def flush(self, timeout=FLUSH_TIMEOUT) -> bool:
+        """
+        지금까지 추가된 이벤트가 모두 디스크에 기록될 때까지 대기
+
+        Returns:
+            bool: timeout 안에 기록이 끝났는지 여부
+        """
+        if self._thread is None:
+            return True
+        self._ensure_started()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def qsize(self) -> int:
+        """기록 대기 중인 이벤트 수"""
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """남은 이벤트를 기록하고 백그라운드 스레드 종료"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(FLUSH_TIMEOUT)
+        self._thread = None
+
+    def _ensure_started(self):
+        """기록 스레드 시작 (예기치 못한 오류로 종료되었다면 다시 시작)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="conversation-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # flush/close 요청이 아니면 잠시 이벤트를 더 모아서 한 번에 기록
+            while item is not None and not isinstance(item, threading.Event) and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            # 큐에 이미 쌓여 있는 이벤트도 함께 처리
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            events = {}
+            waiters = []
+            stop = False
+            for entry in batch:
+                if entry is None:
+                    stop = True
+                elif isinstance(entry, threading.Event):
+                    waiters.append(entry)
+                else:
+                    session_id, event = entry
+                    events.setdefault(session_id, []).append(event)
+
+            for session_id, session_events in events.items():
+                try:
+                    self._write(session_id, session_events)
+                except Exception as e:  # 기록 스레드가 죽으면 flush()를 기다리는 요청이 모두 멈추므로 어떤 오류든 계속 진행
+                    print(f"❌ 대화 로그 기록 실패 ({session_id}):", repr(e))
+
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, session_id, session_events):
+        path = self.session_path(session_id)
+        if path not in self._known_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._known_dirs.add(path)
+        lines = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in session_events)
+        with open(os.path.join(path, EVENTS_FILENAME), "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def iter_events(session_path: str):
+    """세션의 이벤트 로그를 순서대로 읽음"""
+    file_path = os.path.join(session_path, EVENTS_FILENAME)
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def replay_events(session_path: str) -> dict:
+    """
+    이벤트 로그를 재생하여 현재 대화 상태 스냅샷 생성
+
+    Returns:
+        dict: conversation.json과 동일한 형식의 스냅샷
+    """
+    snapshot = {"conversation": [], "emotion_history": [], "diary_summary": "", "diary": ""}
+    for event in iter_events(session_path):
+        kind = event.get("type")
+        if kind == "interaction":
+            snapshot["conversation"].append(f"{event['speaker']}: {event['content'].strip()}")
+            if len(snapshot["conversation"]) > MAX_HISTORY:
+                snapshot["conversation"].pop(0)
+        elif kind == "emotion":
+            snapshot["emotion_history"].append(event["emotion"])
+        elif kind == "summary":
+            snapshot["diary_summary"] = event["diary_summary"]
+        elif kind == "diary":
+            snapshot["diary"] = event["diary"]
+    return snapshot
+
+
+def compact(session_path: str) -> dict:
+    """
+    이벤트 로그로부터 conversation.json 스냅샷을 다시 작성 (임시 파일 교체 방식)
+
+    Returns:
+        dict: 기록된 스냅샷
+    """
+    snapshot = replay_events(session_path)
+    os.makedirs(session_path, exist_ok=True)
+    file_path = os.path.join(session_path, SNAPSHOT_FILENAME)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
+    return snapshot
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 사용법: python service/conversation_log.py service/logs/<session_id>
+    for path in sys.argv[1:]:
+        compact(path)
+        print(f"✅ 스냅샷 생성: {os.path.join(path, SNAPSHOT_FILENAME)}")
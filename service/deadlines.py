@@ -0,0 +1,107 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from service import metrics
+from service.model_server import ModelServerError
+from service.profiling import bind_request_thread
+
+try:
+    from google.api_core.exceptions import GoogleAPIError
+except ImportError:  # live Gemini를 쓰지 않는 환경
+    GoogleAPIError = None
+
+# 단계별 기본 마감 시간 (초, 0이면 마감 없음)
+# DEEP_DIARY_DEADLINE_CAPTION / DEEP_DIARY_DEADLINE_EMOTION / DEEP_DIARY_DEADLINE_GEMINI 로 변경
+DEFAULT_DEADLINES = {
+    "caption": 60.0,
+    "emotion": 3.0,
+    "gemini": 15.0,
+}
+
+# 마감 시간을 넘긴 호출은 강제로 멈출 수 없으므로 끝날 때까지 이 스레드풀에서 계속 실행되고 결과는 버려짐
+# (취소 이벤트를 확인하는 작업은 일찍 끝남, 예: LLaVA 생성)
+DEADLINE_WORKERS = int(os.environ.get("DEEP_DIARY_DEADLINE_WORKERS", "32"))
+_executor = ThreadPoolExecutor(max_workers=DEADLINE_WORKERS, thread_name_prefix="deadline")
+
+# 스레드풀에서 실행 중이거나 대기 중인 호출 수 한도 (넘으면 기다리지 않고 바로 대체 응답)
+_backlog = threading.BoundedSemaphore(int(os.environ.get("DEEP_DIARY_DEADLINE_BACKLOG", DEADLINE_WORKERS * 2)))
+
+# 대체 응답으로 바꾸는 일시적인 오류 (네트워크/파일, 모델 서버, Gemini API, 취소)
+# 그 밖의 오류(설정/프로그래밍 오류, 엄격한 replay 모드의 ReplayMissError 등)는 호출한 쪽으로 그대로 전달
+TRANSIENT_ERRORS = (OSError, CancelledError, ModelServerError) + ((GoogleAPIError,) if GoogleAPIError else ())
+
+# 작업 스레드에서 보이는 취소 이벤트 (마감 시간을 넘기면 설정됨)
+_cancel_event = contextvars.ContextVar("deep_diary_deadline_cancel", default=None)
+# 현재 요청에서 마감 시간을 넘겨 버려졌지만 아직 실행 중인 작업 (입장 제어 슬롯을 끝날 때까지 유지하는 데 사용)
+_abandoned = contextvars.ContextVar("deep_diary_abandoned_work", default=None)
+
+
+def stage_deadline(stage: str) -> float:
+    return float(os.environ.get(f"DEEP_DIARY_DEADLINE_{stage.upper()}", DEFAULT_DEADLINES.get(stage, 0)))
+
+
+def cancel_event():
+    """
+    call_with_deadline으로 실행 중인 작업의 취소 이벤트 (마감 시간을 넘기면 설정됨, 그 밖에는 None)
+    오래 걸리는 작업은 이 이벤트를 확인해 일찍 끝낼 수 있음
+    """
+    return _cancel_event.get()
+
+
+def track_abandoned() -> list:
+    """
+    현재 컨텍스트(요청)에서 마감 시간을 넘겨 버려진 작업의 Future를 모을 리스트를 만들어 반환
+    이후 이 컨텍스트에서 복사된 스레드(asyncio.to_thread 등)의 call_with_deadline도 같은 리스트에 추가함
+    """
+    abandoned = []
+    _abandoned.set(abandoned)
+    return abandoned
+
+
+def call_with_deadline(stage: str, fn, *args, fallback):
+    """
+    마감 시간 안에 fn(*args)를 실행하고, 시간 초과 또는 일시적인 오류(TRANSIENT_ERRORS)가 나면 fallback()의 결과를 반환
+    그 밖의 오류는 그대로 다시 발생
+
+    Args:
+        stage (str): 단계 이름 (caption | emotion | gemini), 마감 시간 설정과 지표 라벨에 사용
+        fn (callable): 실행할 함수
+        fallback (callable): 대체 결과를 만드는 함수
+
+    Returns:
+        fn의 결과 또는 fallback()의 결과
+    """
+    timeout = stage_deadline(stage)
+    if timeout > 0 and not _backlog.acquire(blocking=False):
+        print(f"❌ {stage} 대기 중인 작업이 너무 많음, 대체 응답 사용")
+        metrics.record_fallback(stage, "overloaded")
+        return fallback()
+    future = None
+    try:
+        if timeout <= 0:
+            return fn(*args)
+        # 프로파일링 중인 요청 정보(ContextVar)가 작업 스레드에서도 보이도록 컨텍스트 복사
+        context = contextvars.copy_context()
+        stop = threading.Event()
+        context.run(_cancel_event.set, stop)
+        future = _executor.submit(context.run, bind_request_thread(fn), *args)
+        future.add_done_callback(lambda _: _backlog.release())
+        return future.result(timeout=timeout)
+    except FuturesTimeout:
+        print(f"❌ {stage} 마감 시간({timeout}s) 초과, 대체 응답 사용")
+        stop.set()
+        abandoned = _abandoned.get()
+        if abandoned is not None:
+            abandoned.append(future)
+        reason = "timeout"
+    except BaseException as e:
+        if timeout > 0 and future is None:  # 스레드풀에 넣지 못한 경우
+            _backlog.release()
+        if not isinstance(e, TRANSIENT_ERRORS):
+            raise
+        print(f"❌ {stage} 실패, 대체 응답 사용:", str(e))
+        reason = "error"
+    metrics.record_fallback(stage, reason)
+    return fallback()
@@ -1,20 +1,129 @@
+import hashlib
 import sys
 import os
+import time
 
 # 프로젝트 루트 디렉토리를 파이썬 경로에 추가
 sys.path.append(os.path.abspath("."))
 
-import json
 from models.llm_gemini import generate_question_from_caption, generate_followup_question, generate_diary_draft, incorporate_user_changes
-from models.image_captioning import LlavaImageCaptioning
-from models.emotion_classification import EmotionClassifier
-from models.semantic_embedding import E5Embedder, SongRecommender
-# from models.insights import generate_insights
-
-caption_generator = LlavaImageCaptioning()
-emotion_classifier = EmotionClassifier()
-embedder = E5Embedder()
-song_recommander = SongRecommender()
+from service.conversation_log import ConversationLogWriter, MAX_HISTORY, compact
+from service.model_registry import ModelRegistry
+from service.metrics import stage_timer, observe_stage, QUEUE_DEPTH
+from service.profiling import model_trace
+from service.deadlines import call_with_deadline, cancel_event
+from models.diary_index import DiaryIndexStore
+from contextlib import contextmanager
+
+# DEEP_DIARY_MODEL_SERVER가 설정되면 워커는 모델을 올리지 않고 공유 모델 서버(Unix 소켓)에 추론을 요청
+# 모델 서버 실행: python -m service.model_server --socket /tmp/deep_diary_models.sock
+MODEL_SERVER_SOCKET = os.environ.get("DEEP_DIARY_MODEL_SERVER")
+# 트로트 카탈로그 (중복 제거본을 쓰려면 models/catalog_dedup.py 출력 경로,
+# 샤드 디렉터리(models/catalog_shards.py)를 지정하면 DEEP_DIARY_CATALOG_SHARDS=0,1 처럼 일부 샤드만 로드 가능,
+# DEEP_DIARY_CATALOG_REDUCED=<.npz>이면 축소 차원(models/embedding_reduction.py)에서 검색 후 상위 DEEP_DIARY_CATALOG_RERANK곡 재정렬)
+CATALOG_PATH = os.environ.get("DEEP_DIARY_CATALOG_PATH", "data/trot_embeddings_emotion.pkl")
+# 노래 추천 방식: weighted(기본값, 감정 확률 가중 전체 카탈로그 점수) | filter(마지막 감정과 같은 곡만 검색)
+RECOMMEND_MODE = os.environ.get("DEEP_DIARY_RECOMMEND_MODE", "weighted")
+
+
+def _load_caption_generator():
+    from models.image_captioning import LlavaImageCaptioning
+    return LlavaImageCaptioning()
+
+def _load_emotion_classifier():
+    from models.emotion_classification import EmotionClassifier
+    from models.distillation import emotion_student_path
+    from models.onnx_backend import inference_backend
+    from models.quantization import quantization_enabled
+    return EmotionClassifier(quantize=quantization_enabled(), backend=inference_backend(), student_path=emotion_student_path())
+
+def _load_embedder():
+    from models.semantic_embedding import E5Embedder
+    from models.onnx_backend import inference_backend
+    from models.quantization import quantization_enabled
+    return E5Embedder(quantize=quantization_enabled(), backend=inference_backend())
+
+def _load_song_recommander():
+    from models.catalog_shards import load_song_recommender
+    return load_song_recommender(
+        CATALOG_PATH,
+        shards=os.environ.get("DEEP_DIARY_CATALOG_SHARDS"),
+        reduced=os.environ.get("DEEP_DIARY_CATALOG_REDUCED"),
+        rerank=os.environ.get("DEEP_DIARY_CATALOG_RERANK", "50"),
+    )
+
+def _load_retrieval_engine():
+    # songs 카탈로그는 추천기(recommender)를 그대로 사용 (모델 서버 모드의 원격 추천기면 파일에서 따로 로드)
+    from models.retrieval import create_retrieval_engine
+    return create_retrieval_engine(
+        os.environ.get("DEEP_DIARY_CATALOGS"), CATALOG_PATH, os.environ.get("DEEP_DIARY_CATALOG_SHARDS"),
+        song_recommender=model_registry.get("recommender"),
+    )
+
+def _warmup_caption_generator(captioner):
+    from PIL import Image
+    captioner.generate_caption(Image.new("RGB", (336, 336), color=(255, 255, 255)))
+
+
+def traced(stage: str, fn):
+    """
+    fn을 실행하는 스레드에서 torch 프로파일러 트레이스를 기록하도록 감싼 함수
+    (torch 프로파일러는 스레드별이므로 call_with_deadline의 작업 스레드 안에서 시작해야 함)
+    """
+    def run(*args):
+        with model_trace(stage):
+            return fn(*args)
+    return run
+
+
+@contextmanager
+def model_stage(stage: str):
+    """모델 호출 단계: 소요 시간 기록 + (프로파일링 중인 요청이면) torch 프로파일러 트레이스"""
+    with stage_timer(stage), model_trace(stage):
+        yield
+
+
+# 모델은 처음 사용할 때 로드하거나, 서버 시작 시 백그라운드에서 예열 (service/main.py 참고)
+model_registry = ModelRegistry()
+
+if os.environ.get("DEEP_DIARY_FAKE_MODELS") == "1":
+    # 부하 테스트용 결정적 가짜 모델 (GPU 불필요, 트로트 카탈로그 검색은 실제로 수행)
+    from models.fakes import FakeImageCaptioning, FakeEmotionClassifier, FakeEmbedder
+    model_registry.register("caption", FakeImageCaptioning)
+    model_registry.register("emotion", FakeEmotionClassifier)
+    model_registry.register("embedding", FakeEmbedder)
+    model_registry.register("recommender", _load_song_recommander)
+    model_registry.register("retrieval", _load_retrieval_engine)
+elif MODEL_SERVER_SOCKET:
+    from service.model_server import connect_remote_models
+    _remote_models = connect_remote_models(MODEL_SERVER_SOCKET)
+    for _name, _model in zip(["caption", "emotion", "embedding", "recommender"], _remote_models):
+        model_registry.register(_name, lambda model=_model: model)
+    model_registry.register("retrieval", _load_retrieval_engine)
+else:
+    model_registry.register("caption", _load_caption_generator, warmup=_warmup_caption_generator)
+    model_registry.register("emotion", _load_emotion_classifier, warmup=lambda m: m.predict_emotion("오늘은 정말 좋은 하루였어요"))
+    model_registry.register("embedding", _load_embedder, warmup=lambda m: m.get_embedding("오늘은 정말 좋은 하루였어요"))
+    model_registry.register("recommender", _load_song_recommander)
+    model_registry.register("retrieval", _load_retrieval_engine)
+
+# 마감 시간을 넘기면 사용할 대체 질문 (캡션이 없거나 Gemini 응답이 늦을 때)
+FALLBACK_INITIAL_QUESTIONS = [
+    "오늘 올려주신 사진은 어떤 순간을 담고 있나요? 그때 어떤 일이 있었는지 들려주세요.",
+    "이 사진을 찍을 때 누구와 함께 있었나요? 그 순간의 분위기를 알려주세요.",
+    "오늘 하루 중 이 사진을 고른 이유가 궁금해요. 어떤 장면이 가장 기억에 남으세요?",
+]
+FALLBACK_FOLLOWUP_QUESTIONS = [
+    "그때 어떤 기분이 드셨나요? 조금 더 자세히 들려주세요.",
+    "그 일이 오늘 하루에 어떤 의미였는지 궁금해요. 가장 인상 깊었던 순간은 무엇이었나요?",
+    "그 순간을 다시 떠올리면 어떤 생각이 드세요? 함께한 사람이나 장소에 대해서도 알려주세요.",
+    "오늘 있었던 일 중에 일기에 꼭 남기고 싶은 장면이 있다면 무엇인가요?",
+]
+
+conversation_log = ConversationLogWriter(root="service/logs")
+# 사용자별 일기 검색 인덱스 (저장한 일기를 E5 임베딩 + 키워드 역색인으로 추가)
+diary_index = DiaryIndexStore(root="service/logs/diary_index")
+QUEUE_DEPTH.set_function(conversation_log.qsize, queue="conversation_log")
 
 
 class ChatbotService:
@@ -29,23 +138,85 @@ class ChatbotService:
 
     def __init__(self, session_id: str):
         self.session_id = session_id
-        self.session_path = os.path.join("service/logs", session_id)
-        os.makedirs(self.session_path, exist_ok=True)
-        
+        self.session_path = conversation_log.session_path(session_id)  # 디렉터리는 로그 기록 시 생성
+
         self.caption = ""  # 이미지 캡션 저장
         self.conversation_history = []  # 대화 기록
         self.emotion_history = []  # 감정 기록 (사용자 감정 분류 데이터)
         self.diary_summary = ""
+        self.diary = ""
+        self.caption_fallback = False  # 캡션 생성이 마감 시간을 넘겨 캡션 없이 진행 중인지 여부
+        self.pending_events = []  # 세션 저장이 성공한 뒤 대화 로그에 기록할 이벤트 (commit_events 참고)
+        self.pending_index = []  # 세션 저장이 성공한 뒤 일기 검색 인덱스에 추가할 일기 (commit_events 참고)
+
+    def to_state(self) -> dict:
+        """
+        세션 상태를 직렬화 가능한 딕셔너리로 변환 (외부 세션 저장소용)
+        """
+        return {
+            "caption": self.caption,
+            "conversation_history": self.conversation_history,
+            "emotion_history": self.emotion_history,
+            "diary_summary": self.diary_summary,
+            "diary": self.diary,
+            "caption_fallback": self.caption_fallback,
+        }
+
+    @classmethod
+    def from_state(cls, session_id: str, state: dict) -> "ChatbotService":
+        """
+        to_state()로 저장한 상태에서 세션 복원
+        """
+        chatbot = cls(session_id=session_id)
+        chatbot.caption = state.get("caption", "")
+        chatbot.conversation_history = state.get("conversation_history", [])
+        chatbot.emotion_history = state.get("emotion_history", [])
+        chatbot.diary_summary = state.get("diary_summary", "")
+        chatbot.diary = state.get("diary", "")
+        chatbot.caption_fallback = state.get("caption_fallback", False)
+        return chatbot
+
+    def log_event(self, event: dict) -> None:
+        """
+        대화 로그 이벤트를 세션 객체에 모아둠 (요청이 409 등으로 거절되면 기록되지 않음)
+        """
+        self.pending_events.append({"ts": time.time(), **event})
+
+    def commit_events(self) -> None:
+        """
+        모아둔 이벤트를 대화 로그(events.jsonl)에 기록하고 저장한 일기를 검색 인덱스에 추가 (세션 저장이 성공한 뒤 호출)
+        """
+        for event in self.pending_events:
+            conversation_log.append(self.session_id, event)
+        self.pending_events = []
+        for item in self.pending_index:
+            diary_index.add(self.session_id, **item)
+        self.pending_index = []
 
     def record_interaction(self, speaker: str, content: str) -> None:
         """
         대화 내용을 기록
         """
         self.conversation_history.append(f"{speaker}: {content.strip()}")
-        
-        if len(self.conversation_history) > 20:  # 최대 20개
+        self.log_event({"type": "interaction", "speaker": speaker, "content": content})
+
+        if len(self.conversation_history) > MAX_HISTORY:  # 최대 20개
             self.conversation_history.pop(0)
 
+    def record_emotion(self, emotion: str) -> None:
+        """
+        감정 분석 결과를 기록
+        """
+        self.emotion_history.append(emotion)
+        self.log_event({"type": "emotion", "emotion": emotion})
+
+    def record_summary(self, summary: str) -> None:
+        """
+        일기 초안을 기록
+        """
+        self.diary_summary = summary
+        self.log_event({"type": "summary", "diary_summary": summary})
+
     def generate_image_caption(self, image_source: str, is_file: bool = False) -> str:
         """
         이미지 캡션 생성 (URL 및 파일 지원)
@@ -57,40 +228,86 @@ class ChatbotService:
         Returns:
             str: 생성된 이미지 캡션
         """
-        if is_file:
-            image = caption_generator.load_image_from_file(image_source)
-        else:
-            image = caption_generator.load_image_from_url(image_source)
+        caption_generator = model_registry.get("caption")
+        with stage_timer("image_decode"):
+            if is_file:
+                image = caption_generator.load_image_from_file(image_source)
+            else:
+                image = caption_generator.load_image_from_url(image_source)
 
         if image is None:
             raise ValueError("이미지를 불러올 수 없습니다. URL 또는 파일 경로를 확인하세요.")
 
-        self.caption, _ = caption_generator.generate_caption(image)
-        return self.caption
+        def caption_image():
+            with model_trace("llava"):
+                caption = caption_generator.generate_caption(image, stop_event=cancel_event())[0]
+            # 단계별 시간은 스레드별로 기록되므로 생성한 스레드에서 바로 읽음
+            for stage, seconds in getattr(caption_generator, "last_timings", {}).items():
+                observe_stage(stage, seconds)
+            return caption
+
+        # 마감 시간을 넘기면 캡션 없이 일반 질문으로 대화를 시작
+        caption = call_with_deadline("caption", caption_image, fallback=lambda: "") or ""
+        return self.set_caption(caption)
+
+    def set_caption(self, caption: str) -> str:
+        """
+        캡션 설정 (같은 이미지의 캡션을 캐시에서 재사용할 때도 사용)
+        """
+        self.caption = caption
+        self.caption_fallback = not caption
+        self.log_event({"type": "caption", "caption": caption})
+        return caption
+
+    def classify_emotion(self, text: str) -> str:
+        """
+        KoBERT 감정 분류 (마감 시간을 넘기면 "중립")
+        """
+        with stage_timer("kobert"):
+            predict = traced("kobert", model_registry.get("emotion").predict_emotion)
+            return call_with_deadline("emotion", predict, text, fallback=lambda: "중립")
 
     def generate_initial_question(self) -> str:
         """
         이미지 캡셔닝 결과를 기반으로 첫 번째 질문 생성
         """
+        if self.caption_fallback:
+            initial_question = self._fallback_question(FALLBACK_INITIAL_QUESTIONS)
+            self.record_interaction("AI", initial_question)
+            return initial_question
         if not self.caption:
             raise ValueError("캡션이 설정되지 않았습니다. 먼저 이미지 캡션을 생성하세요.")
 
-        initial_question = generate_question_from_caption(self.caption)
+        with stage_timer("gemini_question_from_caption"):
+            initial_question = call_with_deadline(
+                "gemini", generate_question_from_caption, self.caption,
+                fallback=lambda: self._fallback_question(FALLBACK_INITIAL_QUESTIONS),
+            )
         self.record_interaction("AI", initial_question)
         return initial_question
 
-    def generate_followup_question(self, user_answer: str) -> str:
+    def generate_followup_question(self, user_answer: str, on_emotion=None) -> str:
         """
         사용자의 답변을 바탕으로 후속 질문을 생성
+
+        Args:
+            user_answer (str): 사용자 답변
+            on_emotion (callable): 감정 분석이 끝나면 후속 질문 생성 전에 감정을 전달받을 콜백 (WebSocket 스트리밍용)
         """
         self.record_interaction("User", user_answer)
 
         # 감정 분석
-        emotion_result = emotion_classifier.predict_emotion(user_answer)
-        self.emotion_history.append(emotion_result)
+        emotion_result = self.classify_emotion(user_answer)
+        self.record_emotion(emotion_result)
+        if on_emotion is not None:
+            on_emotion(emotion_result)
 
         # 후속 질문 생성
-        followup_question = generate_followup_question(self.conversation_history, self.caption)
+        with stage_timer("gemini_followup_question"):
+            followup_question = call_with_deadline(
+                "gemini", generate_followup_question, self.conversation_history, self.caption,
+                fallback=lambda: self._fallback_question(FALLBACK_FOLLOWUP_QUESTIONS),
+            )
         self.record_interaction("AI", followup_question)
 
         return followup_question
@@ -99,54 +316,169 @@ class ChatbotService:
         """
         일기 초안을 위한 대화 내용 요약
         """
-        summary = generate_diary_draft(self.conversation_history)
-        total_emotion = emotion_classifier.predict_emotion(summary)
-        self.emotion_history.append(total_emotion)
-        self.diary_summary = summary
+        with stage_timer("gemini_diary_draft"):
+            summary = call_with_deadline(
+                "gemini", generate_diary_draft, self.conversation_history, fallback=self._fallback_draft
+            )
+        total_emotion = self.classify_emotion(summary)
+        self.record_emotion(total_emotion)
+        self.record_summary(summary)
         return
     
     def regenerate_summarize(self, user_changes) -> str:
         """
         사용자의 의견을 반영한 일기 초안 새로 생성
         """
-        summary_new = incorporate_user_changes(original_draft=self.diary_summary, user_changes=user_changes)
-        total_emotion = emotion_classifier.predict_emotion(summary_new)
-        self.emotion_history.append(total_emotion)
-        self.diary_summary = summary_new
+        with stage_timer("gemini_incorporate_user_changes"):
+            # 마감 시간을 넘기면 기존 초안을 그대로 유지
+            summary_new = call_with_deadline(
+                "gemini", incorporate_user_changes, self.diary_summary, user_changes,
+                fallback=lambda: self.diary_summary,
+            )
+        total_emotion = self.classify_emotion(summary_new)
+        self.record_emotion(total_emotion)
+        self.record_summary(summary_new)
         return
     
+    def _fallback_question(self, templates: list) -> str:
+        """대화가 진행될수록 다른 템플릿 질문을 사용 (같은 질문 반복 방지)"""
+        return templates[len(self.conversation_history) // 2 % len(templates)]
+
+    def _fallback_draft(self) -> str:
+        """Gemini 없이 사용자 답변을 이어 붙인 일기 초안"""
+        answers = [line[len("User: "):] for line in self.conversation_history if line.startswith("User: ")]
+        if not answers:
+            return "오늘의 일기를 직접 작성해보세요."
+        return " ".join(answers)
+
     def save_diary(self, diary: str="") -> str:
         """
-        사용자 작성 일기 저장
+        사용자 작성 일기 저장 (conversation.json 스냅샷은 세션 저장 후 save_conversation()으로 작성)
         """
         self.diary = diary
-        self.save_conversation()
+        self.log_event({"type": "diary", "diary": diary})
+        self.index_diary(diary or self.diary_summary)
         return
+
+    def index_diary(self, text: str) -> None:
+        """
+        저장한 일기의 임베딩을 계산해 두고, 세션 저장이 성공하면 commit_events()에서 검색 인덱스에 추가
+        같은 일기를 다시 저장하거나 409 후 재시도해도 본문 해시를 키로 사용하므로 한 번만 추가됨
+        """
+        if not text.strip():
+            return
+        with model_stage("e5"):
+            embedding = model_registry.get("embedding").get_embedding(text)
+        emotion = self.emotion_history[-1] if self.emotion_history else None
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.pending_index.append({"text": text, "embedding": embedding, "emotion": emotion, "key": key})
+
+    def search_diaries(self, query: str, k: int = 10, emotion: str = None, mode: str = "hybrid") -> list:
+        """
+        지난 일기 검색
+
+        Args:
+            query (str): 검색어
+            k (int): 반환할 일기 수
+            emotion (str): 지정하면 해당 감정의 일기만 검색
+            mode (str): hybrid | semantic | keyword
+
+        Returns:
+            list[dict]: 점수 순 일기 목록
+        """
+        query_embedding = None
+        if mode != "keyword" and query.strip():
+            with model_stage("e5"):
+                query_embedding = model_registry.get("embedding").get_embedding(query)
+        alpha = {"hybrid": 0.5, "semantic": 1.0, "keyword": 0.0}[mode]
+        with stage_timer("diary_search"):
+            return diary_index.search(self.session_id, query, query_embedding, k=k, emotion=emotion, alpha=alpha)
     
     def save_conversation(self):
-        """대화 내역을 JSON 파일로 저장"""
-        file_path = os.path.join(self.session_path, "conversation.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "conversation": self.conversation_history,
-                "emotion_history": self.emotion_history,
-                "diary_summary": self.diary_summary,
-                "diary": self.diary
-            }, f, ensure_ascii=False, indent=4)
-
-    def recommend_song(self) -> str:
+        """
+        이벤트 로그(events.jsonl)를 압축하여 conversation.json 스냅샷 생성
+        (대화 중에는 이벤트만 추가 기록하고, 스냅샷은 필요할 때만 작성)
+        """
+        self.commit_events()
+        with stage_timer("session_compact"):
+            if not conversation_log.flush():
+                print(f"❌ 대화 로그 기록 대기 시간 초과 ({self.session_id}), 지금까지 기록된 이벤트로 스냅샷 작성")
+            return compact(self.session_path)
+
+    def classify_emotion_proba(self, text: str) -> list:
+        """
+        KoBERT 감정 확률 (마감 시간을 넘기면 마지막으로 분류된 감정에 1.0)
+        """
+        from models.semantic_embedding import EMOTION_LABELS
+
+        def fallback():
+            last = self.emotion_history[-1] if self.emotion_history else "중립"
+            return [1.0 if e == last else 0.0 for e in EMOTION_LABELS]
+
+        with stage_timer("kobert"):
+            predict = traced("kobert", model_registry.get("emotion").predict_proba)
+            return call_with_deadline("emotion", predict, text, fallback=fallback)
+
+    def recommend_song(self, k: int = 1, mode: str = None):
         """
         감정 분석 결과를 기반으로 노래를 추천
+
+        Args:
+            k (int): weighted 방식에서 함께 반환할 후보 곡 수
+            mode (str): weighted | filter (기본값: DEEP_DIARY_RECOMMEND_MODE)
+
+        Returns:
+            dict: 추천 곡 (weighted 방식이고 k > 1이면 "candidates"에 상위 k곡 포함)
         """
         if not self.emotion_history:
             return "아직 감정 데이터를 분석하지 않았습니다."
+        mode = mode or RECOMMEND_MODE
         final_emotion = self.emotion_history[-1]
         text = self.diary_summary
-        embedding = embedder.get_embedding(text)
-        recommend_info = song_recommander.recommend_song(embedding, final_emotion)
+        with model_stage("e5"):
+            embedding = model_registry.get("embedding").get_embedding(text)
+        recommender = model_registry.get("recommender")
+        if mode == "filter":
+            with model_stage("catalog_search"):
+                recommend_info = recommender.recommend_song(embedding, final_emotion)
+        else:
+            # 대화 중 마지막 감정 대신 완성된 일기 전체의 감정 확률 사용
+            emotion_probs = self.classify_emotion_proba(text or " ".join(self.conversation_history))
+            with model_stage("catalog_search"):
+                candidates = recommender.recommend_songs(embedding, emotion_probs, k=max(k, 1))
+            recommend_info = dict(candidates[0])
+            if k > 1:
+                recommend_info["candidates"] = candidates
         print(recommend_info)
         return recommend_info
 
+    def recommend(self, catalogs=None, k: int = 3) -> dict:
+        """
+        일기 임베딩과 감정 확률을 한 번만 계산하여 여러 카탈로그(노래, 도서, 활동 등)에서 추천
+
+        Args:
+            catalogs (list[str]): 검색할 카탈로그 (None이면 불러온 카탈로그 전체)
+            k (int): 카탈로그별 추천 개수
+
+        Returns:
+            dict: 감정 확률과 카탈로그별 추천 목록
+        """
+        from models.semantic_embedding import EMOTION_LABELS
+
+        text = self.diary_summary or " ".join(self.conversation_history)
+        if not text:
+            raise ValueError("아직 추천에 사용할 대화나 일기가 없습니다.")
+        with model_stage("e5"):
+            embedding = model_registry.get("embedding").get_embedding(text)
+        emotion_probs = self.classify_emotion_proba(text)
+        with model_stage("catalog_search"):
+            results = model_registry.get("retrieval").search(embedding, emotion_probs, catalogs=catalogs, k=k)
+        return {
+            "emotion": EMOTION_LABELS[max(range(len(emotion_probs)), key=lambda i: emotion_probs[i])],
+            "emotion_probs": {e: round(float(p), 4) for e, p in zip(EMOTION_LABELS, emotion_probs)},
+            "results": results,
+        }
+
 
 # =================== 사용 예시 (로그 & 터미널 동시 출력) ===================
 
@@ -213,6 +545,7 @@ if __name__ == "__main__":
     
     recommend_info = chatbot.recommend_song()
     print("트로트 추천:\n", recommend_info)
+    chatbot.save_conversation()
 
     print(f"\n✅ 로그 기록 완료: {log_path}\n\n\n")
 
@@ -0,0 +1,32 @@
+"""
+gunicorn 설정 (여러 워커 + prefork 모델 공유)
+
+실행:
+    DEEP_DIARY_PRELOAD=1 gunicorn -c service/gunicorn_conf.py service.main:app
+
+DEEP_DIARY_PRELOAD=1 이면 마스터 프로세스가 앱과 모델을 한 번만 로드한 뒤 워커를 fork합니다.
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath("."))
+
+from service.prefork import preload_enabled, preload_names
+
+bind = os.environ.get("DEEP_DIARY_BIND", "0.0.0.0:8031")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 300
+
+# 마스터에서 앱을 import한 뒤 fork (preload_app=False면 워커마다 따로 import)
+preload_app = preload_enabled()
+
+
+def when_ready(server):
+    """워커를 fork하기 직전 마스터 프로세스에서 모델 로드 및 고정"""
+    if not preload_app:
+        return
+    from service.deep_diary import model_registry
+    from service.prefork import preload_models
+
+    preload_models(model_registry, preload_names())
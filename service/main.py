@@ -1,14 +1,90 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response, Cookie
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response, Cookie, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
-from service.deep_diary import ChatbotService
+from service.deep_diary import ChatbotService, model_registry
+from service.session_store import create_session_store, SessionConflictError
+from service.upload_storage import create_upload_storage, UploadTooLargeError, RequestSizeLimitMiddleware, MULTIPART_OVERHEAD
+from service import metrics, batch
+from service.profiling import ProfilingMiddleware, ProfileStore, bind_request_thread
+from service.admission import create_admission_controllers, AdmissionRejected, AdmissionPrecheckMiddleware
+from service.prefork import preload_enabled, worker_warmup_names
+from models.insights import InsightsStore, generate_insights
+import asyncio
+import json
+from collections import OrderedDict
 import os
 import shutil
+import tempfile
+import time
 import uuid
 
 app = FastAPI()
 
-# 서버 실행 중 클라이언트별 챗봇 세션을 관리하는 딕셔너리
-active_sessions = {}
+# 요청 프로파일링 (DEEP_DIARY_PROFILE_SAMPLE_RATE 비율로 샘플링하거나,
+# `X-Debug-Profile: <DEEP_DIARY_ADMIN_TOKEN>` 헤더가 있는 요청을 프로파일링)
+ADMIN_TOKEN = os.environ.get("DEEP_DIARY_ADMIN_TOKEN")
+profile_store = ProfileStore(
+    root=os.environ.get("DEEP_DIARY_PROFILE_DIR", "service/logs/profiles"),
+    max_reports=int(os.environ.get("DEEP_DIARY_PROFILE_MAX_REPORTS", "50")),
+)
+PROFILE_SAMPLE_RATE = float(os.environ.get("DEEP_DIARY_PROFILE_SAMPLE_RATE", "0"))
+if PROFILE_SAMPLE_RATE > 0 or ADMIN_TOKEN:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        token=ADMIN_TOKEN,
+        mode=os.environ.get("DEEP_DIARY_PROFILER", "sampling"),
+    )
+
+# 클라이언트별 챗봇 세션 저장소 (DEEP_DIARY_SESSION_BACKEND: memory | sqlite | redis)
+# 외부 저장소를 사용하면 여러 uvicorn 워커가 세션을 공유할 수 있음
+session_store = create_session_store()
+
+# 업로드 이미지 저장소 (내용 해시 기준으로 한 번만 저장, 크기 제한)
+upload_storage = create_upload_storage()
+
+# 업로드 본문 크기 제한 (FastAPI가 multipart 본문을 읽어 임시 파일에 쓰기 전에 400/413으로 거절)
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        "/generate_caption": upload_storage.max_bytes + MULTIPART_OVERHEAD,
+        "/batch/emotion": batch.MAX_BATCH_BYTES,
+        "/batch/recommend": batch.MAX_BATCH_BYTES,
+    },
+)
+
+metrics.ACTIVE_SESSIONS.set_function(session_store.count)
+
+# 이미지 내용 해시 → 캡션 (같은 사진이 다시 올라오면 LLaVA를 건너뜀, 워커 프로세스별 LRU)
+# 세션이 참조하는 이미지(직접 업로드한 이미지)의 캡션만 돌려줌
+CAPTION_CACHE_SIZE = int(os.environ.get("DEEP_DIARY_CAPTION_CACHE_SIZE", "256"))
+caption_cache = OrderedDict()
+
+def cached_caption(client_id: str, digest: str):
+    if not upload_storage.has_reference(client_id, digest):
+        return None
+    caption = caption_cache.get(digest)
+    metrics.record_cache("caption", caption is not None)
+    if caption is not None:
+        caption_cache.move_to_end(digest)
+    return caption
+
+def remember_caption(digest: str, caption: str) -> None:
+    caption_cache[digest] = caption
+    caption_cache.move_to_end(digest)
+    while len(caption_cache) > CAPTION_CACHE_SIZE:
+        caption_cache.popitem(last=False)
+
+# 세션 로그에서 감정 이벤트를 증분 수집한 Parquet 저장소 (DEEP_DIARY_INSIGHTS_REFRESH초마다 새 로그만 읽음)
+insights_store = InsightsStore(root="service/logs/insights", log_root="service/logs")
+INSIGHTS_REFRESH = float(os.environ.get("DEEP_DIARY_INSIGHTS_REFRESH", "30"))
+
+# 무거운 단계 앞의 입장 제어 (caption: LLaVA, text: 질문/초안 생성 및 추천)
+admission = create_admission_controllers()
+
+# 캡션 대기열이 가득 찼다면 업로드 본문을 받기 전에 거절 (크기 제한 미들웨어보다 먼저 실행)
+app.add_middleware(AdmissionPrecheckMiddleware, controllers=admission, paths={"/generate_caption": "caption"})
 
 def get_or_create_client_id(request: Request, response: Response) -> str:
     """쿠키에서 `client_id` 확인하고 없으면 새로 생성하여 쿠키에 저장"""
@@ -19,11 +95,114 @@ def get_or_create_client_id(request: Request, response: Response) -> str:
         response.set_cookie(key="client_id", value=client_id, httponly=True, max_age=86400)  # 하루 유지
     return client_id
 
-def get_chatbot(client_id: str) -> ChatbotService:
-    """클라이언트별 `ChatbotService` 인스턴스를 유지"""
-    if client_id not in active_sessions:
-        active_sessions[client_id] = ChatbotService(session_id=client_id)
-    return active_sessions[client_id]
+def get_chatbot(client_id: str):
+    """저장소에서 클라이언트별 `ChatbotService`와 세션 버전을 불러옴"""
+    with metrics.stage_timer("session_load"):
+        state, version = session_store.load(client_id)
+    if state is None:
+        return ChatbotService(session_id=client_id), 0
+    return ChatbotService.from_state(client_id, state), version
+
+def save_chatbot(client_id: str, chatbot: ChatbotService, version: int) -> int:
+    """
+    변경된 세션 저장 (다른 워커가 먼저 갱신했다면 409 반환)
+    저장에 성공한 경우에만 이번 요청의 대화 로그 이벤트와 일기 검색 인덱스를 기록하므로, 거절된 요청을 재시도해도 중복되지 않음
+    """
+    try:
+        with metrics.stage_timer("session_save"):
+            new_version = session_store.save(client_id, chatbot.to_state(), version)
+    except SessionConflictError:
+        raise HTTPException(status_code=409, detail="세션이 다른 요청에 의해 변경되었습니다. 다시 시도해주세요.")
+    chatbot.commit_events()
+    return new_version
+
+async def run_admitted(queue: str, client_id: str, fn, *args):
+    """
+    대기열에서 실행 순서를 기다린 뒤 스레드풀에서 실행 (이벤트 루프는 대기열 상태 조회/거절 응답을 계속 처리)
+    대기열이 가득 차면 Retry-After 헤더와 함께 429/503 반환
+    """
+    try:
+        async with admission[queue].slot(client_id):
+            return await asyncio.to_thread(bind_request_thread(fn), *args)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+@app.on_event("startup")
+def start_model_warmup():
+    """
+    서버 시작 시 백그라운드에서 모델 로드 및 예열
+    DEEP_DIARY_WARMUP: all(기본값) | none | 쉼표로 구분한 모델 이름 (caption,emotion,embedding,recommender)
+    preload 모드(DEEP_DIARY_PRELOAD=1)의 기본값은 마스터가 올리지 않은 CPU 모델만 (LLaVA는 처음 요청할 때 로드)
+    """
+    warmup = os.environ.get("DEEP_DIARY_WARMUP")
+    if warmup is None and preload_enabled():
+        names = worker_warmup_names(model_registry.names())
+        if names:
+            model_registry.start_warmup(names)
+        return
+    warmup = warmup or "all"
+    if warmup == "none":
+        return
+    names = None if warmup == "all" else [name.strip() for name in warmup.split(",") if name.strip()]
+    model_registry.start_warmup(names)
+
+@app.get("/healthz")
+async def healthz():
+    """프로세스 생존 확인 (모델 로드 여부와 무관)"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(response: Response, models: str = None):
+    """
+    모델별 로드 상태 및 로드 시간 반환
+    models 파라미터로 확인할 모델을 지정할 수 있음 (예: /readyz?models=emotion,embedding)
+    """
+    names = [name.strip() for name in models.split(",")] if models else None
+    if names and any(name not in model_registry.names() for name in names):
+        raise HTTPException(status_code=400, detail=f"등록된 모델: {model_registry.names()}")
+    ready = model_registry.is_ready(names)
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "models": model_registry.status()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """단계별 지연 시간 히스토그램, 캐시/큐/세션 지표 (Prometheus 텍스트 형식)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin(request: Request) -> None:
+    """관리자 토큰 확인 (토큰이 설정되지 않았다면 관리자 API 비활성화)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="관리자 API가 비활성화되어 있습니다.")
+    if request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="관리자 토큰이 올바르지 않습니다.")
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """저장된 프로파일 리포트 목록 (최신순)"""
+    require_admin(request)
+    return {"profiles": profile_store.list()}
+
+@app.get("/admin/profiles/{report_id}")
+async def get_profile(request: Request, report_id: str, file: str = "summary.txt"):
+    """
+    프로파일 리포트 파일 반환
+    file: summary.txt | stacks.folded | profile.prof | trace_XX_<stage>.json
+    """
+    require_admin(request)
+    path = profile_store.file_path(report_id, file)
+    if path is None:
+        raise HTTPException(status_code=404, detail="리포트를 찾을 수 없습니다.")
+    if file.endswith(".txt"):
+        with open(path, encoding="utf-8") as f:
+            return PlainTextResponse(f.read())
+    return FileResponse(path, filename=f"{report_id}_{file}")
+
+@app.get("/queue_status")
+async def queue_status(request: Request):
+    """대기열별 실행/대기 중인 요청 수와 현재 클라이언트의 대기 순번, 예상 대기 시간(초)"""
+    client_id = request.cookies.get("client_id")
+    return {name: controller.status(client_id) for name, controller in admission.items()}
 
 class UserAnswerRequest(BaseModel):
     user_answer: str
@@ -31,6 +210,9 @@ class UserAnswerRequest(BaseModel):
 class DiaryUpdateRequest(BaseModel):
     user_changes: str
 
+class DiarySaveRequest(BaseModel):
+    diary: str = ""
+
 
 # 이미지 캡션 생성 (세션 자동 관리)
 @app.post("/generate_caption")
@@ -39,26 +221,41 @@ async def generate_caption(
     response: Response,
     img_url: str = Form(None),
     file: UploadFile = File(None),
+    image_sha256: str = Form(None),
 ):
-    """이미지 URL 또는 파일을 받아 캡션을 생성하고 세션 ID를 자동 관리"""
+    """
+    이미지 URL 또는 파일을 받아 캡션을 생성하고 세션 ID를 자동 관리
+    image_sha256만 보내면 이 세션이 이미 업로드한 같은 이미지를 재사용 (없으면 404, 파일을 다시 보내야 함)
+    """
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
-
-    # 클라이언트별 세션 경로 사용
-    session_path = chatbot.session_path
-    os.makedirs(session_path, exist_ok=True)
+    chatbot, version = get_chatbot(client_id)
+    digest = None
 
     if file:
-        file_path = os.path.join(session_path, file.filename)
-        with open(file_path, "wb") as buffer:
-            buffer.write(await file.read())
+        try:
+            with metrics.stage_timer("upload_write"):
+                digest, file_path, _ = await upload_storage.save_upload(client_id, file)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         image_source, is_file = file_path, True
+    elif image_sha256:
+        file_path = upload_storage.reuse(client_id, image_sha256.lower())
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="업로드된 이미지를 찾을 수 없습니다. 파일을 다시 보내주세요.")
+        digest, image_source, is_file = image_sha256.lower(), file_path, True
     elif img_url:
         image_source, is_file = img_url, False
     else:
         raise HTTPException(status_code=400, detail="URL 또는 파일 중 하나를 제공해야 합니다.")
 
-    caption = chatbot.generate_image_caption(image_source, is_file)
+    caption = cached_caption(client_id, digest) if digest else None
+    if caption is not None:
+        chatbot.set_caption(caption)
+    else:
+        caption = await run_admitted("caption", client_id, chatbot.generate_image_caption, image_source, is_file)
+        if digest and not chatbot.caption_fallback:
+            remember_caption(digest, caption)
+    save_chatbot(client_id, chatbot, version)
     return {"client_id": client_id, "caption": caption}
 
 # 첫 번째 질문 생성
@@ -66,9 +263,10 @@ async def generate_caption(
 async def initial_question(request: Request, response: Response):
     """클라이언트별 세션을 유지하면서 첫 번째 질문을 반환"""
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
+    chatbot, version = get_chatbot(client_id)
 
-    question = chatbot.generate_initial_question()
+    question = await run_admitted("text", client_id, chatbot.generate_initial_question)
+    save_chatbot(client_id, chatbot, version)
     return {"client_id": client_id, "question": question}
 
 # 후속 질문 생성
@@ -76,9 +274,10 @@ async def initial_question(request: Request, response: Response):
 async def followup_question(request: Request, response: Response, data: UserAnswerRequest):
     """사용자의 답변을 기반으로 후속 질문을 생성"""
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
+    chatbot, version = get_chatbot(client_id)
 
-    followup_question = chatbot.generate_followup_question(data.user_answer)
+    followup_question = await run_admitted("text", client_id, chatbot.generate_followup_question, data.user_answer)
+    save_chatbot(client_id, chatbot, version)
     return {
         "client_id": client_id,
         "user_answer": data.user_answer,
@@ -91,8 +290,9 @@ async def followup_question(request: Request, response: Response, data: UserAnsw
 async def summarize_conversation(request: Request, response: Response):
     """클라이언트별 대화 내용을 요약하고 감정을 분석"""
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
-    chatbot.summarize_conversation()
+    chatbot, version = get_chatbot(client_id)
+    await run_admitted("text", client_id, chatbot.summarize_conversation)
+    save_chatbot(client_id, chatbot, version)
     return {
         "client_id": client_id,
         "diary_summary": chatbot.diary_summary,
@@ -104,8 +304,9 @@ async def summarize_conversation(request: Request, response: Response):
 async def regenerate_summarize(request: Request, response: Response, data: DiaryUpdateRequest):
     """사용자의 의견을 반영하여 일기 초안을 새로 생성"""
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
-    chatbot.regenerate_summarize(data.user_changes)
+    chatbot, version = get_chatbot(client_id)
+    await run_admitted("text", client_id, chatbot.regenerate_summarize, data.user_changes)
+    save_chatbot(client_id, chatbot, version)
     return {
         "client_id": client_id,
         "diary_summary": chatbot.diary_summary,
@@ -114,19 +315,198 @@ async def regenerate_summarize(request: Request, response: Response, data: Diary
     
 # 트로트 추천
 @app.get("/recommend_song")
-async def recommend_song(request: Request, response: Response):
-    """클라이언트별 감정을 기반으로 트로트 가사를 추천"""
+async def recommend_song(request: Request, response: Response, k: int = 1, mode: str = None):
+    """
+    클라이언트별 감정을 기반으로 트로트 가사를 추천
+    mode=weighted(기본값)이면 감정 확률로 가중한 전체 카탈로그 점수, k > 1이면 상위 k곡을 candidates로 함께 반환
+    """
+    if mode not in (None, "weighted", "filter"):
+        raise HTTPException(status_code=400, detail="mode는 weighted 또는 filter여야 합니다.")
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
+    chatbot, version = get_chatbot(client_id)
 
-    recommended_song = chatbot.recommend_song()
+    recommended_song = await run_admitted("text", client_id, chatbot.recommend_song, min(max(k, 1), 20), mode)
     return {"client_id": client_id, "recommended_song": recommended_song}
 
 
+
+@app.get("/recommend")
+async def recommend(request: Request, response: Response, catalogs: str = "songs", k: int = 3):
+    """
+    일기 하나로 여러 카탈로그에서 추천 (예: /recommend?catalogs=songs,books&k=3)
+    일기 임베딩과 감정 확률은 한 번만 계산하여 모든 카탈로그에 사용
+    """
+    client_id = get_or_create_client_id(request, response)
+    chatbot, version = get_chatbot(client_id)
+    names = [name.strip() for name in catalogs.split(",") if name.strip()] or None
+    try:
+        recommendations = await run_admitted("text", client_id, chatbot.recommend, names, min(max(k, 1), 20))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"client_id": client_id, **recommendations}
+
+
+@app.get("/catalogs")
+async def catalogs():
+    """검색 가능한 카탈로그와 항목 수"""
+    engine = await asyncio.to_thread(bind_request_thread(model_registry.get), "retrieval")
+    return engine.catalogs()
+
+
+@app.get("/insights")
+async def insights(request: Request, response: Response, days: int = 28):
+    """클라이언트별 감정 분포, 연속 기록 일수, 주간 감정 변화 (일별 집계만 사용)"""
+    client_id = get_or_create_client_id(request, response)
+    await asyncio.to_thread(bind_request_thread(insights_store.ingest_if_stale), INSIGHTS_REFRESH)
+    return generate_insights(insights_store, client_id, days=max(1, min(days, 365)))
+
 @app.get("/save_diary")
 async def save_diary(request: Request, response: Response):
     """대화내용 저장"""
     client_id = get_or_create_client_id(request, response)
-    chatbot = get_chatbot(client_id)
-    chatbot.save_diary()
+    chatbot, version = get_chatbot(client_id)
+    await run_admitted("text", client_id, chatbot.save_diary)
+    save_chatbot(client_id, chatbot, version)
+    await asyncio.to_thread(bind_request_thread(chatbot.save_conversation))
     return {"client_id": client_id}
+
+@app.post("/save_diary")
+async def save_written_diary(request: Request, response: Response, data: DiarySaveRequest):
+    """사용자가 작성한 최종 일기와 대화내용 저장 (일기 검색 인덱스에 추가)"""
+    client_id = get_or_create_client_id(request, response)
+    chatbot, version = get_chatbot(client_id)
+    await run_admitted("text", client_id, chatbot.save_diary, data.diary)
+    save_chatbot(client_id, chatbot, version)
+    await asyncio.to_thread(bind_request_thread(chatbot.save_conversation))
+    return {"client_id": client_id}
+
+@app.get("/diaries/search")
+async def search_diaries(request: Request, response: Response, q: str = "", k: int = 10, emotion: str = None, mode: str = "hybrid"):
+    """
+    지난 일기 검색 (예: /diaries/search?q=바닷가, /diaries/search?q=마음이 편안했던 날&emotion=행복)
+    mode: hybrid(기본값) | semantic | keyword
+    """
+    if mode not in ("hybrid", "semantic", "keyword"):
+        raise HTTPException(status_code=400, detail="mode는 hybrid, semantic, keyword 중 하나여야 합니다.")
+    client_id = get_or_create_client_id(request, response)
+    chatbot = ChatbotService(session_id=client_id)
+    start = time.perf_counter()
+    results = await run_admitted("text", client_id, chatbot.search_diaries, q, max(1, min(k, 100)), emotion, mode)
+    return {"client_id": client_id, "took_ms": round((time.perf_counter() - start) * 1000, 2), "results": results}
+
+
+# ==============================
+# **WebSocket 대화**
+# ==============================
+def run_chat_turn(client_id: str, message: dict, on_emotion) -> dict:
+    """WebSocket 메시지 하나 처리 (세션 로드 → 모델/Gemini 호출 → 세션 저장)"""
+    chatbot, version = get_chatbot(client_id)
+    kind = message.get("type")
+    if kind == "initial_question":
+        reply = {"type": "question", "text": chatbot.generate_initial_question()}
+    elif kind == "answer":
+        text = chatbot.generate_followup_question(message["text"], on_emotion=on_emotion)
+        reply = {"type": "question", "text": text, "emotion": chatbot.emotion_history[-1]}
+    elif kind == "summarize":
+        chatbot.summarize_conversation()
+        reply = {"type": "summary", "diary_summary": chatbot.diary_summary, "final_emotion": chatbot.emotion_history[-1]}
+    elif kind == "regenerate":
+        chatbot.regenerate_summarize(message["text"])
+        reply = {"type": "summary", "diary_summary": chatbot.diary_summary, "final_emotion": chatbot.emotion_history[-1]}
+    else:
+        raise ValueError(f"지원하지 않는 메시지 종류입니다: {kind}")
+    save_chatbot(client_id, chatbot, version)
+    return reply
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, client_id: str = None):
+    """
+    연결 하나로 대화 전체를 주고받는 WebSocket (턴마다 HTTP 연결/쿠키 처리를 하지 않음)
+    세션은 `client_id` 쿠키 또는 쿼리 파라미터로 식별하며, HTTP 엔드포인트와 같은 세션 저장소를 사용
+
+    받는 메시지 (JSON):
+        {"type": "initial_question"}
+        {"type": "answer", "text": "..."}
+        {"type": "summarize"}
+        {"type": "regenerate", "text": "..."}
+    보내는 메시지 (JSON):
+        {"type": "session", "client_id": "..."}               연결 직후 1회
+        {"type": "emotion", "emotion": "..."}                  답변의 감정 분석 결과 (후속 질문보다 먼저 전송)
+        {"type": "question", "text": "...", "emotion": "..."}
+        {"type": "summary", "diary_summary": "...", "final_emotion": "..."}
+        {"type": "error", "detail": "..."}
+    """
+    await websocket.accept()
+    client_id = websocket.cookies.get("client_id") or client_id or str(uuid.uuid4())
+    await websocket.send_json({"type": "session", "client_id": client_id})
+    loop = asyncio.get_running_loop()
+
+    def on_emotion(emotion):
+        # 모델 스레드에서 호출되므로 이벤트 루프에서 전송이 끝날 때까지 대기
+        asyncio.run_coroutine_threadsafe(websocket.send_json({"type": "emotion", "emotion": emotion}), loop).result()
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            try:
+                async with admission["text"].slot(client_id):
+                    reply = await asyncio.to_thread(run_chat_turn, client_id, message, on_emotion)
+            except AdmissionRejected as e:
+                reply = {"type": "error", "detail": e.detail, "status": e.status_code, "retry_after": e.retry_after}
+            except HTTPException as e:
+                reply = {"type": "error", "detail": e.detail}
+            except (KeyError, ValueError) as e:
+                reply = {"type": "error", "detail": str(e)}
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+
+
+# ==============================
+# **일괄 처리 (NDJSON)**
+# ==============================
+async def stream_batch(request: Request, kind: str, chunk_size: int, include_lyrics: bool):
+    """
+    NDJSON 요청 본문을 임시 파일에 받아둔 뒤 묶음 단위로 배치 추론하면서 결과를 NDJSON으로 스트리밍
+    (본문을 모두 받은 후 응답을 보내므로 클라이언트가 업로드 중에 응답을 읽지 않아도 교착되지 않음)
+    """
+    client_id = request.cookies.get("client_id") or request.client.host
+    try:
+        admission["batch"].check(client_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    chunk_size = max(1, min(chunk_size, batch.MAX_CHUNK_SIZE))
+
+    # 본문 크기는 RequestSizeLimitMiddleware가 제한하고, 줄 수는 받으면서 셈
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)  # 1MB까지만 메모리, 이후 디스크
+    rows = 0
+    async for chunk in request.stream():
+        rows += chunk.count(b"\n")
+        if rows > batch.MAX_BATCH_ROWS:
+            spool.close()
+            raise HTTPException(status_code=413, detail=f"한 번에 최대 {batch.MAX_BATCH_ROWS}줄까지 처리할 수 있습니다.")
+        spool.write(chunk)
+    spool.seek(0)
+
+    async def results():
+        try:
+            async with admission["batch"].slot(client_id):
+                for chunk in batch.iter_chunks(batch.parse_lines(spool), chunk_size):
+                    rows = await asyncio.to_thread(bind_request_thread(batch.process_chunk), kind, chunk, model_registry.get, include_lyrics)
+                    yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        except AdmissionRejected as e:
+            yield json.dumps({"error": e.detail, "retry_after": e.retry_after}, ensure_ascii=False) + "\n"
+        finally:
+            spool.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/batch/emotion")
+async def batch_emotion(request: Request, chunk_size: int = batch.DEFAULT_CHUNK_SIZE):
+    """NDJSON({"id", "text"}) 입력의 감정을 배치로 분류하여 한 줄씩 반환"""
+    return await stream_batch(request, "emotion", chunk_size, False)
+
+@app.post("/batch/recommend")
+async def batch_recommend(request: Request, chunk_size: int = batch.DEFAULT_CHUNK_SIZE, include_lyrics: bool = False):
+    """NDJSON({"id", "text", "emotion"(선택)}) 입력마다 트로트를 추천하여 한 줄씩 반환"""
+    return await stream_batch(request, "recommend", chunk_size, include_lyrics)
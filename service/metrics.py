@@ -0,0 +1,198 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 모델 추론(수 ms)부터 LLaVA 생성(수십 초)까지 포함하는 버킷 (초)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None) -> str:
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """단조 증가 카운터"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """현재 값 (set 또는 수집 시점에 호출되는 함수)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn, **labels):
+        """수집할 때마다 fn()을 호출하여 값을 얻음 (큐 길이 등)"""
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def render(self):
+        with self._lock:
+            items = dict(self._values)
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                items[key] = fn()
+            except Exception:
+                continue
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+    """누적 버킷 히스토그램"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [버킷별 개수..., 합계, 개수]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus 텍스트 형식(0.0.4)으로 출력"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 프로세스별 레지스트리: gunicorn/uvicorn 워커가 여러 개면 /metrics는 요청을 받은 워커의 값만 반환
+registry = MetricsRegistry()
+
+# 파이프라인 단계별 소요 시간
+# image_decode, llava_prefill, llava_decode, kobert, e5, catalog_search,
+# gemini_question_from_caption, gemini_followup_question, gemini_diary_draft, gemini_incorporate_user_changes,
+# session_load, session_save, session_compact, upload_write
+STAGE_SECONDS = registry.register(Histogram(
+    "deep_diary_stage_seconds", "Deep Diary 파이프라인 단계별 소요 시간(초)", ["stage"]
+))
+CACHE_HITS = registry.register(Counter("deep_diary_cache_hits_total", "캐시 적중 횟수", ["cache"]))
+CACHE_MISSES = registry.register(Counter("deep_diary_cache_misses_total", "캐시 미적중 횟수", ["cache"]))
+QUEUE_DEPTH = registry.register(Gauge("deep_diary_queue_depth", "대기 중인 작업 수", ["queue"]))
+ACTIVE_SESSIONS = registry.register(Gauge("deep_diary_active_sessions", "세션 저장소에 있는 세션 수"))
+FALLBACKS = registry.register(Counter(
+    "deep_diary_fallbacks_total", "마감 시간 초과/오류로 대체 응답을 사용한 횟수", ["stage", "reason"]
+))
+
+
+def stage_timer(stage: str):
+    """
+    단계 소요 시간을 기록하는 컨텍스트 매니저
+
+    사용 예:
+        with stage_timer("kobert"):
+            emotion = classifier.predict_emotion(text)
+    """
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache)
+
+
+def record_fallback(stage: str, reason: str) -> None:
+    FALLBACKS.inc(stage=stage, reason=reason)
+
+
+def stage_summary() -> dict:
+    """단계별 (호출 수, 총 소요 시간) 요약 (벤치마크 출력용)"""
+    with STAGE_SECONDS._lock:
+        return {key[0]: (series[-1], series[-2]) for key, series in STAGE_SECONDS._series.items()}
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,117 @@
+import threading
+import time
+
+
+class ModelEntry:
+    """레지스트리에 등록된 모델 하나의 상태"""
+
+    def __init__(self, name, factory, warmup=None):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.state = "pending"  # pending | loading | ready | failed
+        self.instance = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """
+    모델 지연 로딩 레지스트리.
+
+    - get(name): 처음 사용할 때 모델을 로드 (동시에 요청해도 한 번만 로드)
+    - start_warmup(): 백그라운드 스레드에서 모델을 미리 로드하고 더미 추론으로 커널 예열
+    - status(): 모델별 상태와 로드 시간 (/readyz 응답용)
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name, factory, warmup=None) -> None:
+        """
+        Args:
+            name (str): 모델 이름
+            factory (callable): 인자 없이 모델 객체를 생성하는 함수
+            warmup (callable): 로드 직후 모델 객체로 더미 추론을 수행하는 함수 (선택)
+        """
+        self._entries[name] = ModelEntry(name, factory, warmup)
+
+    def names(self) -> list:
+        return list(self._entries)
+
+    def get(self, name):
+        """모델 객체 반환 (아직 로드되지 않았다면 로드)"""
+        entry = self._entries[name]
+        if entry.state == "ready":
+            return entry.instance
+        self._load(entry)
+        if entry.state != "ready":
+            raise RuntimeError(f"'{name}' 모델을 불러오지 못했습니다: {entry.error}")
+        return entry.instance
+
+    def _load(self, entry, warmup=False):
+        with entry.lock:
+            if entry.state != "ready":
+                entry.state = "loading"
+                start = time.perf_counter()
+                try:
+                    entry.instance = entry.factory()
+                except Exception as e:
+                    entry.state = "failed"
+                    entry.error = f"{type(e).__name__}: {e}"
+                    print(f"❌ 모델 로드 실패 ({entry.name}):", entry.error)
+                    return
+                entry.load_seconds = round(time.perf_counter() - start, 3)
+                entry.error = None
+                entry.state = "ready"
+                print(f"✅ 모델 로드 완료 ({entry.name}): {entry.load_seconds}s")
+            if warmup and entry.warmup is not None and entry.warmup_seconds is None:
+                start = time.perf_counter()
+                try:
+                    entry.warmup(entry.instance)
+                    entry.warmup_seconds = round(time.perf_counter() - start, 3)
+                except Exception as e:
+                    # 예열 실패는 서비스 준비 상태에 영향을 주지 않음
+                    print(f"❌ 모델 예열 실패 ({entry.name}):", str(e))
+
+    def warmup(self, name):
+        """모델을 로드하고 예열까지 끝낸 뒤 반환 (현재 스레드에서 실행)"""
+        self._load(self._entries[name], warmup=True)
+        return self.get(name)
+
+    def start_warmup(self, names=None) -> threading.Thread:
+        """
+        백그라운드에서 모델을 순서대로 로드하고 예열
+
+        Args:
+            names (list[str]): 예열할 모델 이름 (기본값: 등록된 전체 모델)
+        """
+        names = list(self._entries) if names is None else names
+
+        def run():
+            for name in names:
+                try:
+                    self.warmup(name)
+                except RuntimeError:
+                    pass  # 실패 상태는 status()로 확인
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, names=None) -> bool:
+        names = list(self._entries) if names is None else names
+        return all(self._entries[name].state == "ready" for name in names)
+
+    def status(self) -> dict:
+        return {name: entry.to_dict() for name, entry in self._entries.items()}
@@ -0,0 +1,510 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from datetime import timedelta
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from PIL import Image
+
+# 모델 서버 기본 소켓 경로 (DEEP_DIARY_MODEL_SERVER 환경 변수로 변경)
+DEFAULT_SOCKET_PATH = "/tmp/deep_diary_models.sock"
+
+_HEADER = struct.Struct("!I")
+
+
+class ModelServerError(Exception):
+    """모델 서버에서 추론이 실패한 경우"""
+
+
+# =================== 메시지 / 공유 메모리 유틸 ===================
+
+def send_message(sock, message: dict) -> None:
+    """길이(4바이트) + JSON 형식으로 메시지 전송"""
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    """send_message()로 보낸 메시지 수신 (연결 종료 시 None)"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exact(sock, _HEADER.unpack(header)[0])
+    return json.loads(payload.decode("utf-8"))
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def put_array(array: np.ndarray) -> dict:
+    """
+    배열을 공유 메모리에 복사하고 상대 프로세스가 찾을 수 있는 메타데이터 반환.
+    공유 메모리 해제(unlink)는 받는 쪽(take_array)이 담당합니다.
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    meta = {"shm": shm.name, "shape": list(array.shape), "dtype": array.dtype.str}
+    shm.close()
+    # 생성한 프로세스의 resource_tracker가 종료 시 지우지 않도록 등록 해제
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return meta
+
+
+def take_array(meta: dict, unlink: bool = True) -> np.ndarray:
+    """공유 메모리에서 배열을 복사해 오고, 필요하면 공유 메모리를 해제"""
+    shm = shared_memory.SharedMemory(name=meta["shm"])
+    try:
+        array = np.ndarray(meta["shape"], dtype=np.dtype(meta["dtype"]), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+        else:
+            resource_tracker.unregister(shm._name, "shared_memory")
+    return array
+
+
+def _release(meta: dict) -> None:
+    """상대 프로세스가 다 읽은 공유 메모리 해제"""
+    shm = shared_memory.SharedMemory(name=meta["shm"])
+    shm.close()
+    shm.unlink()
+
+
+# =================== 배치 스케줄러 ===================
+
+class _Job:
+    def __init__(self, op, payload):
+        self.op = op
+        self.payload = payload
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+# 모델별 스케줄러가 처리하는 op (LLaVA 생성이 길어져도 KoBERT/E5 요청은 기다리지 않음)
+MODEL_OPS = {
+    "caption": ("caption",),
+    "emotion": ("emotion", "emotion_proba"),
+    "embedding": ("embedding",),
+    "recommender": ("recommend", "recommend_weighted"),
+}
+
+
+class BatchScheduler:
+    """
+    한 모델의 추론 요청을 전용 스레드에서 순서대로 처리하는 스케줄러.
+    같은 종류의 요청이 짧은 시간(batch_window) 안에 모이면 한 번의 배치 추론으로 묶습니다.
+    """
+
+    def __init__(self, handlers: dict, batchable=("emotion", "emotion_proba", "embedding"), batch_window=0.005, max_batch=32, name="model"):
+        """
+        Args:
+            handlers (dict): op -> fn(list[payload]) -> list[result]
+            batchable (tuple): 배치로 묶을 op 목록
+            batch_window (float): 배치를 모으는 대기 시간(초)
+            max_batch (int): 최대 배치 크기
+            name (str): 스케줄러 스레드 이름에 붙일 모델 이름
+        """
+        self.handlers = handlers
+        self.batchable = set(batchable)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._jobs = []
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, name=f"model-scheduler-{name}", daemon=True).start()
+
+    def submit(self, op, payload):
+        """요청을 큐에 넣고 결과가 나올 때까지 대기"""
+        return self.submit_many(op, [payload])[0]
+
+    def submit_many(self, op, payloads):
+        """
+        여러 입력을 한 번에 큐에 넣고 모든 결과가 나올 때까지 대기 (다른 워커의 요청과 함께 배치로 묶일 수 있음)
+
+        Returns:
+            list: 입력 순서대로의 결과
+        """
+        if op not in self.handlers:
+            raise ModelServerError(f"지원하지 않는 요청입니다: {op}")
+        jobs = [_Job(op, payload) for payload in payloads]
+        with self._cond:
+            self._jobs.extend(jobs)
+            self._cond.notify()
+        for job in jobs:
+            job.done.wait()
+            if job.error is not None:
+                raise job.error
+        return [job.result for job in jobs]
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._jobs:
+                self._cond.wait()
+            op = self._jobs[0].op
+            if op in self.batchable:
+                deadline = time.monotonic() + self.batch_window
+                while sum(j.op == op for j in self._jobs) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [j for j in self._jobs if j.op == op][:self.max_batch]
+            else:
+                batch = [self._jobs[0]]
+            for job in batch:
+                self._jobs.remove(job)
+        return op, batch
+
+    def _run(self):
+        while True:
+            op, batch = self._next_batch()
+            try:
+                results = self.handlers[op]([job.payload for job in batch])
+                for job, result in zip(batch, results):
+                    job.result = result
+            except Exception as e:
+                for job in batch:
+                    job.error = e
+            for job in batch:
+                job.done.set()
+
+
+def build_handlers(caption_generator, emotion_classifier, embedder, song_recommander) -> dict:
+    """로컬 모델 객체를 스케줄러 핸들러로 변환"""
+
+    def caption(payloads):
+        results = []
+        for payload in payloads:
+            image = Image.fromarray(payload["image"])
+            text, execution_time = caption_generator.generate_caption(image)
+            results.append({
+                "caption": text,
+                "execution_time": execution_time.total_seconds(),
+                "timings": getattr(caption_generator, "last_timings", {}),
+            })
+        return results
+
+    def emotion(payloads):
+        emotions = emotion_classifier.predict_emotions([p["text"] for p in payloads])
+        return [{"emotion": e} for e in emotions]
+
+    def emotion_proba(payloads):
+        probas = emotion_classifier.predict_probas([p["text"] for p in payloads])
+        return [{"probas": p} for p in probas]
+
+    def embedding(payloads):
+        vectors = embedder.get_embeddings([p["text"] for p in payloads]).numpy()
+        return [{"arrays": {"embedding": vectors[i:i + 1]}} for i in range(len(payloads))]
+
+    def recommend(payloads):
+        import torch
+        return [
+            {"recommendation": song_recommander.recommend_song(torch.from_numpy(p["embedding"]), p["emotion"])}
+            for p in payloads
+        ]
+
+    def recommend_weighted(payloads):
+        import torch
+        return [
+            {"recommendations": song_recommander.recommend_songs(
+                torch.from_numpy(p["embedding"]), p["emotion_probs"], k=p["k"], include_lyrics=p.get("include_lyrics", True),
+            )}
+            for p in payloads
+        ]
+
+    return {
+        "caption": caption,
+        "emotion": emotion,
+        "emotion_proba": emotion_proba,
+        "embedding": embedding,
+        "recommend": recommend,
+        "recommend_weighted": recommend_weighted,
+    }
+
+
+# =================== 서버 ===================
+
+class _ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            request = recv_message(self.request)
+            if request is None:
+                return
+            op = request.pop("op")
+            try:
+                if op == "ping":
+                    response = {"ok": True, "queue_depth": self.server.qsize()}
+                elif "texts" in request:
+                    # 여러 문장을 요청 하나로 받아 스케줄러에 한 번에 넣음 (응답 배열은 입력 순서대로 이어 붙임)
+                    results = self.server.scheduler_for(op).submit_many(op, [{"text": t} for t in request["texts"]])
+                    arrays = [result.pop("arrays", {}) for result in results]
+                    response = {"ok": True, "results": results}
+                    if arrays and arrays[0]:
+                        response["arrays"] = {k: put_array(np.concatenate([a[k] for a in arrays])) for k in arrays[0]}
+                else:
+                    payload = dict(request)
+                    for name, meta in payload.pop("arrays", {}).items():
+                        # 입력 공유 메모리는 요청한 워커가 해제
+                        payload[name] = take_array(meta, unlink=False)
+                    result = self.server.scheduler_for(op).submit(op, payload)
+                    response = {"ok": True, **result}
+                    if "arrays" in response:
+                        response["arrays"] = {k: put_array(v) for k, v in response["arrays"].items()}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            send_message(self.request, response)
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    """
+    모델을 한 프로세스에만 올려두고 Unix 도메인 소켓으로 API 워커들의 추론 요청을 처리하는 서버.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, handlers):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _ModelRequestHandler)
+        self.schedulers = {}
+        for model, ops in MODEL_OPS.items():
+            scheduler = BatchScheduler({op: handlers[op] for op in ops if op in handlers}, name=model)
+            self.schedulers.update({op: scheduler for op in ops})
+
+    def scheduler_for(self, op) -> BatchScheduler:
+        if op not in self.schedulers:
+            raise ModelServerError(f"지원하지 않는 요청입니다: {op}")
+        return self.schedulers[op]
+
+    def qsize(self) -> int:
+        return sum(scheduler.qsize() for scheduler in set(self.schedulers.values()))
+
+
+# =================== 클라이언트 (API 워커 측) ===================
+
+class ModelServerClient:
+    """모델 서버 요청 클라이언트 (스레드별 연결 재사용)"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def call(self, op, arrays=None, **fields) -> dict:
+        """
+        모델 서버에 요청을 보내고 응답 반환
+
+        Args:
+            op (str): caption | emotion | emotion_proba | embedding | recommend | recommend_weighted | ping
+            arrays (dict): 공유 메모리로 전달할 numpy 배열
+            **fields: JSON으로 전달할 나머지 값 (texts=[...]이면 여러 문장을 요청 하나로 처리하고 "results"에 문장별 결과)
+
+        Returns:
+            dict: 응답 (배열은 numpy로 복원)
+        """
+        request = {"op": op, **fields}
+        metas = {name: put_array(array) for name, array in (arrays or {}).items()}
+        if metas:
+            request["arrays"] = metas
+        try:
+            sock = self._conn()
+            send_message(sock, request)
+            response = recv_message(sock)
+        except OSError:
+            self._local.sock = None
+            raise
+        finally:
+            for meta in metas.values():
+                _release(meta)
+        if response is None:
+            self._local.sock = None
+            raise ModelServerError("모델 서버 연결이 종료되었습니다.")
+        if not response.pop("ok"):
+            raise ModelServerError(response["error"])
+        for name, meta in response.pop("arrays", {}).items():
+            response[name] = take_array(meta)
+        return response
+
+
+class RemoteImageCaptioning:
+    """LlavaImageCaptioning과 같은 인터페이스의 원격 프록시 (이미지 디코딩은 워커에서 수행)"""
+
+    def __init__(self, client):
+        self.client = client
+        self._timings = threading.local()
+
+    @property
+    def last_timings(self) -> dict:
+        """이 스레드에서 마지막으로 실행한 generate_caption()의 단계별 시간 (초, 동시 요청끼리 덮어쓰지 않음)"""
+        return getattr(self._timings, "value", {})
+
+    @last_timings.setter
+    def last_timings(self, timings):
+        self._timings.value = timings
+
+    def load_image_from_url(self, img_url):
+        import requests
+        try:
+            image = Image.open(requests.get(img_url, stream=True).raw).convert("RGB")
+            print("✅ 이미지 로드 성공 (URL)")
+            return image
+        except Exception as e:
+            print("❌ 이미지 로드 실패:", str(e))
+            return None
+
+    def load_image_from_file(self, file_path):
+        try:
+            image = Image.open(file_path).convert("RGB")
+            print("✅ 이미지 로드 성공 (파일)")
+            return image
+        except Exception as e:
+            print("❌ 이미지 로드 실패:", str(e))
+            return None
+
+    def generate_caption(self, image, prompt_text=None, stop_event=None):
+        # stop_event는 모델 서버로 전달하지 않음 (서버의 생성은 끝까지 실행되고, 입장 제어 슬롯은 그때까지 유지됨)
+        if image is None:
+            print("❌ 이미지가 제공되지 않았습니다.")
+            return None, None
+        response = self.client.call("caption", arrays={"image": np.asarray(image.convert("RGB"), dtype=np.uint8)})
+        self.last_timings = response.get("timings", {})
+        return response["caption"], timedelta(seconds=response["execution_time"])
+
+
+class RemoteEmotionClassifier:
+    """EmotionClassifier와 같은 인터페이스의 원격 프록시"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def predict_emotion(self, text):
+        return self.client.call("emotion", text=text)["emotion"]
+
+    def predict_emotions(self, texts, batch_size=None):
+        if not texts:
+            return []
+        return [r["emotion"] for r in self.client.call("emotion", texts=list(texts))["results"]]
+
+    def predict_proba(self, text):
+        return self.client.call("emotion_proba", text=text)["probas"]
+
+    def predict_probas(self, texts, batch_size=None):
+        if not texts:
+            return []
+        return [r["probas"] for r in self.client.call("emotion_proba", texts=list(texts))["results"]]
+
+
+class RemoteEmbedder:
+    """E5Embedder와 같은 인터페이스의 원격 프록시"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_embedding(self, text):
+        import torch
+        return torch.from_numpy(self.client.call("embedding", text=text)["embedding"])
+
+    def get_embeddings(self, texts, batch_size=None):
+        import torch
+        if not texts:
+            return torch.empty(0)
+        return torch.from_numpy(self.client.call("embedding", texts=list(texts))["embedding"])
+
+
+class RemoteSongRecommender:
+    """SongRecommender와 같은 인터페이스의 원격 프록시"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def recommend_song(self, diary_embedding, emotion):
+        embedding = np.asarray(diary_embedding, dtype=np.float32)
+        return self.client.call("recommend", arrays={"embedding": embedding}, emotion=emotion)["recommendation"]
+
+    def recommend_songs(self, diary_embedding, emotion_probs, k=5, include_lyrics=True):
+        embedding = np.asarray(diary_embedding, dtype=np.float32)
+        response = self.client.call(
+            "recommend_weighted", arrays={"embedding": embedding}, emotion_probs=list(emotion_probs), k=k, include_lyrics=include_lyrics,
+        )
+        return response["recommendations"]
+
+
+def connect_remote_models(socket_path=DEFAULT_SOCKET_PATH):
+    """
+    모델 서버에 연결된 프록시 객체 생성
+
+    Returns:
+        tuple: (caption_generator, emotion_classifier, embedder, song_recommander)
+    """
+    client = ModelServerClient(socket_path)
+    return (
+        RemoteImageCaptioning(client),
+        RemoteEmotionClassifier(client),
+        RemoteEmbedder(client),
+        RemoteSongRecommender(client),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    sys.path.append(os.path.abspath("."))
+
+    parser = argparse.ArgumentParser(description="Deep Diary 공유 모델 서버")
+    parser.add_argument("--socket", default=os.environ.get("DEEP_DIARY_MODEL_SERVER", DEFAULT_SOCKET_PATH))
+    args = parser.parse_args()
+
+    from models.image_captioning import LlavaImageCaptioning
+    from models.emotion_classification import EmotionClassifier
+    from models.semantic_embedding import E5Embedder
+    from models.catalog_shards import load_song_recommender
+    from models.distillation import emotion_student_path
+    from models.onnx_backend import inference_backend
+    from models.quantization import quantization_enabled
+
+    quantize, backend = quantization_enabled(), inference_backend()
+    handlers = build_handlers(
+        LlavaImageCaptioning(), EmotionClassifier(quantize=quantize, backend=backend, student_path=emotion_student_path()), E5Embedder(quantize=quantize, backend=backend),
+        load_song_recommender(
+            os.environ.get("DEEP_DIARY_CATALOG_PATH", "data/trot_embeddings_emotion.pkl"),
+            shards=os.environ.get("DEEP_DIARY_CATALOG_SHARDS"),
+            reduced=os.environ.get("DEEP_DIARY_CATALOG_REDUCED"),
+            rerank=os.environ.get("DEEP_DIARY_CATALOG_RERANK", "50"),
+        ),
+    )
+    server = ModelServer(args.socket, handlers)
+    print(f"✅ 모델 서버 시작: {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
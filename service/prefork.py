@@ -0,0 +1,81 @@
+import gc
+import os
+
+# 부모 프로세스에서 미리 로드할 모델 (CPU 전용 모델과 카탈로그)
+DEFAULT_PRELOAD_MODELS = ["emotion", "embedding", "recommender"]
+# 워커마다 GPU 복제본이 생기므로 preload 모드에서 시작 시 예열하지 않는 모델 (처음 요청할 때 로드)
+GPU_MODELS = ["caption"]
+# 마스터가 미리 로드한 모델 이름 (fork된 워커가 환경 변수로 상속받음)
+PRELOADED_ENV = "DEEP_DIARY_PRELOADED"
+
+
+def freeze_torch_module(module) -> None:
+    """
+    추론 전용으로 고정하고 가중치를 연속 메모리로 정리
+    (fork 후 자식 프로세스가 가중치 페이지를 복사하지 않고 공유하도록)
+    """
+    import torch
+
+    module.eval()
+    module.requires_grad_(False)
+    with torch.no_grad():
+        for param in module.parameters():
+            if not param.data.is_contiguous():
+                param.data = param.data.contiguous()
+        for buffer in module.buffers():
+            if not buffer.is_contiguous():
+                buffer.data = buffer.data.contiguous()
+
+
+def preload_models(model_registry, names=None) -> dict:
+    """
+    부모 프로세스에서 읽기 전용 모델/카탈로그를 한 번만 로드하고 고정한 뒤 gc.freeze() 호출.
+    fork된 워커는 이 객체들을 copy-on-write로 공유합니다.
+
+    CUDA는 fork 이후 자식 프로세스에서 사용할 수 없으므로 CPU 복제본 전용입니다.
+    GPU 서버에서는 공유 모델 서버(service/model_server.py)를 사용하세요.
+
+    Args:
+        model_registry (ModelRegistry): service.deep_diary.model_registry
+        names (list[str]): 미리 로드할 모델 이름
+
+    Returns:
+        dict: 모델별 상태
+    """
+    names = names or DEFAULT_PRELOAD_MODELS
+    for name in names:
+        # 예열까지 부모에서 끝내면 워커 시작 시 다시 수행하지 않음
+        instance = model_registry.warmup(name)
+        if hasattr(instance, "model"):
+            freeze_torch_module(instance.model)
+        if hasattr(instance, "freeze"):
+            instance.freeze()
+
+    # 지금까지 만들어진 객체를 GC 추적 대상에서 제외하여
+    # 자식 프로세스의 GC가 객체 헤더를 건드려 페이지가 복사되는 것을 방지
+    gc.collect()
+    gc.freeze()
+    os.environ[PRELOADED_ENV] = ",".join(names)
+    print(f"✅ prefork 모델 로드 완료: {names} (frozen objects: {gc.get_freeze_count()})")
+    return {name: model_registry.status()[name] for name in names}
+
+
+def preload_enabled() -> bool:
+    return os.environ.get("DEEP_DIARY_PRELOAD", "0") == "1"
+
+
+def preload_names():
+    names = os.environ.get("DEEP_DIARY_PRELOAD_MODELS")
+    return [n.strip() for n in names.split(",") if n.strip()] if names else None
+
+
+def worker_warmup_names(registered) -> list:
+    """
+    preload 모드에서 워커가 시작 시 예열할 모델 (DEEP_DIARY_WARMUP을 지정하지 않았을 때)
+    마스터가 이미 올린 모델과 GPU 모델(LLaVA)은 제외
+
+    Args:
+        registered (list[str]): 레지스트리에 등록된 모델 이름
+    """
+    preloaded = set(filter(None, os.environ.get(PRELOADED_ENV, "").split(",")))
+    return [name for name in registered if name not in preloaded and name not in GPU_MODELS]
@@ -0,0 +1,312 @@
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_HEADER = b"x-debug-profile"
+
+# 현재 요청이 프로파일링 대상이면 ProfileReport, 아니면 None
+_active_report = contextvars.ContextVar("deep_diary_profile_report", default=None)
+# 프로세스당 한 번에 한 요청만 프로파일링 (겹치는 요청은 프로파일링 없이 처리)
+_profile_lock = threading.Lock()
+
+
+class ProfileReport:
+    """요청 하나에 대한 프로파일 결과 (통계 프로파일 + torch 프로파일러 트레이스)"""
+
+    def __init__(self, method, path, trigger):
+        self.id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.method = method
+        self.path = path
+        self.trigger = trigger  # header | sample
+        self.started_at = time.time()
+        self.duration = None
+        self.status = None
+        self.summary = ""
+        self.folded_stacks = ""
+        self.pstats_data = None
+        self.traces = {}  # 파일명 -> chrome trace JSON 문자열
+        self.threads = set()  # 이 요청의 작업을 실행 중인 스레드 (bind_request_thread 참고)
+        self._lock = threading.Lock()
+
+    def add_trace(self, stage, trace_json):
+        with self._lock:
+            self.traces[f"trace_{len(self.traces):02d}_{stage}.json"] = trace_json
+
+    def meta(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "status": self.status,
+            "traces": sorted(self.traces),
+        }
+
+
+class StackSampler:
+    """
+    요청 하나의 호출 스택을 주기적으로 샘플링하는 통계 프로파일러.
+    cProfile과 달리 스레드풀에서 실행되는 모델 추론도 함께 잡힙니다.
+    동시에 처리 중인 다른 요청이 섞이지 않도록 요청에 등록된 스레드와,
+    이벤트 루프 스레드에서는 스택에 요청의 루트 프레임(root_frame)이 있을 때만 샘플링합니다.
+    """
+
+    def __init__(self, threads=None, root_frame=None, interval=0.005):
+        """
+        Args:
+            threads (set): 샘플링할 스레드 ID (실행 중에 추가/삭제될 수 있음, None이면 모든 스레드)
+            root_frame (frame): 다른 스레드에서는 이 프레임 아래에서 실행 중인 스택만 샘플링
+        """
+        self.threads = threads
+        self.root_frame = root_frame
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                request_thread = self.threads is None or thread_id in self.threads
+                if not request_thread and self.root_frame is None:
+                    continue
+                stack = []
+                in_request = request_thread
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    if frame is self.root_frame:
+                        in_request = True
+                        break
+                    frame = frame.f_back
+                if not in_request:
+                    continue
+                # 대기 중인 스레드(이벤트 루프 select, 큐 대기 등)는 제외
+                if stack and stack[0].split(" ")[0] in ("select", "wait", "_wait_for_tstate_lock", "get", "poll"):
+                    continue
+                self.samples[";".join(reversed(stack))] += 1
+                self.total += 1
+
+    def folded(self) -> str:
+        """flamegraph.pl / speedscope에서 읽을 수 있는 folded stack 형식"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def summary(self, limit=30) -> str:
+        """함수별 샘플 비율 (inclusive: 스택에 포함된 비율, self: 최상단에 있던 비율)"""
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        total = max(self.total, 1)
+        lines = [f"samples: {self.total} (interval {self.interval * 1000:.1f}ms)", "", "  incl%   self%  function"]
+        for name, count in inclusive.most_common(limit):
+            lines.append(f"{count / total * 100:6.1f}  {own[name] / total * 100:6.1f}  {name}")
+        return "\n".join(lines)
+
+
+class ProfileStore:
+    """디스크 링 버퍼: 최근 max_reports개의 리포트만 유지"""
+
+    def __init__(self, root="service/logs/profiles", max_reports=50):
+        self.root = root
+        self.max_reports = max_reports
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, report: ProfileReport) -> None:
+        path = os.path.join(self.root, report.id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(report.summary)
+        if report.folded_stacks:
+            with open(os.path.join(path, "stacks.folded"), "w", encoding="utf-8") as f:
+                f.write(report.folded_stacks)
+        if report.pstats_data is not None:
+            report.pstats_data.dump_stats(os.path.join(path, "profile.prof"))
+        for name, trace in report.traces.items():
+            with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+                f.write(trace)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(report.meta(), f, ensure_ascii=False, indent=2)
+        self._prune()
+
+    def _prune(self):
+        reports = sorted(os.listdir(self.root))
+        for report_id in reports[:-self.max_reports]:
+            shutil.rmtree(os.path.join(self.root, report_id), ignore_errors=True)
+
+    def list(self) -> list:
+        reports = []
+        for report_id in sorted(os.listdir(self.root), reverse=True):
+            meta_path = os.path.join(self.root, report_id, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    reports.append(json.load(f))
+        return reports
+
+    def file_path(self, report_id: str, filename: str = "summary.txt"):
+        """리포트 파일 경로 (경로 조작 방지를 위해 basename만 허용)"""
+        if os.path.basename(report_id) != report_id or os.path.basename(filename) != filename:
+            return None
+        path = os.path.join(self.root, report_id, filename)
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    일부 요청만 프로파일링하는 ASGI 미들웨어.
+
+    - sample_rate 비율로 무작위 샘플링하거나
+    - `X-Debug-Profile: <관리자 토큰>` 헤더가 있는 요청을 항상 프로파일링
+    결과 리포트 ID는 응답 헤더 `X-Profile-Id`로 반환됩니다.
+    프로세스당 한 번에 한 요청만 프로파일링하고, 겹치는 요청은 프로파일링 없이 처리합니다.
+    (cProfile은 이벤트 루프 스레드 전체를 측정하므로 동시에 여러 세션을 켜면 결과가 서로 덮어써짐)
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate=0.0, token=None, mode="sampling"):
+        """
+        Args:
+            store (ProfileStore): 리포트 저장소
+            sample_rate (float): 무작위 샘플링 비율 (0~1)
+            token (str): 디버그 헤더로 프로파일링을 요청할 때 필요한 토큰
+            mode (str): sampling(요청 스레드 스택 샘플링) | cprofile(이벤트 루프 스레드만 결정적 측정)
+        """
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token
+        self.mode = mode
+
+    def _trigger(self, scope):
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER and value.decode("latin-1") == self.token:
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" and not scope["path"].startswith("/admin") else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            if trigger == "header":
+                print(f"❌ 다른 요청을 프로파일링 중이라 건너뜀: {scope['method']} {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send, trigger)
+        finally:
+            _profile_lock.release()
+
+    async def _profile(self, scope, receive, send, trigger):
+        report = ProfileReport(scope["method"], scope["path"], trigger)
+        context_token = _active_report.set(report)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                report.status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", report.id.encode())]
+            await send(message)
+
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threads=report.threads, root_frame=sys._getframe())
+            profiler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            report.duration = round(time.perf_counter() - start, 4)
+            _active_report.reset(context_token)
+            if self.mode == "cprofile":
+                profiler.disable()
+                stream = io.StringIO()
+                report.pstats_data = pstats.Stats(profiler, stream=stream)
+                report.pstats_data.sort_stats("cumulative").print_stats(40)
+                report.summary = stream.getvalue()
+            else:
+                profiler.stop()
+                report.summary = profiler.summary()
+                report.folded_stacks = profiler.folded()
+            report.summary = f"{report.method} {report.path} ({report.duration}s, {report.trigger})\n\n" + report.summary
+            await asyncio.to_thread(self.store.save, report)
+
+
+def bind_request_thread(fn):
+    """
+    fn을 실행하는 스레드를 프로파일링 중인 요청의 스레드로 등록하도록 감싼 함수 (프로파일링 중이 아니면 fn 그대로)
+    asyncio.to_thread / call_with_deadline처럼 요청의 작업을 다른 스레드에서 실행할 때 사용
+    """
+    report = _active_report.get()
+    if report is None:
+        return fn
+
+    def run(*args):
+        thread_id = threading.get_ident()
+        report.threads.add(thread_id)
+        try:
+            return fn(*args)
+        finally:
+            report.threads.discard(thread_id)
+    return run
+
+
+@contextmanager
+def model_trace(stage: str):
+    """
+    프로파일링 중인 요청이면 모델 호출을 torch 프로파일러로 기록 (아니면 아무것도 하지 않음)
+    """
+    report = _active_report.get()
+    if report is None:
+        yield
+        return
+    import tempfile
+    import torch
+    from torch.profiler import profile, ProfilerActivity
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    with profile(activities=activities, record_shapes=True) as prof:
+        yield
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        prof.export_chrome_trace(tmp_path)
+        with open(tmp_path, encoding="utf-8") as f:
+            report.add_trace(stage, f.read())
+    finally:
+        os.remove(tmp_path)
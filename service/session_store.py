@@ -0,0 +1,466 @@
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+
+class SessionConflictError(Exception):
+    """다른 워커가 먼저 세션을 갱신하여 저장이 거부된 경우 (낙관적 동시성 충돌)"""
+
+
+def encode_state(state: dict) -> bytes:
+    """
+    세션 상태를 압축된 바이트열로 직렬화
+
+    Args:
+        state (dict): ChatbotService.to_state() 결과
+
+    Returns:
+        bytes: 공백 없는 JSON을 zlib으로 압축한 값
+    """
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw)
+
+
+def decode_state(blob: bytes) -> dict:
+    """encode_state()로 직렬화한 세션 상태 복원"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class SessionStore:
+    """
+    세션 저장소 인터페이스.
+
+    - load(session_id) -> (state, version): 세션이 없으면 (None, 0)
+    - save(session_id, state, expected_version) -> new_version
+      expected_version이 저장소의 현재 버전과 다르면 SessionConflictError 발생
+    """
+
+    def load(self, session_id: str):
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: dict, expected_version: int) -> int:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """저장된 세션 수"""
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """프로세스 내부 딕셔너리 저장소 (단일 워커 전용, 기본값)"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            blob, version = self._sessions.get(session_id, (None, 0))
+        return (decode_state(blob) if blob else None), version
+
+    def save(self, session_id, state, expected_version):
+        blob = encode_state(state)
+        with self._lock:
+            _, version = self._sessions.get(session_id, (None, 0))
+            if version != expected_version:
+                raise SessionConflictError(session_id)
+            self._sessions[session_id] = (blob, version + 1)
+        return version + 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def count(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite 파일 기반 세션 저장소.
+    같은 호스트의 여러 uvicorn 워커가 하나의 DB 파일을 공유할 수 있습니다.
+    커넥션은 처음 사용할 때 프로세스/스레드별로 열기 때문에 gunicorn preload(마스터에서 import 후 fork)에서도
+    워커끼리 같은 SQLite 핸들을 공유하지 않습니다.
+    """
+
+    def __init__(self, db_path="service/logs/sessions.db"):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._forked_locals = []
+        # 테이블만 만들고 커넥션은 닫음 (import한 프로세스가 fork해도 열린 핸들이 상속되지 않음)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    " session_id TEXT PRIMARY KEY,"
+                    " version INTEGER NOT NULL,"
+                    " state BLOB NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """프로세스/스레드별 커넥션 재사용 (fork된 자식 프로세스는 새 커넥션을 엶)"""
+        if self._pid != os.getpid():
+            # 부모에게서 상속한 커넥션은 자식에서 닫지 않고 참조만 남겨둠 (SQLite 커넥션은 fork 안전하지 않음)
+            self._forked_locals.append(self._local)
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id):
+        row = self._connect().execute(
+            "SELECT state, version FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None, 0
+        return decode_state(row[0]), row[1]
+
+    def save(self, session_id, state, expected_version):
+        conn = self._connect()
+        blob = encode_state(state)
+        with conn:
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, version, state) VALUES (?, 1, ?)",
+                    (session_id, blob),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE sessions SET state = ?, version = version + 1"
+                    " WHERE session_id = ? AND version = ?",
+                    (blob, session_id, expected_version),
+                )
+        if cursor.rowcount != 1:
+            raise SessionConflictError(session_id)
+        return expected_version + 1
+
+    def delete(self, session_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+# =================== Redis 프로토콜(RESP) 클라이언트 ===================
+
+class RespClient:
+    """
+    redis 패키지 없이 RESP2 프로토콜로 통신하는 최소 클라이언트.
+    WATCH/MULTI/EXEC는 커넥션 상태에 의존하므로 프로세스/스레드별 커넥션을 사용합니다.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            # fork 전에 열린 소켓을 자식이 함께 쓰면 응답이 뒤섞이므로 새로 연결
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.db:
+                self.execute("SELECT", self.db)
+        return conn
+
+    def execute(self, *args):
+        """명령을 전송하고 응답을 반환 (오류 응답은 RuntimeError)"""
+        sock, reader = self._conn()
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        try:
+            sock.sendall(b"".join(parts))
+            return read_resp(reader)
+        except OSError:
+            self._local.conn = None
+            raise
+
+
+def read_resp(reader):
+    """RESP 응답 하나를 읽어 파이썬 값으로 변환"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Redis 연결이 종료되었습니다.")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode("utf-8")
+    if prefix == b"-":
+        raise RuntimeError(payload.decode("utf-8"))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_resp(reader) for _ in range(length)]
+    raise RuntimeError(f"알 수 없는 RESP 응답: {line!r}")
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Redis(RESP) 기반 세션 저장소.
+    버전 키를 WATCH한 뒤 MULTI/EXEC로 상태와 버전을 함께 갱신하여 낙관적 동시성을 보장합니다.
+    세션 수는 만료 시각을 점수로 하는 정렬 집합(<prefix>index)으로 관리하므로 /metrics 수집 때 KEYS로 전체 키를 훑지 않습니다.
+    """
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", prefix="deep_diary:session:", ttl=86400):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        self.client = RespClient(parsed.hostname or "127.0.0.1", parsed.port or 6379, db=db)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.index_key = f"{prefix}index"
+
+    def _keys(self, session_id):
+        return f"{self.prefix}{session_id}:state", f"{self.prefix}{session_id}:version"
+
+    def load(self, session_id):
+        state_key, version_key = self._keys(session_id)
+        blob, version = self.client.execute("MGET", state_key, version_key)
+        if blob is None:
+            return None, 0
+        return decode_state(blob), int(version or 0)
+
+    def save(self, session_id, state, expected_version):
+        state_key, version_key = self._keys(session_id)
+        blob = encode_state(state)
+        self.client.execute("WATCH", version_key)
+        current = self.client.execute("GET", version_key)
+        if int(current or 0) != expected_version:
+            self.client.execute("UNWATCH")
+            raise SessionConflictError(session_id)
+        self.client.execute("MULTI")
+        self.client.execute("SET", state_key, blob, "EX", self.ttl)
+        self.client.execute("SET", version_key, expected_version + 1, "EX", self.ttl)
+        self.client.execute("ZADD", self.index_key, int(time.time()) + self.ttl, session_id)
+        if self.client.execute("EXEC") is None:
+            raise SessionConflictError(session_id)
+        return expected_version + 1
+
+    def delete(self, session_id):
+        self.client.execute("DEL", *self._keys(session_id))
+        self.client.execute("ZREM", self.index_key, session_id)
+
+    def count(self):
+        """만료된 세션을 색인에서 지운 뒤 남은 수 (O(log N + 만료된 수))"""
+        self.client.execute("ZREMRANGEBYSCORE", self.index_key, "-inf", int(time.time()))
+        return self.client.execute("ZCARD", self.index_key)
+
+
+# =================== 로컬 Redis 대체 서버 (개발/테스트용) ===================
+
+class _FakeRedisData:
+    """FakeRedisServer가 공유하는 키 공간 (키별 수정 번호로 WATCH 충돌 감지)"""
+
+    def __init__(self):
+        self.values = {}
+        self.revisions = {}
+        self.lock = threading.Lock()
+
+    def touch(self, key):
+        self.revisions[key] = self.revisions.get(key, 0) + 1
+
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+    """GET/SET/MGET/DEL/Z*/WATCH/MULTI/EXEC 등 세션 저장소가 쓰는 명령만 지원"""
+
+    def handle(self):
+        data = self.server.data
+        watched = {}
+        queued = None
+        while True:
+            try:
+                command = read_resp(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            name = command[0].decode().upper()
+            args = command[1:]
+            if name == "MULTI":
+                queued = []
+                self._write("+OK")
+            elif name == "EXEC":
+                with data.lock:
+                    if any(data.revisions.get(k, 0) != rev for k, rev in watched.items()):
+                        self._write_value(None)
+                    else:
+                        self._write_value([self._apply(data, c[0], c[1]) for c in queued or []])
+                queued, watched = None, {}
+            elif name == "DISCARD":
+                queued, watched = None, {}
+                self._write("+OK")
+            elif name == "WATCH":
+                with data.lock:
+                    for key in args:
+                        watched[key] = data.revisions.get(key, 0)
+                self._write("+OK")
+            elif name == "UNWATCH":
+                watched = {}
+                self._write("+OK")
+            elif queued is not None:
+                queued.append((name, args))
+                self._write("+QUEUED")
+            else:
+                with data.lock:
+                    self._write_value(self._apply(data, name, args))
+
+    @staticmethod
+    def _apply(data, name, args):
+        # 대체 서버에서는 만료(EX) 옵션을 무시합니다.
+        if name == "PING":
+            return "PONG"
+        if name == "SELECT":
+            return "OK"
+        if name == "GET":
+            return data.values.get(args[0])
+        if name == "MGET":
+            return [data.values.get(k) for k in args]
+        if name == "SET":
+            data.values[args[0]] = args[1]
+            data.touch(args[0])
+            return "OK"
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if data.values.pop(key, None) is not None:
+                    data.touch(key)
+                    removed += 1
+            return removed
+        if name == "ZADD":
+            members = data.values.setdefault(args[0], {})
+            added = 0
+            for score, member in zip(args[1::2], args[2::2]):
+                added += member not in members
+                members[member] = float(score)
+            data.touch(args[0])
+            return added
+        if name == "ZREM":
+            members = data.values.get(args[0], {})
+            return sum(members.pop(member, None) is not None for member in args[1:])
+        if name == "ZREMRANGEBYSCORE":
+            members = data.values.get(args[0], {})
+            low, high = (float(v.decode("utf-8")) for v in args[1:3])
+            expired = [m for m, score in members.items() if low <= score <= high]
+            for member in expired:
+                del members[member]
+            return len(expired)
+        if name == "ZCARD":
+            return len(data.values.get(args[0], {}))
+        return RuntimeError(f"ERR unknown command '{name}'")
+
+    def _write(self, line):
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def _write_value(self, value):
+        self.wfile.write(_encode_resp(value))
+
+
+def _encode_resp(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RuntimeError):
+        return b"-" + str(value).encode("utf-8") + b"\r\n"
+    if isinstance(value, str):
+        return b"+" + value.encode("utf-8") + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(_encode_resp(v) for v in value)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    RedisSessionStore를 실제 Redis 없이 검증하기 위한 로컬 대체 서버.
+
+    사용 예:
+        server = FakeRedisServer()
+        server.start()
+        store = RedisSessionStore(f"redis://127.0.0.1:{server.port}/0")
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _FakeRedisHandler)
+        self.data = _FakeRedisData()
+        self.port = self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def create_session_store(backend=None) -> SessionStore:
+    """
+    환경 변수로 세션 저장소 선택
+
+    - DEEP_DIARY_SESSION_BACKEND: memory(기본값) | sqlite | redis
+    - DEEP_DIARY_SQLITE_PATH: SQLite 파일 경로
+    - DEEP_DIARY_REDIS_URL: redis://host:port/db
+    """
+    backend = backend or os.environ.get("DEEP_DIARY_SESSION_BACKEND", "memory")
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.environ.get("DEEP_DIARY_SQLITE_PATH", "service/logs/sessions.db"))
+    if backend == "redis":
+        return RedisSessionStore(os.environ.get("DEEP_DIARY_REDIS_URL", "redis://127.0.0.1:6379/0"))
+    raise ValueError(f"지원하지 않는 세션 저장소입니다: {backend}")
+
+
+if __name__ == "__main__":
+    # 로컬 대체 서버로 Redis 저장소의 동시성 동작 확인
+    server = FakeRedisServer().start()
+    store = RedisSessionStore(f"redis://127.0.0.1:{server.port}/0")
+
+    state = {"caption": "바닷가 사진", "conversation_history": [], "emotion_history": [], "diary_summary": ""}
+    version = store.save("demo", state, expected_version=0)
+    print("저장 완료, 버전:", version)
+
+    loaded, version = store.load("demo")
+    print("불러온 상태:", loaded, "버전:", version)
+
+    try:
+        store.save("demo", loaded, expected_version=0)
+    except SessionConflictError:
+        print("✅ 오래된 버전으로 저장 시 충돌 감지")
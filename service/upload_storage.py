@@ -0,0 +1,275 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from starlette.responses import JSONResponse
+
+from service.metrics import record_cache
+
+
+class UploadTooLargeError(Exception):
+    """업로드 크기가 제한을 넘은 경우"""
+
+    def __init__(self, max_bytes):
+        super().__init__(f"업로드 파일은 최대 {max_bytes // (1024 * 1024)}MB까지 가능합니다.")
+        self.max_bytes = max_bytes
+
+
+class RequestSizeLimitMiddleware:
+    """
+    본문을 읽기 전에 요청 크기를 제한하는 ASGI 미들웨어 (multipart 파싱/임시 파일 스풀보다 먼저 실행)
+
+    - Content-Length가 숫자가 아니면 400, 제한을 넘으면 413으로 바로 거절
+    - Content-Length 없이(chunked) 보내는 본문은 받은 바이트 수를 세다가 제한을 넘으면 413
+    """
+
+    def __init__(self, app, limits):
+        """
+        Args:
+            app: ASGI 앱
+            limits (dict): POST 경로 -> 본문 최대 크기 (바이트)
+        """
+        self.app = app
+        self.limits = limits
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code, detail):
+        await JSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        detail = str(UploadTooLargeError(limit))
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit():
+                return await self._reject(scope, receive, send, 400, "Content-Length 헤더가 올바르지 않습니다.")
+            if int(content_length) > limit:
+                return await self._reject(scope, receive, send, 413, detail)
+
+        state = {"received": 0, "exceeded": False, "started": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    raise UploadTooLargeError(limit)
+            return message
+
+        async def guarded_send(message):
+            # 한도를 넘은 뒤에는 앱이 만든 응답(본문 파싱 실패 400 등) 대신 413을 보냄
+            if state["exceeded"]:
+                if not state["started"]:
+                    state["started"] = True
+                    await self._reject(scope, receive, send, 413, detail)
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            if state["started"]:
+                raise
+            state["started"] = True
+            await self._reject(scope, receive, send, 413, detail)
+
+
+class UploadStorage:
+    """
+    내용 주소 기반(content-addressed) 업로드 저장소.
+
+    - 업로드를 청크 단위로 읽으며 디스크에 쓰고 동시에 SHA-256 해시 계산 (전체를 메모리에 올리지 않음)
+    - 크기 제한을 넘으면 즉시 중단
+    - 같은 내용의 파일은 blobs/<digest[:2]>/<digest>에 한 번만 저장
+    - 세션별 참조는 refs/<session_id>/<digest> 빈 파일로 관리하고, 참조가 없는 blob은 GC로 삭제
+
+    디렉터리 구조:
+        root/blobs/ab/abcdef...   실제 파일
+        root/refs/<session_id>/abcdef...
+        root/tmp/                 업로드 중인 임시 파일
+    """
+
+    def __init__(self, root="service/uploads", max_bytes=20 * 1024 * 1024, chunk_size=1024 * 1024):
+        """
+        Args:
+            root (str): 저장소 루트 디렉터리
+            max_bytes (int): 업로드 최대 크기 (바이트)
+            chunk_size (int): 한 번에 읽을 크기 (바이트)
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        for name in ("blobs", "refs", "tmp"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _ref_dir(self, session_id: str) -> str:
+        return os.path.join(self.root, "refs", session_id)
+
+    async def save_upload(self, session_id: str, upload) -> tuple:
+        """
+        FastAPI UploadFile을 스트리밍으로 저장
+
+        Args:
+            session_id (str): 업로드한 클라이언트 세션 ID
+            upload (UploadFile): 업로드 파일
+
+        Returns:
+            tuple: (digest, blob 경로, 크기)
+
+        Raises:
+            UploadTooLargeError: 크기 제한 초과
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await upload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLargeError(self.max_bytes)
+                    digest.update(chunk)
+                    f.write(chunk)
+            return self._commit(session_id, tmp_path, digest.hexdigest(), size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save_bytes(self, session_id: str, data: bytes) -> tuple:
+        """메모리에 있는 바이트열 저장 (테스트/CLI용)"""
+        if len(data) > self.max_bytes:
+            raise UploadTooLargeError(self.max_bytes)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return self._commit(session_id, tmp_path, hashlib.sha256(data).hexdigest(), len(data))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, session_id, tmp_path, digest, size):
+        # 참조를 먼저 만들어 두어야 blob 이동 직후 GC가 지우지 않음
+        self.add_reference(session_id, digest)
+        path = self.blob_path(digest)
+        exists = os.path.exists(path)
+        record_cache("upload_blob", exists)
+        if exists:
+            os.utime(path)  # 같은 내용이 이미 있으면 재사용
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return digest, path, size
+
+    def reuse(self, session_id: str, digest: str):
+        """
+        같은 세션이 이미 업로드한 blob을 다시 업로드하지 않고 사용
+        다른 세션이 올린 이미지는 해시만으로 가져올 수 없음 (해시를 추측해 남의 이미지/캡션을 조회하는 것 방지)
+
+        Returns:
+            str | None: blob 경로 (이 세션이 참조하지 않거나 없으면 None)
+        """
+        if not self.has_reference(session_id, digest):
+            return None
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            return None
+        self.add_reference(session_id, digest)
+        os.utime(path)
+        return path
+
+    def has_reference(self, session_id: str, digest: str) -> bool:
+        """세션이 digest를 참조하고 있는지 (업로드했거나 재사용 중인지)"""
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            return False
+        return os.path.exists(os.path.join(self._ref_dir(session_id), digest))
+
+    def add_reference(self, session_id: str, digest: str) -> None:
+        ref_dir = self._ref_dir(session_id)
+        os.makedirs(ref_dir, exist_ok=True)
+        with open(os.path.join(ref_dir, digest), "a"):
+            pass
+        os.utime(os.path.join(ref_dir, digest))
+
+    def release_session(self, session_id: str) -> None:
+        """세션의 모든 참조 해제 (blob은 다음 GC에서 삭제)"""
+        shutil.rmtree(self._ref_dir(session_id), ignore_errors=True)
+
+    def collect_garbage(self, ref_ttl=86400, min_age=3600) -> dict:
+        """
+        만료된 참조와 참조되지 않는 blob 삭제
+
+        Args:
+            ref_ttl (float): 이 시간(초)보다 오래된 참조는 만료 처리 (세션 쿠키 유효기간과 동일)
+            min_age (float): 생성된 지 이 시간(초)이 지나지 않은 blob/임시 파일은 유지
+
+        Returns:
+            dict: 삭제된 참조/blob/임시 파일 수
+        """
+        now = time.time()
+        removed = {"refs": 0, "blobs": 0, "tmp": 0}
+        referenced = set()
+        refs_root = os.path.join(self.root, "refs")
+        for session_id in os.listdir(refs_root):
+            ref_dir = os.path.join(refs_root, session_id)
+            for digest in os.listdir(ref_dir):
+                ref_path = os.path.join(ref_dir, digest)
+                if ref_ttl is not None and now - os.path.getmtime(ref_path) > ref_ttl:
+                    os.remove(ref_path)
+                    removed["refs"] += 1
+                else:
+                    referenced.add(digest)
+            if not os.listdir(ref_dir):
+                os.rmdir(ref_dir)
+
+        blobs_root = os.path.join(self.root, "blobs")
+        for prefix in os.listdir(blobs_root):
+            for digest in os.listdir(os.path.join(blobs_root, prefix)):
+                path = os.path.join(blobs_root, prefix, digest)
+                if digest not in referenced and now - os.path.getmtime(path) > min_age:
+                    os.remove(path)
+                    removed["blobs"] += 1
+
+        tmp_root = os.path.join(self.root, "tmp")
+        for name in os.listdir(tmp_root):
+            path = os.path.join(tmp_root, name)
+            if now - os.path.getmtime(path) > min_age:
+                os.remove(path)
+                removed["tmp"] += 1
+        return removed
+
+
+# multipart 경계/헤더 등 파일 외 본문 크기 여유분
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def create_upload_storage() -> UploadStorage:
+    """
+    환경 변수로 업로드 저장소 설정
+    - DEEP_DIARY_UPLOAD_DIR: 저장 경로 (기본값: service/uploads)
+    - DEEP_DIARY_MAX_UPLOAD_BYTES: 최대 업로드 크기 (기본값: 20MB)
+    """
+    return UploadStorage(
+        root=os.environ.get("DEEP_DIARY_UPLOAD_DIR", "service/uploads"),
+        max_bytes=int(os.environ.get("DEEP_DIARY_MAX_UPLOAD_BYTES", 20 * 1024 * 1024)),
+    )
+
+
+if __name__ == "__main__":
+    # 참조되지 않는 업로드 정리: python -m service.upload_storage
+    storage = create_upload_storage()
+    print("🧹 업로드 GC 결과:", storage.collect_garbage())
@@ -0,0 +1,95 @@
+"""
+ChatbotService 종단 간 벤치마크 (네트워크/GPU 없이 실행 가능)
+
+Gemini 응답은 fixture 파일로 기록/재생하고, 모델은 결정적 가짜 모델을 사용하므로
+같은 설정에서는 항상 같은 프롬프트가 만들어져 CI에서도 재현 가능한 결과가 나옵니다.
+
+사용법 (프로젝트 루트에서):
+    # 1) fixture 기록 (기본값은 가짜 Gemini, 실제 API로 기록하려면 --record-base live)
+    python tools/bench_chatbot.py --record
+    # 2) 오프라인 재생
+    python tools/bench_chatbot.py --sessions 20 --latency none
+    python tools/bench_chatbot.py --sessions 20 --latency lognormal:-1.0,0.4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath("."))
+
+ANSWERS = [
+    "친구들이랑 바닷가에 가서 하루 종일 놀았어요.",
+    "날씨가 좋아서 기분이 정말 좋았어요.",
+    "돌아오는 길에 차가 막혀서 조금 짜증났어요.",
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run_session(ChatbotService, index, image_path, followups):
+    """세션 하나의 전체 흐름을 실행하고 단계별 소요 시간 반환"""
+    timings = {}
+
+    def step(name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    chatbot = ChatbotService(session_id=f"bench-{index:04d}")
+    step("caption", chatbot.generate_image_caption, image_path, True)
+    step("initial_question", chatbot.generate_initial_question)
+    for turn in range(followups):
+        step(f"followup_{turn}", chatbot.generate_followup_question, ANSWERS[(index + turn) % len(ANSWERS)])
+    step("summarize", chatbot.summarize_conversation)
+    step("regenerate", chatbot.regenerate_summarize, "조금 더 밝은 분위기로 써주세요.")
+    step("recommend", chatbot.recommend_song)
+    step("save", lambda: chatbot.save_diary("") or chatbot.save_conversation())
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ChatbotService 종단 간 벤치마크")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--followups", type=int, default=3)
+    parser.add_argument("--image", default="uploads/celeb_test.jpg")
+    parser.add_argument("--fixture", default="data/fixtures/gemini_bench.jsonl")
+    parser.add_argument("--record", action="store_true", help="Gemini 응답을 fixture에 새로 기록")
+    parser.add_argument("--record-base", default="fake", help="기록 시 실제로 호출할 전송 계층 (fake | live)")
+    parser.add_argument("--latency", default="none", help="재생 시 Gemini 지연 시간 분포 (LatencyModel spec)")
+    parser.add_argument("--model-latency", default="0", help="가짜 모델 지연 시간 배율 (DEEP_DIARY_FAKE_LATENCY)")
+    args = parser.parse_args()
+
+    if args.record and os.path.exists(args.fixture):
+        os.remove(args.fixture)
+    os.environ.setdefault("DEEP_DIARY_FAKE_MODELS", "1")
+    os.environ["DEEP_DIARY_FAKE_LATENCY"] = args.model_latency
+    os.environ["DEEP_DIARY_GEMINI_MODE"] = "record" if args.record else "replay"
+    os.environ["DEEP_DIARY_GEMINI_RECORD_BASE"] = args.record_base
+    os.environ["DEEP_DIARY_GEMINI_FIXTURE"] = args.fixture
+    os.environ["DEEP_DIARY_GEMINI_LATENCY"] = args.latency
+
+    from service.deep_diary import ChatbotService, model_registry
+    from service import metrics
+
+    for name in model_registry.names():
+        model_registry.warmup(name)
+
+    start = time.perf_counter()
+    results = [run_session(ChatbotService, i, args.image, args.followups) for i in range(args.sessions)]
+    elapsed = time.perf_counter() - start
+
+    mode = "record" if args.record else f"replay (latency={args.latency})"
+    print(f"\n세션 {args.sessions}개, {elapsed:.2f}s ({args.sessions / elapsed:.2f} sessions/s), Gemini: {mode}\n")
+    print(f"{'step':<20}{'mean(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for name in results[0]:
+        values = [r[name] for r in results if name in r]
+        print(f"{name:<20}{sum(values) / len(values) * 1000:>10.1f}{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}")
+
+    print(f"\n{'stage':<34}{'count':>7}{'total(ms)':>12}{'mean(ms)':>10}")
+    for stage, (count, total) in sorted(metrics.stage_summary().items()):
+        print(f"{stage:<34}{count:>7}{total * 1000:>12.1f}{total / max(count, 1) * 1000:>10.2f}")
@@ -0,0 +1,201 @@
+"""
+ONNX Runtime 백엔드 검증 / 벤치마크: PyTorch 대비 출력 일치(parity)와 지연 시간
+
+- KoBERT: 같은 입력의 logits 최대 절대 오차, 예측 라벨 일치율
+- E5: 임베딩 최대 절대 오차, 최소 코사인 유사도
+- PyTorch와 ONNX Runtime(intra-op 스레드 수별)의 문장 1개 지연 시간(p50/p95)과 배치 처리량
+오차가 --atol을 넘거나 라벨이 하나라도 다르면 종료 코드 1로 끝납니다.
+--random-init은 학습된 가중치/토크나이저 없이 같은 구조(KoBERT: 12층 768차원, E5-large: 24층 1024차원)의 모델을
+무작위 가중치로 만들어 내보내기 → ONNX Runtime 세션 → parity 경로를 확인합니다 (입력은 패딩을 섞은 무작위 토큰).
+
+사용법 (프로젝트 루트에서, CPU):
+    python tools/bench_onnx.py --samples 200 --threads 1,2,4
+    python tools/bench_onnx.py --models e5 --quantize   # int8 ONNX 그래프와 비교
+    python tools/bench_onnx.py --random-init --samples 64 --threads 1   # 가중치를 받을 수 없는 환경
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.append(os.path.abspath("."))
+
+from models.onnx_backend import OnnxModel, export_onnx, quantize_onnx
+
+
+def latency(fn, texts, repeat):
+    """문장 1개 호출의 p50/p95 지연 시간(ms)"""
+    fn(texts[0])
+    timings = []
+    for text in texts[:repeat]:
+        start = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def throughput(fn, texts):
+    """배치 처리량 (문장/초)"""
+    start = time.perf_counter()
+    fn(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def bench(name, single, batch, texts, repeat):
+    p50, p95 = latency(single, texts, repeat)
+    print(f"| {name} | {p50:.1f} | {p95:.1f} | {throughput(batch, texts[:64]):.1f} |")
+
+
+def bench_backends(torch_model, onnx_model, single, batch, texts, threads, repeat):
+    """torch와 스레드 수별 ONNX Runtime 세션을 같은 래퍼로 번갈아 측정"""
+    print("| 백엔드 | p50 (ms) | p95 (ms) | 배치 처리량 (문장/초) |")
+    print("|---|---|---|---|")
+    bench(f"torch ({torch.get_num_threads()}스레드)", single(torch_model), batch(torch_model), texts, repeat)
+    for count in threads:
+        onnx_model.model = OnnxModel(onnx_model.model.path, onnx_model.model.output_name, threads=count)
+        bench(f"onnx ({count}스레드)", single(onnx_model), batch(onnx_model), texts, repeat)
+
+
+def check_kobert(texts, args):
+    from models.emotion_classification import EmotionClassifier
+
+    torch_model = EmotionClassifier(device="cpu")
+    onnx_model = EmotionClassifier(quantize=args.quantize, backend="onnx")
+    inputs = torch_model.tokenizer(
+        [torch_model.preprocess_text(t) for t in texts], return_tensors="pt", truncation=True, padding="max_length", max_length=128,
+    )
+    with torch.no_grad():
+        expected = torch_model.model(**inputs).logits.numpy()
+    actual = onnx_model.model(**inputs).logits.numpy()
+    error = float(np.abs(expected - actual).max())
+    agreement = float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+    print(f"\n## KoBERT ({len(texts)}문장)\n")
+    print(f"logits 최대 절대 오차 {error:.2e}, 라벨 일치율 {agreement:.4f}\n")
+    bench_backends(
+        torch_model, onnx_model, lambda m: m.predict_emotion, lambda m: m.predict_emotions, texts, args.threads, args.repeat,
+    )
+    return error <= args.atol and agreement == 1.0
+
+
+def check_e5(texts, args):
+    from models.semantic_embedding import E5Embedder
+
+    torch_model = E5Embedder()
+    onnx_model = E5Embedder(quantize=args.quantize, backend="onnx")
+    expected = torch_model.get_embeddings(texts).numpy()
+    actual = onnx_model.get_embeddings(texts).numpy()
+    error = float(np.abs(expected - actual).max())
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    print(f"\n## E5 ({len(texts)}문장)\n")
+    print(f"임베딩 최대 절대 오차 {error:.2e}, 최소 코사인 유사도 {cosine.min():.6f}\n")
+    with torch.no_grad():
+        bench_backends(
+            torch_model, onnx_model, lambda m: m.get_embedding, lambda m: m.get_embeddings, texts, args.threads, args.repeat,
+        )
+    return error <= args.atol
+
+
+# --random-init에서 사용하는 구조 (transformers BertConfig 인자)
+RANDOM_INIT_CONFIGS = {
+    "kobert": dict(vocab_size=8002, hidden_size=768, num_hidden_layers=12, num_attention_heads=12, intermediate_size=3072, num_labels=7),
+    "e5": dict(vocab_size=30522, hidden_size=1024, num_hidden_layers=24, num_attention_heads=16, intermediate_size=4096),
+}
+
+
+def check_random_init(name, args):
+    """무작위 가중치 모델로 내보내기 / parity / 지연 시간 확인 (문장 길이 8~128 토큰, 배치 안에서 패딩)"""
+    from transformers import BertConfig, BertForSequenceClassification, BertModel
+
+    torch.manual_seed(args.seed)
+    config = BertConfig(**RANDOM_INIT_CONFIGS[name])
+    model = (BertForSequenceClassification(config) if name == "kobert" else BertModel(config, add_pooling_layer=False)).eval()
+    output_name = "logits" if name == "kobert" else "last_hidden_state"
+    generator = np.random.default_rng(args.seed)
+    lengths = generator.integers(8, 129, size=args.samples)
+    input_ids = torch.from_numpy(generator.integers(5, config.vocab_size, size=(args.samples, 128)))
+    attention_mask = torch.from_numpy((np.arange(128)[None, :] < lengths[:, None]).astype(np.int64))
+
+    def rows(index):
+        index = np.atleast_1d(index)
+        length = int(lengths[index].max())
+        return {
+            "input_ids": input_ids[index, :length] * attention_mask[index, :length],
+            "attention_mask": attention_mask[index, :length],
+            "token_type_ids": torch.zeros((len(index), length), dtype=torch.long),
+        }
+
+    def run(m, index):
+        with torch.no_grad():
+            output = getattr(m(**rows(index)), output_name)
+        if output_name == "last_hidden_state":  # E5Embedder와 같은 평균 풀링 + L2 정규화
+            mask = rows(index)["attention_mask"].unsqueeze(-1).float()
+            output = torch.nn.functional.normalize((output * mask).sum(1) / mask.sum(1), dim=-1)
+        return output.numpy()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"{name}.onnx")
+        start = time.perf_counter()
+        export_onnx(model, path, rows(np.arange(2)), output_name)
+        print(f"\n## {name} 무작위 가중치 ({len(lengths)}문장, 내보내기 {time.perf_counter() - start:.1f}s)\n")
+        if args.quantize:
+            quantize_onnx(path, path + ".int8.onnx")
+            path += ".int8.onnx"
+        onnx_model = OnnxModel(path, output_name, threads=args.threads[0])
+        index = np.arange(len(lengths))
+        expected = np.concatenate([run(model, index[i:i + 16]) for i in range(0, len(index), 16)])
+        actual = np.concatenate([run(onnx_model, index[i:i + 16]) for i in range(0, len(index), 16)])
+        error = float(np.abs(expected - actual).max())
+        if name == "kobert":
+            agreement = float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+            print(f"logits 최대 절대 오차 {error:.2e}, 라벨 일치율 {agreement:.4f}\n")
+            passed = error <= args.atol and agreement == 1.0
+        else:
+            print(f"임베딩 최대 절대 오차 {error:.2e}, 최소 코사인 유사도 {np.sum(expected * actual, axis=1).min():.6f}\n")
+            passed = error <= args.atol
+
+        print("| 백엔드 | p50 (ms) | p95 (ms) | 배치 처리량 (문장/초) |")
+        print("|---|---|---|---|")
+        single = lambda m: lambda i: run(m, i)
+        batch = lambda m: lambda i: run(m, np.asarray(i))
+        bench(f"torch ({torch.get_num_threads()}스레드)", single(model), batch(model), index, args.repeat)
+        for count in args.threads:
+            onnx_model = OnnxModel(path, output_name, threads=count)
+            bench(f"onnx ({count}스레드)", single(onnx_model), batch(onnx_model), index, args.repeat)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX Runtime 백엔드 출력 일치 / 지연 시간 비교")
+    parser.add_argument("--data", default="inyoungoh/new_hub_data.csv", help="입력 문장 데이터 (Sentence 컬럼)")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50, help="지연 시간 측정 호출 수")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), help="ONNX Runtime intra-op 스레드 수 (쉼표로 구분)")
+    parser.add_argument("--models", default="kobert,e5")
+    parser.add_argument("--quantize", action="store_true", help="int8 양자화 ONNX 그래프와 비교 (--atol을 넉넉히 지정)")
+    parser.add_argument("--atol", type=float, default=1e-3, help="허용 최대 절대 오차")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--random-init", action="store_true", help="학습된 가중치 대신 같은 구조의 무작위 가중치 모델로 확인")
+    args = parser.parse_args()
+    args.threads = [int(t) for t in args.threads.split(",")]
+
+    passed = True
+    if args.random_init:
+        for name in ("kobert", "e5"):
+            if name in args.models:
+                passed &= check_random_init(name, args)
+        print("\n✅ parity 통과" if passed else "\n❌ parity 실패")
+        sys.exit(0 if passed else 1)
+
+    data = pd.read_csv(args.data).dropna().sample(n=args.samples, random_state=args.seed)
+    texts = data["Sentence"].astype(str).str.strip().tolist()
+    if "kobert" in args.models:
+        passed &= check_kobert(texts, args)
+    if "e5" in args.models:
+        passed &= check_e5(texts, args)
+    print("\n✅ parity 통과" if passed else "\n❌ parity 실패")
+    sys.exit(0 if passed else 1)
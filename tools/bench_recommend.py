@@ -0,0 +1,84 @@
+"""
+트로트 추천 방식 벤치마크: 감정 필터(filter) vs 감정 확률 가중 전체 카탈로그 점수(weighted)
+
+카탈로그 곡의 임베딩에 잡음을 더한 벡터를 일기 임베딩으로 사용하고,
+--misclassify 비율만큼 감정 확률의 최댓값이 다른 감정에 가도록 만들어
+호출당 소요 시간과 원래 곡을 찾는 비율(hit@1)을 비교합니다.
+
+사용법 (프로젝트 루트에서):
+    python tools/bench_recommend.py --queries 2000
+    python tools/bench_recommend.py --songs 200000   # 카탈로그를 복제해 규모를 키워 측정
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from models.semantic_embedding import EMOTION_LABELS, SongRecommender
+
+
+def scale_catalog(recommender: SongRecommender, songs: int, rng) -> SongRecommender:
+    """카탈로그를 songs곡이 될 때까지 복제 (복제본 임베딩에는 작은 잡음 추가)"""
+    repeats = -(-songs // len(recommender.df))
+    index = np.tile(np.arange(len(recommender.df)), repeats)[:songs]
+    embeddings = np.asarray(recommender.embeddings)[index]
+    embeddings = embeddings + rng.normal(0, 0.01, embeddings.shape).astype(np.float32)
+    recommender.embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    recommender.emotions = recommender.emotions[index]
+    recommender.emotion_prior = recommender.emotion_prior[index]
+    recommender.df = recommender.df.iloc[index].reset_index(drop=True)
+    return recommender
+
+
+def make_queries(recommender, count, noise, misclassify, rng):
+    """(정답 곡 번호, 일기 임베딩, 감정 확률) 목록"""
+    targets = rng.integers(0, len(recommender.df), count)
+    queries = []
+    for target in targets:
+        embedding = np.asarray(recommender.embeddings[target]) + rng.normal(0, noise, recommender.embeddings.shape[1])
+        true_label = EMOTION_LABELS.index(recommender.emotions[target])
+        label = true_label
+        if rng.random() < misclassify:
+            label = int(rng.choice([i for i in range(len(EMOTION_LABELS)) if i != true_label]))
+        probs = rng.dirichlet(np.ones(len(EMOTION_LABELS))) * 0.4
+        probs[label] += 0.45
+        probs[true_label] += 0.15  # 오분류되어도 정답 감정에 어느 정도 확률이 남음
+        queries.append((int(target), embedding.astype(np.float32), (probs / probs.sum()).tolist()))
+    return queries
+
+
+def run(name, fn, queries, recommender):
+    hits = 0
+    start = time.perf_counter()
+    for target, embedding, probs in queries:
+        song = fn(embedding, probs)
+        hits += song.get("title") == recommender.df.at[target, "title"] and song.get("artist") == recommender.df.at[target, "artist"]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {elapsed / len(queries) * 1000:8.3f} ms/호출   hit@1 {hits / len(queries):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="트로트 추천 방식 벤치마크 (filter vs weighted)")
+    parser.add_argument("--catalog", default="data/trot_embeddings_emotion.pkl")
+    parser.add_argument("--songs", type=int, default=0, help="카탈로그를 복제하여 늘릴 곡 수 (0이면 원본 크기)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.02, help="일기 임베딩에 더할 잡음의 표준편차")
+    parser.add_argument("--misclassify", type=float, default=0.3, help="최댓값 감정이 틀리는 비율")
+    parser.add_argument("--emotion-weight", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    recommender = SongRecommender(args.catalog, mmap=False)
+    if args.songs:
+        recommender = scale_catalog(recommender, args.songs, rng)
+    queries = make_queries(recommender, args.queries, args.noise, args.misclassify, rng)
+    print(f"카탈로그 {len(recommender.df)}곡, 질의 {len(queries)}개, 감정 오분류 비율 {args.misclassify}")
+
+    run("filter", lambda e, p: recommender.recommend_song(e, EMOTION_LABELS[int(np.argmax(p))]), queries, recommender)
+    run("weighted (k=1)", lambda e, p: recommender.recommend_songs(e, p, k=1, emotion_weight=args.emotion_weight, include_lyrics=False)[0], queries, recommender)
+    run("weighted (k=5)", lambda e, p: recommender.recommend_songs(e, p, k=5, emotion_weight=args.emotion_weight, include_lyrics=False)[0], queries, recommender)
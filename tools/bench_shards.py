@@ -0,0 +1,84 @@
+"""
+샤딩된 카탈로그 검색 벤치마크 (카탈로그 크기 x 샤드/스레드 수)
+
+임의의 정규화된 임베딩으로 샤드 디렉터리를 만들고 ShardedSongRecommender.top_k_candidates의
+질의당 소요 시간과 샤드 1개 대비 속도 향상을 출력합니다.
+BLAS 내부 스레드와 샤드 스레드가 겹치지 않도록 OPENBLAS_NUM_THREADS=1로 실행하는 것을 권장합니다.
+
+사용법 (프로젝트 루트에서):
+    OPENBLAS_NUM_THREADS=1 python tools/bench_shards.py --sizes 50000,200000 --shards 1,2,4,8
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath("."))
+
+from models.catalog_shards import MANIFEST_FILENAME, ShardedSongRecommender
+from models.semantic_embedding import EMOTION_LABELS
+
+
+def make_synthetic_shards(root, songs, dim, num_shards, rng) -> None:
+    """write_shards()와 같은 구조의 임의 카탈로그 샤드 생성"""
+    os.makedirs(root, exist_ok=True)
+    shards = []
+    offset = 0
+    for shard_id, rows in enumerate(np.array_split(np.arange(songs), num_shards)):
+        embeddings = rng.standard_normal((len(rows), dim), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.save(os.path.join(root, f"shard-{shard_id:03d}.npy"), embeddings)
+        pd.DataFrame({
+            "title": [f"song-{i}" for i in rows],
+            "artist": "artist",
+            "cleaned_lyrics": "",
+            "emotion": rng.choice(EMOTION_LABELS, len(rows)),
+        }).to_pickle(os.path.join(root, f"shard-{shard_id:03d}.pkl"))
+        shards.append({"id": shard_id, "offset": offset, "rows": len(rows), "embeddings": f"shard-{shard_id:03d}.npy", "meta": f"shard-{shard_id:03d}.pkl"})
+        offset += len(rows)
+    with open(os.path.join(root, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"source": "synthetic", "dim": dim, "rows": songs, "shards": shards}, f)
+
+
+def bench(recommender, queries, probs, k) -> float:
+    """질의당 평균 소요 시간(ms)"""
+    recommender.top_k_candidates(queries[0], probs[0], k)  # 스레드 풀 생성, 페이지 로드
+    start = time.perf_counter()
+    for query, prob in zip(queries, probs):
+        recommender.top_k_candidates(query, prob, k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="샤딩된 카탈로그 검색 벤치마크")
+    parser.add_argument("--sizes", default="50000,200000", help="카탈로그 곡 수 (쉼표로 구분)")
+    parser.add_argument("--shards", default="1,2,4,8", help="샤드 수 (쉼표로 구분, 스레드 수 = 샤드 수)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    probs = rng.dirichlet(np.ones(len(EMOTION_LABELS)), args.queries)
+    print(f"CPU {os.cpu_count()}개, OPENBLAS_NUM_THREADS={os.environ.get('OPENBLAS_NUM_THREADS', '(기본값)')}")
+    print(f"{'곡 수':>10} {'샤드':>5} {'ms/질의':>10} {'속도 향상':>10}")
+    for songs in [int(s) for s in args.sizes.split(",")]:
+        baseline = None
+        for num_shards in [int(s) for s in args.shards.split(",")]:
+            root = tempfile.mkdtemp(prefix="catalog_shards_")
+            try:
+                make_synthetic_shards(root, songs, args.dim, num_shards, rng)
+                recommender = ShardedSongRecommender(root, workers=num_shards, mmap=False)
+                elapsed = bench(recommender, queries, probs, args.k)
+            finally:
+                shutil.rmtree(root)
+            baseline = baseline or elapsed
+            print(f"{songs:>10} {num_shards:>5} {elapsed:>10.2f} {baseline / elapsed:>9.2f}x")
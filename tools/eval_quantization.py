@@ -0,0 +1,149 @@
+"""
+KoBERT / E5 int8 동적 양자화 정확도·지연 시간·메모리 비교
+
+- KoBERT: new_hub_data.csv 문장의 정답 대비 정확도, fp32와 int8 라벨 일치율
+- E5: 트로트 가사 임베딩의 fp32 대비 코사인 유사도(드리프트),
+      일기 문장을 질의로 했을 때 추천 1위 곡 일치율 (카탈로그는 기존 fp32 임베딩 그대로 사용)
+- 문장 1개 지연 시간(p50/p95), 배치 처리량, 모델 state_dict 크기, 로드 전후 RSS 증가량
+
+사용법 (프로젝트 루트에서, CPU):
+    python tools/eval_quantization.py --samples 1000 --songs 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.append(os.path.abspath("."))
+
+from models.quantization import model_size_bytes
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load(factory):
+    """(모델, 로드 시간, RSS 증가량 MB)"""
+    before = rss_mb()
+    start = time.perf_counter()
+    model = factory()
+    return model, time.perf_counter() - start, rss_mb() - before
+
+
+def latency(fn, texts, repeat):
+    """문장 1개 호출의 p50/p95 지연 시간(ms)"""
+    fn(texts[0])
+    timings = []
+    for text in texts[:repeat]:
+        start = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def throughput(fn, texts):
+    """배치 처리량 (문장/초)"""
+    start = time.perf_counter()
+    fn(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def print_table(rows):
+    print("| 항목 | fp32 | int8 |")
+    print("|---|---|---|")
+    for name, fp32, int8 in rows:
+        print(f"| {name} | {fp32} | {int8} |")
+
+
+def eval_kobert(sentences, labels, repeat):
+    from models.emotion_classification import EmotionClassifier
+
+    results = {}
+    for mode in ("fp32", "int8"):
+        model, load_seconds, rss = load(lambda: EmotionClassifier(device="cpu", quantize=mode == "int8"))
+        predicted = model.predict_emotions(sentences)
+        results[mode] = {
+            "predicted": predicted,
+            "accuracy": np.mean([p == l for p, l in zip(predicted, labels)]),
+            "latency": latency(model.predict_emotion, sentences, repeat),
+            "throughput": throughput(model.predict_emotions, sentences[:256]),
+            "size": model_size_bytes(model.model) / 2 ** 20,
+            "load": load_seconds,
+            "rss": rss,
+        }
+        del model
+    agreement = np.mean([a == b for a, b in zip(results["fp32"]["predicted"], results["int8"]["predicted"])])
+    print(f"\n## KoBERT ({len(sentences)}문장)\n")
+    print_table([
+        ("정확도 (new_hub_data.csv 정답 기준)", f"{results['fp32']['accuracy']:.4f}", f"{results['int8']['accuracy']:.4f}"),
+        ("fp32 라벨 일치율", "1.0", f"{agreement:.4f}"),
+        ("지연 시간 p50 / p95 (ms)", *[f"{r['latency'][0]:.1f} / {r['latency'][1]:.1f}" for r in results.values()]),
+        ("배치 처리량 (문장/초)", *[f"{r['throughput']:.1f}" for r in results.values()]),
+        ("state_dict 크기 (MB)", *[f"{r['size']:.1f}" for r in results.values()]),
+        ("로드 시간 (s) / RSS 증가 (MB)", *[f"{r['load']:.1f} / {r['rss']:.0f}" for r in results.values()]),
+    ])
+
+
+def eval_e5(lyrics, queries, catalog, repeat):
+    from models.semantic_embedding import E5Embedder, SongRecommender
+
+    recommender = SongRecommender(catalog)
+    results = {}
+    for mode in ("fp32", "int8"):
+        model, load_seconds, rss = load(lambda: E5Embedder(quantize=mode == "int8"))
+        with torch.no_grad():
+            song_vectors = model.get_embeddings(lyrics).numpy()
+            query_vectors = model.get_embeddings(queries).numpy()
+        results[mode] = {
+            "songs": song_vectors / np.linalg.norm(song_vectors, axis=1, keepdims=True),
+            "top1": [recommender.recommend_songs(q, [1 / 7] * 7, k=1, include_lyrics=False)[0]["title"] for q in query_vectors],
+            "latency": latency(model.get_embedding, queries, repeat),
+            "throughput": throughput(lambda texts: model.get_embeddings(texts), queries[:64]),
+            "size": model_size_bytes(model.model) / 2 ** 20,
+            "load": load_seconds,
+            "rss": rss,
+        }
+        del model
+    drift = np.sum(results["fp32"]["songs"] * results["int8"]["songs"], axis=1)
+    agreement = np.mean([a == b for a, b in zip(results["fp32"]["top1"], results["int8"]["top1"])])
+    print(f"\n## E5 (가사 {len(lyrics)}곡, 질의 {len(queries)}문장)\n")
+    print_table([
+        ("fp32 대비 코사인 유사도 평균 / 최소", "1.0", f"{drift.mean():.4f} / {drift.min():.4f}"),
+        ("추천 1위 곡 일치율", "1.0", f"{agreement:.4f}"),
+        ("지연 시간 p50 / p95 (ms)", *[f"{r['latency'][0]:.1f} / {r['latency'][1]:.1f}" for r in results.values()]),
+        ("배치 처리량 (문장/초)", *[f"{r['throughput']:.1f}" for r in results.values()]),
+        ("state_dict 크기 (MB)", *[f"{r['size']:.1f}" for r in results.values()]),
+        ("로드 시간 (s) / RSS 증가 (MB)", *[f"{r['load']:.1f} / {r['rss']:.0f}" for r in results.values()]),
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KoBERT / E5 int8 동적 양자화 비교")
+    parser.add_argument("--data", default="inyoungoh/new_hub_data.csv", help="감정 라벨 데이터 (Sentence, Emotion 컬럼)")
+    parser.add_argument("--catalog", default="data/trot_embeddings_emotion.pkl")
+    parser.add_argument("--samples", type=int, default=1000, help="KoBERT 평가 문장 수")
+    parser.add_argument("--songs", type=int, default=200, help="E5 드리프트를 측정할 가사 수")
+    parser.add_argument("--queries", type=int, default=100, help="E5 추천 일치율을 측정할 질의 문장 수")
+    parser.add_argument("--repeat", type=int, default=50, help="지연 시간 측정 호출 수")
+    parser.add_argument("--models", default="kobert,e5")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    print(f"torch {torch.__version__}, 스레드 {torch.get_num_threads()}개")
+    data = pd.read_csv(args.data).dropna().sample(frac=1.0, random_state=args.seed)
+    sentences = data["Sentence"].astype(str).str.strip().tolist()
+    if "kobert" in args.models:
+        eval_kobert(sentences[:args.samples], data["Emotion"].tolist()[:args.samples], args.repeat)
+    if "e5" in args.models:
+        lyrics = pd.read_pickle(args.catalog)["cleaned_lyrics"].astype(str).tolist()[:args.songs]
+        eval_e5(lyrics, sentences[:args.queries], args.catalog, args.repeat)
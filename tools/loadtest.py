@@ -0,0 +1,198 @@
+"""
+Deep Diary 종단 간(end-to-end) 부하 테스트
+
+가상 사용자마다 쿠키를 유지하는 세션으로 전체 사용자 흐름을 반복합니다.
+    캡션 생성 → 첫 질문 → 후속 질문 N회 → 일기 초안 → 초안 재생성 → 트로트 추천
+
+--url을 지정하지 않으면 가짜 모델(models/fakes.py)과 가짜 Gemini로 로컬 서버를 띄워서 테스트합니다.
+
+사용법 (프로젝트 루트에서):
+    python tools/loadtest.py --users 8 --journeys 5 --followups 3 --think-time 0.5
+    python tools/loadtest.py --url http://localhost:8031 --users 2 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ANSWERS = [
+    "친구들이랑 바닷가에 가서 하루 종일 놀았어요.",
+    "날씨가 좋아서 기분이 정말 좋았어요.",
+    "조금 피곤했지만 맛있는 걸 먹어서 괜찮았어요.",
+    "오랜만에 가족들이랑 사진도 많이 찍었어요.",
+    "돌아오는 길에 차가 막혀서 조금 짜증났어요.",
+]
+
+
+class Recorder:
+    """엔드포인트별 지연 시간/상태 코드 기록"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.journeys = 0
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def journey_done(self):
+        with self._lock:
+            self.journeys += 1
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_journey(base_url, recorder, image_bytes, followups, think_time, rng):
+    """한 사용자의 전체 일기 작성 흐름"""
+    session = requests.Session()
+
+    def call(endpoint, method, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, base_url + endpoint, timeout=600, **kwargs)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            resp, ok = None, False
+        recorder.record(endpoint, time.perf_counter() - start, ok)
+        if think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+        return ok
+
+    steps = [("/generate_caption", "POST", {"files": {"file": ("photo.jpg", image_bytes, "image/jpeg")}}),
+             ("/initial_question", "GET", {})]
+    steps += [("/followup_question", "POST", {"json": {"user_answer": rng.choice(ANSWERS)}})] * followups
+    steps += [("/summarize_conversation", "GET", {}),
+              ("/regenerate_summarize", "POST", {"json": {"user_changes": "조금 더 밝은 분위기로 써주세요."}}),
+              ("/recommend_song", "GET", {})]
+    for endpoint, method, kwargs in steps:
+        if not call(endpoint, method, **kwargs):
+            return  # 앞 단계가 실패하면 이후 단계는 의미가 없으므로 중단
+    recorder.journey_done()
+
+
+def virtual_user(user_id, args, base_url, recorder, image_bytes, stop_at):
+    rng = random.Random(args.seed + user_id)
+    count = 0
+    while (args.duration and time.time() < stop_at) or (not args.duration and count < args.journeys):
+        data = image_bytes
+        if args.unique_images:
+            # JPEG 끝에 바이트를 덧붙여도 이미지는 같지만 해시가 달라져 업로드 중복 제거를 우회
+            data = image_bytes + f"{user_id}-{count}".encode()
+        run_journey(base_url, recorder, data, args.followups, args.think_time, rng)
+        count += 1
+
+
+def start_local_server(port):
+    """가짜 모델/가짜 Gemini로 로컬 uvicorn 서버 실행"""
+    env = dict(
+        os.environ,
+        DEEP_DIARY_FAKE_MODELS="1",
+        DEEP_DIARY_GEMINI_MODE="fake",
+        DEEP_DIARY_WARMUP=os.environ.get("DEEP_DIARY_WARMUP", "all"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "service.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/readyz", timeout=2).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("로컬 서버가 시작되지 못했습니다.")
+        time.sleep(0.3)
+    proc.terminate()
+    raise TimeoutError("로컬 서버 준비 시간 초과")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def report(recorder, elapsed):
+    total = sum(len(v) for v in recorder.latencies.values())
+    print(f"\n총 {elapsed:.1f}s, 요청 {total}개 ({total / elapsed:.2f} req/s), 완료된 흐름 {recorder.journeys}개 ({recorder.journeys / elapsed:.3f} journeys/s)\n")
+    print(f"{'endpoint':<26}{'count':>7}{'err':>6}{'rps':>8}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    summary = {}
+    for endpoint, values in recorder.latencies.items():
+        row = {
+            "count": len(values),
+            "errors": recorder.errors[endpoint],
+            "rps": len(values) / elapsed,
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+        summary[endpoint] = row
+        print(f"{endpoint:<26}{row['count']:>7}{row['errors']:>6}{row['rps']:>8.2f}"
+              + "".join(f"{row[k] * 1000:>8.0f}m" for k in ("mean", "p50", "p90", "p99", "max")))
+    return {"elapsed": elapsed, "requests": total, "journeys": recorder.journeys, "endpoints": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deep Diary 부하 테스트")
+    parser.add_argument("--url", help="대상 서버 주소 (생략하면 가짜 모델로 로컬 서버 실행)")
+    parser.add_argument("--users", type=int, default=4, help="동시 가상 사용자 수")
+    parser.add_argument("--journeys", type=int, default=3, help="사용자별 반복 횟수 (--duration이 없을 때)")
+    parser.add_argument("--duration", type=float, default=0, help="테스트 시간(초), 지정 시 --journeys 무시")
+    parser.add_argument("--followups", type=int, default=3, help="흐름당 후속 질문 수")
+    parser.add_argument("--think-time", type=float, default=0.0, help="요청 사이 평균 대기 시간(초, 지수 분포)")
+    parser.add_argument("--image", default="uploads/celeb_test.jpg")
+    parser.add_argument("--unique-images", action="store_true", help="흐름마다 다른 해시의 이미지 업로드")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="결과를 JSON으로 저장할 경로")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        server = start_local_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    recorder = Recorder()
+    start = time.time()
+    stop_at = start + args.duration
+    try:
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            futures = [pool.submit(virtual_user, i, args, base_url, recorder, image_bytes, stop_at) for i in range(args.users)]
+            for future in futures:
+                future.result()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = report(recorder, time.time() - start)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,109 @@
+"""
+gunicorn 워커 메모리(RSS/PSS) 측정 스크립트
+
+prefork 모델 공유(DEEP_DIARY_PRELOAD=1) 전후로 N개 워커의 메모리 사용량을 비교합니다.
+PSS는 공유 페이지를 공유하는 프로세스 수로 나눈 값이므로, 합계가 실제 물리 메모리 사용량에 가깝습니다.
+
+사용법 (프로젝트 루트에서, Linux 전용):
+    python tools/measure_memory.py --workers 4
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def read_memory(pid: int) -> dict:
+    """/proc/<pid>/smaps_rollup에서 RSS/PSS(KB) 읽기"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:", "Private_Dirty:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children") as f:
+            children.extend(int(c) for c in f.read().split())
+    return children
+
+
+def wait_ready(url: str, workers: int, timeout: float) -> None:
+    """모든 워커가 준비될 때까지 /readyz를 반복 확인 (요청은 임의의 워커로 분배됨)"""
+    deadline = time.time() + timeout
+    consecutive = 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                consecutive = consecutive + 1 if resp.status == 200 else 0
+        except (urllib.error.URLError, ConnectionError, OSError):
+            consecutive = 0
+        if consecutive >= workers * 3:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"{timeout}초 안에 워커가 준비되지 않았습니다.")
+
+
+def measure(workers: int, preload: bool, port: int, models: str, settle: float, timeout: float) -> list:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        DEEP_DIARY_BIND=f"127.0.0.1:{port}",
+        DEEP_DIARY_PRELOAD="1" if preload else "0",
+        DEEP_DIARY_PRELOAD_MODELS=models,
+        DEEP_DIARY_WARMUP=models,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "service/gunicorn_conf.py", "service.main:app"],
+        env=env,
+    )
+    try:
+        wait_ready(f"http://127.0.0.1:{port}/readyz?models={models}", workers, timeout)
+        time.sleep(settle)
+        rows = [("master", proc.pid, read_memory(proc.pid))]
+        rows += [("worker", pid, read_memory(pid)) for pid in child_pids(proc.pid)]
+        return rows
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+def print_rows(title: str, rows: list) -> dict:
+    print(f"\n=== {title} ===")
+    print(f"{'role':<8}{'pid':>8}{'RSS(MB)':>12}{'PSS(MB)':>12}{'Private(MB)':>14}")
+    total = {"Rss": 0, "Pss": 0}
+    for role, pid, mem in rows:
+        print(f"{role:<8}{pid:>8}{mem['Rss'] / 1024:>12.1f}{mem['Pss'] / 1024:>12.1f}{mem['Private_Dirty'] / 1024:>14.1f}")
+        total["Rss"] += mem["Rss"]
+        total["Pss"] += mem["Pss"]
+    print(f"{'total':<16}{total['Rss'] / 1024:>12.1f}{total['Pss'] / 1024:>12.1f}")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="prefork 전후 워커 메모리 비교")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--models", default="emotion,embedding,recommender", help="로드할 모델 (쉼표 구분)")
+    parser.add_argument("--settle", type=float, default=5.0, help="준비 후 측정까지 대기 시간(초)")
+    parser.add_argument("--timeout", type=float, default=900.0)
+    args = parser.parse_args()
+
+    before = print_rows(
+        f"preload 끄기 (워커 {args.workers}개)",
+        measure(args.workers, False, args.port, args.models, args.settle, args.timeout),
+    )
+    after = print_rows(
+        f"preload 켜기 (워커 {args.workers}개)",
+        measure(args.workers, True, args.port, args.models, args.settle, args.timeout),
+    )
+    saved = (before["Pss"] - after["Pss"]) / 1024
+    print(f"\nPSS 합계 절감: {saved:.1f} MB ({saved / max(before['Pss'] / 1024, 1e-9) * 100:.1f}%)")